@@ -0,0 +1,801 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Machinery shared by the checkers: errors, budgets, interning and the pushdown automaton engine."""
+import json
+import time
+import signal
+import functools
+from collections import Counter
+import cfg
+import batch
+
+# interned id of ε on the transition indexes
+EPSILON = -1
+
+
+def symb(s):
+    return unicode(s) if s is not None else None
+
+
+def pretty_symb(s):
+    return symb(s) or u'ɛ'
+
+
+class Malformed(Exception):
+    pass
+
+
+class MalformedDesc(Malformed):
+    pass
+
+
+class MalformedInput(Malformed):
+    pass
+
+
+class LimitError(Exception):
+    """A check went over its budget."""
+
+
+class TimeoutError(Exception):
+    """The alarm of `timeout` went off, unlike going over a `Budget` it's not a result of the check."""
+
+
+class NonHalting(Exception):
+    """A machine was caught repeating itself, every `period` steps with its head `shift` cells over."""
+
+    def __init__(self, period, shift=0):
+        super(NonHalting, self).__init__('cycle of {} steps'.format(period))
+        self.period = period
+        self.shift = shift
+
+
+# verdicts of a check
+ACCEPTED = 'ACCEPTED'
+REJECTED = 'REJECTED'
+LIMIT = 'LIMIT'
+NONHALTING = 'NONHALTING'
+
+
+class Result(tuple):
+    """What a check found, unpacks as (accepted, chain) with `accepted` None when undecided.
+
+    `verdict` is ACCEPTED, REJECTED, LIMIT (some budget ran out, `reason` tells
+    which) or NONHALTING (caught in a cycle `cycle` steps long). `steps` is the
+    work done, `configs` the configurations gone through, `peak` the most tape
+    cells or stack symbols in use at once and `elapsed` the seconds it took.
+    """
+
+    def __new__(cls, verdict, chain=(), steps=0, configs=0, peak=0, elapsed=0.0, reason=None, cycle=None):
+        self = super(Result, cls).__new__(cls, ({ACCEPTED: True, REJECTED: False}.get(verdict), chain))
+        self.verdict = verdict
+        self.steps = steps
+        self.configs = configs
+        self.peak = peak
+        self.elapsed = elapsed
+        self.reason = reason
+        self.cycle = cycle
+        return self
+
+    @property
+    def accepted(self):
+        return self[0]
+
+    @property
+    def chain(self):
+        return self[1]
+
+
+def measured(check):
+    """Makes the (accepted, chain) of a machine's `check` into a Result.
+
+    The machine leaves `steps`, `configs` and `peak` on itself. Going over the
+    budget or being caught in a cycle ends the check with that verdict instead of
+    raising.
+    """
+    @functools.wraps(check)
+    def wrapper(self, *args, **kwargs):
+        self.steps = self.configs = self.peak = 0
+        start = time.time()
+        try:
+            ok, chain = check(self, *args, **kwargs)
+        except LimitError as e:
+            return Result(LIMIT, [], self.steps, self.configs, self.peak, time.time() - start, reason=str(e))
+        except NonHalting as e:
+            return Result(NONHALTING, [], self.steps, self.configs, self.peak, time.time() - start, cycle=e.period)
+        return Result(ACCEPTED if ok else REJECTED, chain, self.steps, self.configs, self.peak, time.time() - start)
+    return wrapper
+
+
+class Budget(object):
+    """Steps, seconds and space a single check may take, enforced by the machine itself as it goes.
+
+    That works on any thread or process, no signals involved. Machines call
+    `exceeded(steps)` once their steps reach `next`, it tells why the check should
+    stop or None to go on. `max_space` bounds tape cells or stack symbols, machines
+    check it themselves whenever theirs grow.
+    """
+
+    # steps between two readings of the clock
+    every = 1024
+
+    def __init__(self, max_steps=None, max_time=None, max_space=None):
+        self.max_steps = max_steps
+        self.max_space = max_space
+        self.deadline = time.time() + max_time if max_time is not None else None
+        self.next = 0
+        self.exceeded(0)
+
+    def exceeded(self, steps):
+        if self.max_steps is not None and steps > self.max_steps:
+            return 'more than {} steps'.format(self.max_steps)
+        if self.deadline is not None and time.time() > self.deadline:
+            return 'out of time'
+        self.next = steps + self.every if self.deadline is not None else float('inf')
+        if self.max_steps is not None:
+            self.next = min(self.next, self.max_steps + 1)
+
+    def share(self, steps, parts):
+        """The budget left after `steps` for one of `parts` checks going side by side."""
+        budget = Budget(max_space=self.max_space)
+        budget.deadline = self.deadline
+        if self.max_steps is not None:
+            budget.max_steps = -(-(self.max_steps - steps) // parts)
+        budget.exceeded(0)
+        return budget
+
+
+class Profile(object):
+    """Counts of where the checks given it spend their work, for `check(..., profile=...)`.
+
+    `transitions` counts every transition fired and `states` every time a state is
+    reached, `backtracks` how often a search gave up on a state (a dead branch for
+    a nfae). `phases` are the seconds spent on each part of a check. Keys use the
+    names from YAML and everything adds up over the checks. Without a profile the
+    checks take their usual path, nothing is counted.
+    """
+
+    def __init__(self):
+        self.checks = 0
+        self.transitions = Counter()
+        self.states = Counter()
+        self.backtracks = Counter()
+        self.phases = Counter()
+        self._clock = None
+
+    def start(self):
+        self.checks += 1
+        self._clock = time.time()
+
+    def lap(self, phase):
+        """Add the seconds since the last lap (or the start) to `phase`."""
+        now = time.time()
+        self.phases[phase] += now - self._clock
+        self._clock = now
+
+    def dump(self):
+        """The counts as JSON friendly lists of [key..., count], most frequent first."""
+        def rows(counter):
+            return [list(key if isinstance(key, tuple) else (key,)) + [count] for key, count in counter.most_common()]
+        return {'checks': self.checks, 'transitions': rows(self.transitions), 'states': rows(self.states),
+                'backtracks': rows(self.backtracks), 'phases': dict(self.phases)}
+
+    def report(self, top=10):
+        """The `top` hottest transitions, states and backtracks and the time of each phase."""
+        lines = [u'checks: {}'.format(self.checks)]
+        for title, counter in (('transitions', self.transitions), ('states', self.states), ('backtracks', self.backtracks)):
+            if not counter:
+                continue
+            lines.append(u'{} ({} in total):'.format(title, sum(counter.itervalues())))
+            for key, count in counter.most_common(top):
+                key = [pretty_symb(k) for k in (key if isinstance(key, tuple) else (key,))]
+                if len(key) > 1:
+                    key = key[:-1] + [u'→', key[-1]]
+                lines.append(u'{:>12d}  {}'.format(count, u' '.join(key)))
+        lines.append(u'phases:')
+        for phase, seconds in sorted(self.phases.iteritems(), key=lambda i: -i[1]):
+            lines.append(u'{:>12.6f}s {}'.format(seconds, phase))
+        return u'\n'.join(lines)
+
+
+def write_profiles(profiles, report=None, dump=None):
+    """Write the report of every (name, profile) to the `report` file and all their counts as JSON to `dump`."""
+    if report is not None:
+        for name, profile in profiles:
+            report.write(u'{}:\n{}\n\n'.format(name, profile.report()).encode('utf-8'))
+    if dump is not None:
+        json.dump(dict((name, profile.dump()) for name, profile in profiles), dump, sort_keys=True)
+        dump.write('\n')
+
+
+class Interner(object):
+    """Numbers values with small ints in the order they are first seen.
+
+    `ids[value]` and `values[id]` go both ways, machines use it to index their
+    transitions by ints instead of by the names in YAML.
+    """
+
+    def __init__(self, values=()):
+        self.values = []
+        self.ids = {}
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        id = self.ids.get(value)
+        if id is None:
+            id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return id
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Stacks(object):
+    """Persistent stacks sharing their tails, each stack is a small int.
+
+    0 is the empty stack, `tops[s]` is the top symbol of s, `rests[s]` the stack
+    below it and `depths[s]` how many symbols it has. The same push on the same
+    stack always gives the same int, so pushes and pops are O(1) and so is
+    comparing or hashing whole stacks.
+    """
+
+    def __init__(self):
+        self.tops = [None]
+        self.rests = [0]
+        self.depths = [0]
+        self.ids = {}
+
+    def push(self, stack, symbol):
+        key = symbol, stack
+        nstack = self.ids.get(key)
+        if nstack is None:
+            nstack = self.ids[key] = len(self.tops)
+            self.tops.append(symbol)
+            self.rests.append(stack)
+            self.depths.append(self.depths[stack] + 1)
+        return nstack
+
+    def extend(self, stack, symbols):
+        """Push the symbols leaving the first one on top."""
+        for symbol in reversed(symbols):
+            stack = self.push(stack, symbol)
+        return stack
+
+    def list(self, stack):
+        symbols = []
+        while stack:
+            symbols.append(self.tops[stack])
+            stack = self.rests[stack]
+        return symbols
+
+
+class PDA(object):
+
+    engines = ['search', 'earley']
+
+    def __init__(self, dikt, engine='search'):
+        self.name = dikt.get('name')
+        self.steps = 0
+
+        self.input_alphabet = map(symb, dikt['input_alphabet'])
+
+        self.states = dikt['states']
+        self.start_state = dikt['start_state']
+        self.accepting_states = dikt.get('accepting_states', dikt.get('final_states'))
+
+        self.stack_alphabet = map(symb, dikt['stack_alphabet'])
+        self.start_stack = symb(dikt['start_stack'])
+        self._check_stack_symbol(self.start_stack)
+
+        trans = self.transition_relation = {}
+        for state in self.states:
+            trans[state] = {}
+            for nstate in self.states:
+                trans[state][nstate] = []
+
+        transition_relation = dikt['transition_relation']
+        for state, symbols in transition_relation.iteritems():
+            self._check_state(state)
+
+            for symbol, stack_symbols in symbols.iteritems():
+                symbol = symb(symbol)
+                self._check_symbol(symbol)
+
+                for stack_symbol, state_stack_output in stack_symbols.iteritems():
+                    stack_symbol = symb(stack_symbol)
+                    self._check_stack_symbol(stack_symbol)
+
+                    if len(state_stack_output) != 2:
+                        raise MalformedDesc('{} is not a pair'.format(state_stack_output))
+                    state_output, stack_output = state_stack_output
+                    self._check_state(state_output)
+                    stack_output = symb(stack_output)
+                    if stack_output is not None:
+                        stack_output = list(stack_output)
+                        map(self._check_stack_symbol, stack_output)
+
+                    trans[state][state_output].append((symbol, stack_symbol, stack_output))
+
+        # states and symbols are interned and the transitions indexed by (state, symbol or
+        # EPSILON, top), so a step only looks at the moves that apply; pushes are top first
+        self.state_ids = Interner(self.states)
+        self.symbol_ids = Interner(self.input_alphabet)
+        self.stack_ids = Interner(self.stack_alphabet)
+        delta = {}
+        for state, targets in trans.iteritems():
+            for nstate, ntrans in targets.iteritems():
+                for symbol, top, push in ntrans:
+                    key = (self.state_ids.ids[state],
+                           self.symbol_ids.ids[symbol] if symbol is not None else EPSILON,
+                           self.stack_ids.ids[top])
+                    move = self.state_ids.ids[nstate], tuple(self.stack_ids.ids[z] for z in push or ())
+                    delta.setdefault(key, []).append(move)
+        self.delta = dict((key, tuple(moves)) for key, moves in delta.iteritems())
+        self._start = self.state_ids.ids[self.start_state], self.stack_ids.ids[self.start_stack]
+        self._accepting = frozenset(self.state_ids.ids[state] for state in self.accepting_states)
+
+        # a deterministic PDA has at most one move for each (state, symbol, top) and
+        # no ε-move on a (state, top) that also has a symbol move
+        self.deterministic = all(len(moves) == 1 for moves in self.delta.itervalues()) and not any(
+            symbol != EPSILON and (state, EPSILON, top) in self.delta for state, symbol, top in self.delta)
+        if self.deterministic:
+            # with the push reversed, for a stack with its top at the end
+            self._dmoves = dict((key, (moves[0][0], moves[0][1][::-1])) for key, moves in self.delta.iteritems())
+
+        if engine not in self.engines:
+            raise ValueError('{} is not a valid engine ({} are valid)'.format(engine, self.engines))
+        self.engine = engine
+        if engine == 'earley':
+            self.grammar = cfg.Grammar.from_pda(self)
+
+    def _check_state(self, state):
+        if state not in self.states:
+            raise MalformedDesc('{} is not a valid state ({} are valid)'.format(state, self.states))
+
+    def _check_symbol(self, symbol):
+        if symbol is None:
+            return
+        if symbol not in self.input_alphabet:
+            raise MalformedDesc('{} is not a valid symbol ({} are valid)'.format(symbol, self.input_alphabet))
+
+    def _check_stack_symbol(self, symbol):
+        if symbol is None:
+            return
+        if symbol not in self.stack_alphabet:
+            raise MalformedDesc('{} is not a valid stack symbol ({} are valid)'.format(symbol, self.stack_alphabet))
+
+    def _moves(self, symbols, stacks, state, pos, stack):
+        if not stack:
+            return
+        top = stacks.tops[stack]
+        rest = stacks.rests[stack]
+        for nstate, push in self.delta.get((state, EPSILON, top), ()):
+            yield nstate, pos, stacks.extend(rest, push)
+        if pos < len(symbols):
+            for nstate, push in self.delta.get((state, symbols[pos], top), ()):
+                yield nstate, pos + 1, stacks.extend(rest, push)
+
+    def _config(self, input_string, state, pos, stack):
+        """A configuration with the names from YAML, stack given top first."""
+        return self.state_ids.values[state], input_string[pos:], [self.stack_ids.values[z] for z in stack]
+
+    @measured
+    def check(self, input_string, budget=None, chain=True, profile=None, shortest=False):
+        """Whether the pushdown automaton (PDA) accepts the input, and the configurations it went through.
+
+        Gives a Result, going over the budget ends it with a LIMIT verdict. With
+        `chain` off no configurations are built, an empty list comes instead. A
+        `Profile` gets the transitions and states of the run or search (only the
+        phases with the earley engine, which has neither). With `shortest` and a
+        chain a non-deterministic PDA is searched breadth-first, for the fewest
+        configurations from the start to acceptance.
+        """
+        budget = budget or Budget()
+        if profile is not None:
+            profile.start()
+
+        ids = self.symbol_ids.ids
+        try:
+            symbols = [ids[symbol] for symbol in input_string]
+        except KeyError as e:
+            raise MalformedInput(e.args[0])
+        rejected = False, [(self.start_state, input_string, [self.start_stack])] if chain else []
+
+        if self.engine == 'earley':
+            parser = self._parse(input_string, budget)
+            if profile is not None:
+                profile.lap('parse')
+            if not parser.accepted:
+                return rejected
+            configs = self._derivation_chain(input_string, parser) if chain else []
+            if profile is not None:
+                profile.lap('chain')
+            return True, configs
+        if self.deterministic:
+            trace = self._profiler(symbols, profile) if profile is not None else None
+            accepted = self._run(symbols, budget, trace)
+            if profile is not None:
+                profile.lap('run')
+            if not accepted:
+                return rejected
+            configs = []
+            if chain:
+                self._run(symbols, Budget(), lambda *config: configs.append(self._config(input_string, *config)))
+                if profile is not None:
+                    profile.lap('chain')
+            return True, configs
+        path = (self._breadth if shortest and chain else self._search)(symbols, budget, profile)
+        if profile is not None:
+            profile.lap('search')
+        if path is None:
+            return rejected
+        configs = [self._config(input_string, *config) for config in path] if chain else []
+        if profile is not None:
+            profile.lap('chain')
+        return True, configs
+
+    def _transition(self, symbols, config, nconfig):
+        """The (state, symbol, top, next state) fired between two configurations, named like in YAML."""
+        (state, pos, top), (nstate, npos, _) = config, nconfig
+        symbol = self.symbol_ids.values[symbols[pos]] if npos > pos else None
+        return self.state_ids.values[state], symbol, self.stack_ids.values[top], self.state_ids.values[nstate]
+
+    def _profiler(self, symbols, profile):
+        """A trace for `_run` counting its transitions and states on `profile`."""
+        last = [None]
+
+        def trace(state, pos, stack):
+            profile.states[self.state_ids.values[state]] += 1
+            if last[0] is not None:
+                profile.transitions[self._transition(symbols, last[0], (state, pos, None))] += 1
+            last[0] = state, pos, stack[0] if stack else None
+        return trace
+
+    def _run(self, symbols, budget, trace=None):
+        """Single pass of a deterministic PDA, `steps` are the transitions taken.
+
+        Nothing is allocated per step, `trace` is called with every (state, position,
+        stack) otherwise. `peak` is the deepest the stack got. Endless runs of ε-moves
+        are rejected: coming back to the same (state, top) without having popped below
+        where it was seen before means it will repeat forever.
+        """
+        moves = self._dmoves
+        accepting = self._accepting
+        state, top = self._start
+        stack = [top]
+        pos = 0
+        end = len(symbols)
+        seen = {}
+        seen_top = 0
+        max_space = budget.max_space
+        self.steps = 0
+        peak = 1
+        try:
+            while True:
+                if trace is not None:
+                    trace(state, pos, stack[::-1])
+                if pos == end and state in accepting:
+                    return True
+                if not stack:
+                    return False
+
+                top = stack[-1]
+                height = len(stack)
+                move = moves.get((state, EPSILON, top))
+                if move is None:
+                    if pos == end:
+                        return False
+                    move = moves.get((state, symbols[pos], top))
+                    if move is None:
+                        return False
+                    pos += 1
+                    if seen:
+                        seen = {}
+                        seen_top = 0
+                else:
+                    # what was seen above the stack as it is now was popped since
+                    if height < seen_top:
+                        seen = dict((k, h) for k, h in seen.iteritems() if h <= height)
+                    if (state, top) in seen:
+                        return False
+                    seen[state, top] = height
+                    seen_top = height
+
+                state, push = move
+                stack.pop()
+                stack.extend(push)
+                if len(stack) > peak:
+                    peak = len(stack)
+                    if max_space is not None and peak > max_space:
+                        raise LimitError('more than {} stack symbols'.format(max_space))
+
+                self.steps += 1
+                if self.steps >= budget.next:
+                    reason = budget.exceeded(self.steps)
+                    if reason:
+                        raise LimitError(reason)
+        finally:
+            self.configs = self.steps + 1
+            self.peak = peak
+
+    def check_all(self, inputs, budget=None):
+        """Results of checking every input, without chains, a run shared by inputs with a common prefix is only done once.
+
+        Only a deterministic PDA with the search engine shares its runs, walking a
+        trie of the inputs with the configuration each node is reached on; the
+        time of the budget then goes for all of them. Otherwise they are checked
+        one by one. An input with a symbol out of the alphabet gets the
+        MalformedInput it raises instead of a Result.
+        """
+        if self.engine == 'earley' or not self.deterministic:
+            return [self._check_or_error(input, budget) for input in inputs]
+        start = time.time()
+        budget = budget or Budget()
+        ids = self.symbol_ids.ids
+        found = [None] * len(inputs)
+        strings = []
+        for i, input in enumerate(inputs):
+            unknown = [symbol for symbol in input if symbol not in ids]
+            if unknown:
+                found[i] = MalformedInput(unknown[0])
+            strings.append(input if not unknown else '')
+        root = batch.trie(strings)
+        for i, res in enumerate(found):
+            if res is not None:
+                root[0].remove(i)
+        self._run_all(root, budget, found)
+        elapsed = (time.time() - start) / max(len(inputs), 1)
+        for res in found:
+            if isinstance(res, Result):
+                res.elapsed = elapsed
+        return found
+
+    def _check_or_error(self, input, budget):
+        try:
+            return self.check(input, budget, chain=False)
+        except MalformedInput as e:
+            return e
+
+    def _run_all(self, root, budget, found):
+        """`_run` on every input of a trie at once, each node of it taking the run on from its parent's configuration."""
+        moves = self._dmoves
+        accepting = self._accepting
+        ids = self.symbol_ids.ids
+        max_space = budget.max_space
+        state, top = self._start
+        nodes = [(root, state, [top], 0, 1, {}, 0)]
+        while nodes:
+            node, state, stack, steps, peak, seen, seen_top = nodes.pop()
+            ends, children = node
+            verdict = reason = None
+            # ε-moves on the configuration, inputs ending here are accepted on the first accepting one
+            while True:
+                if ends and state in accepting:
+                    for i in ends:
+                        found[i] = Result(ACCEPTED, [], steps, steps + 1, peak)
+                    ends = ()
+                if not stack:
+                    verdict = REJECTED
+                    break
+                top = stack[-1]
+                height = len(stack)
+                move = moves.get((state, EPSILON, top))
+                if move is None:
+                    break
+                if height < seen_top:
+                    seen = dict((k, h) for k, h in seen.iteritems() if h <= height)
+                if (state, top) in seen:
+                    verdict = REJECTED
+                    break
+                seen[state, top] = height
+                seen_top = height
+                verdict, state, steps, peak, reason = self._move(stack, move, steps, peak, budget, max_space)
+                if verdict is not None:
+                    break
+
+            if verdict is not None:
+                for i in batch.below([ends, children]):
+                    found[i] = Result(verdict, [], steps, steps + 1, peak, reason=reason)
+                continue
+            for i in ends:
+                found[i] = Result(REJECTED, [], steps, steps + 1, peak)
+            for k, (symbol, child) in enumerate(children.iteritems()):
+                move = moves.get((state, ids[symbol], top))
+                if move is None:
+                    for i in batch.below(child):
+                        found[i] = Result(REJECTED, [], steps, steps + 1, peak)
+                    continue
+                # the last child takes the stack as it is
+                nstack = stack if k == len(children) - 1 else stack[:]
+                verdict, nstate, nsteps, npeak, reason = self._move(nstack, move, steps, peak, budget, max_space)
+                if verdict is not None:
+                    for i in batch.below(child):
+                        found[i] = Result(verdict, [], nsteps, nsteps + 1, npeak, reason=reason)
+                else:
+                    nodes.append((child, nstate, nstack, nsteps, npeak, {}, 0))
+
+    @staticmethod
+    def _move(stack, move, steps, peak, budget, max_space):
+        # a step of `_run_all`, gives (verdict, state, steps, peak, reason) with the verdict None while it goes on
+        state, push = move
+        stack.pop()
+        stack.extend(push)
+        if len(stack) > peak:
+            peak = len(stack)
+            if max_space is not None and peak > max_space:
+                return LIMIT, state, steps, peak, 'more than {} stack symbols'.format(max_space)
+        steps += 1
+        if steps >= budget.next:
+            reason = budget.exceeded(steps)
+            if reason:
+                return LIMIT, state, steps, peak, reason
+        return None, state, steps, peak, None
+
+    def _parse(self, input_string, budget):
+        """Membership on the equivalent grammar in O(n³), `steps` and `configs` are Earley items, `peak` the most in one set."""
+        parser = cfg.Earley(self.grammar, input_string)
+        for _ in parser.parse():
+            self.steps = self.configs = parser.items
+            self.peak = parser.largest
+            if self.steps >= budget.next:
+                reason = budget.exceeded(self.steps)
+                if reason:
+                    raise LimitError(reason)
+        return parser
+
+    def _derivation_chain(self, input_string, parser):
+        """The configurations of an accepted input, from the leftmost derivation.
+
+        Its rules are labeled with the transitions the PDA takes in that same order.
+        """
+        state, pos, stack = self.start_state, 0, [self.start_stack]
+        chain = [(state, input_string, stack)]
+        for r in parser.derivation():
+            label = self.grammar.rules[r][2]
+            if label is None:
+                continue
+            _, symbol, _, state, push = label
+            if symbol is not None:
+                pos += 1
+            stack = list(push) + stack[1:]
+            chain.append((state, input_string[pos:], stack))
+        return chain
+
+    def _search(self, symbols, budget, profile=None):
+        """This is a depth algorithm to find a match on a string for a given pushdown automaton (PDA).
+
+        It walks an explicit path of (state, position, stack) configurations and never
+        goes into a configuration it has seen before, those either failed already or
+        are on the path. `steps` and `configs` are the configurations it went through,
+        `peak` the deepest stack among them. Returns the accepting path, stacks as
+        lists, or None. A `profile` counts the moves into new configurations and
+        every configuration backed out of.
+        """
+        end = len(symbols)
+        accepting = self._accepting
+        max_space = budget.max_space
+        stacks = Stacks()
+        depths = stacks.depths
+        state, top = self._start
+        config = state, 0, stacks.push(0, top)
+        visited = {config}
+        path = [config]
+        moves = [self._moves(symbols, stacks, *config)]
+        self.steps = self.configs = self.peak = 1
+        if profile is not None:
+            names = self.state_ids.values
+            profile.states[names[state]] += 1
+        while path:
+            state, pos, stack = path[-1]
+            if pos == end and state in accepting:
+                return [(s, p, stacks.list(z)) for s, p, z in path]
+
+            for config in moves[-1]:
+                if config not in visited:
+                    visited.add(config)
+                    if profile is not None:
+                        profile.states[names[config[0]]] += 1
+                        profile.transitions[self._transition(symbols, (state, pos, stacks.tops[stack]), config)] += 1
+                    path.append(config)
+                    moves.append(self._moves(symbols, stacks, *config))
+                    if depths[config[2]] > self.peak:
+                        self.peak = depths[config[2]]
+                        if max_space is not None and self.peak > max_space:
+                            raise LimitError('more than {} stack symbols'.format(max_space))
+
+                    self.steps += 1
+                    self.configs += 1
+                    if self.steps >= budget.next:
+                        reason = budget.exceeded(self.steps)
+                        if reason:
+                            raise LimitError(reason)
+                    break
+            else:
+                if profile is not None:
+                    profile.backtracks[names[path[-1][0]]] += 1
+                path.pop()
+                moves.pop()
+
+    def _breadth(self, symbols, budget, profile=None):
+        """Breadth-first search for a shortest accepting path, counted like `_search`.
+
+        Every configuration reached keeps only the one it was reached from, the
+        path is followed back from the accepting one. Returns it like `_search`
+        or None.
+        """
+        end = len(symbols)
+        accepting = self._accepting
+        max_space = budget.max_space
+        stacks = Stacks()
+        depths = stacks.depths
+        state, top = self._start
+        start = state, 0, stacks.push(0, top)
+        parents = {start: None}
+        frontier = [start]
+        self.steps = self.configs = self.peak = 1
+        if profile is not None:
+            names = self.state_ids.values
+            profile.states[names[state]] += 1
+        while frontier:
+            level = []
+            for config in frontier:
+                state, pos, stack = config
+                if pos == end and state in accepting:
+                    path = []
+                    while config is not None:
+                        path.append(config)
+                        config = parents[config]
+                    return [(s, p, stacks.list(z)) for s, p, z in reversed(path)]
+
+                for nconfig in self._moves(symbols, stacks, *config):
+                    if nconfig in parents:
+                        continue
+                    parents[nconfig] = config
+                    if profile is not None:
+                        profile.states[names[nconfig[0]]] += 1
+                        profile.transitions[self._transition(symbols, (state, pos, stacks.tops[stack]), nconfig)] += 1
+                    level.append(nconfig)
+                    if depths[nconfig[2]] > self.peak:
+                        self.peak = depths[nconfig[2]]
+                        if max_space is not None and self.peak > max_space:
+                            raise LimitError('more than {} stack symbols'.format(max_space))
+
+                    self.steps += 1
+                    self.configs += 1
+                    if self.steps >= budget.next:
+                        reason = budget.exceeded(self.steps)
+                        if reason:
+                            raise LimitError(reason)
+            frontier = level
+
+    def pretty_chain(self, chain):
+        return pretty_chain(chain)
+
+
+# from: http://stackoverflow.com/questions/2281850/timeout-function-if-it-takes-too-long-to-finish
+class timeout(object):
+    def __init__(self, seconds=1, error_message='Timeout'):
+        self.seconds = seconds
+        self.error_message = error_message
+    def handle_timeout(self, signum, frame):
+        raise TimeoutError(self.error_message)
+    def __enter__(self):
+        signal.signal(signal.SIGALRM, self.handle_timeout)
+        signal.setitimer(signal.ITIMER_REAL, self.seconds)
+    def __exit__(self, type, value, traceback):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def pretty_chain(chain):
+    chain = [(unicode(s), pretty_symb(i), pretty_symb(''.join(z))) for s, i, z in chain]
+    li = max(len(i) for _, i, _ in chain)
+    lz = max(len(z) for _, _, z in chain)
+    return u' ⊢\n'.join(u'({}, {:>{}s}, {:>{}s})'.format(s, i, li, z, lz) for s, i, z in chain)
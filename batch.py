@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Non-interactive checking shared by the checkers: one input per line in, one JSON result per line out."""
+import sys
+import json
+import time
+import select
+import multiprocessing
+from collections import deque
+from itertools import islice
+
+
+class BadInput(ValueError):
+    """In place of the input of a line that can't be decoded, every check of it gives `result`."""
+
+    @property
+    def result(self):
+        return {'accepted': None, 'steps': None, 'error': 'BAD INPUT', 'reason': str(self)}
+
+
+def read_inputs(f, encoding='utf-8'):
+    """Iterate over (id, input) for every line of a file, the id is the line number starting at 1.
+
+    Lines may end in LF or CRLF, a line that isn't in the encoding gives a `BadInput` instead.
+    """
+    for i, line in enumerate(f, 1):
+        if line.endswith('\n'):
+            line = line[:-1]
+        if line.endswith('\r'):
+            line = line[:-1]
+        try:
+            input = line.decode(encoding)
+        except UnicodeDecodeError as e:
+            input = BadInput('not {}: {}'.format(encoding, e.reason))
+        yield i, input
+
+
+def _evaluate(evaluate, lang, input):
+    return input.result if isinstance(input, BadInput) else evaluate(lang, input)
+
+
+def record(name, id, result, elapsed):
+    """One JSON line for a result, the result is a dict with at least `accepted` and `steps`."""
+    result = dict(result, lang=name, id=id, elapsed=round(elapsed, 6))
+    return json.dumps(result, sort_keys=True, ensure_ascii=False).encode('utf-8') + '\n'
+
+
+def run(langs, inputs, evaluate, out, jobs=1, kill_after=None):
+    """Evaluate every input on every one of the (name, lang) pairs and write the results to out.
+
+    `evaluate(lang, input)` does the actual check and returns the result dict, no
+    traces are built unless it does so. With more than one job the work is spread
+    over a `Pool` and results are written as they complete.
+    """
+    if jobs > 1:
+        tasks = ((name, id, input) for id, input in inputs for name, _ in langs)
+        for name, id, result, elapsed in Pool(langs, evaluate, jobs, kill_after).imap(tasks):
+            out.write(record(name, id, result, elapsed))
+    else:
+        for id, input in inputs:
+            for name, lang in langs:
+                start = time.time()
+                result = _evaluate(evaluate, lang, input)
+                out.write(record(name, id, result, time.time() - start))
+    out.flush()
+
+
+def run_shared(langs, inputs, check_all, out):
+    """Same as `run` but every lang checks all the inputs together, `check_all(lang, strings)` gives their result dicts.
+
+    The elapsed time of each result is its share of the time of them all.
+    """
+    inputs = list(inputs)
+    strings = [input for _, input in inputs if not isinstance(input, BadInput)]
+    results = []
+    for name, lang in langs:
+        start = time.time()
+        found = iter(check_all(lang, strings))
+        elapsed = (time.time() - start) / max(len(strings), 1)
+        results.append((name, [input.result if isinstance(input, BadInput) else next(found) for _, input in inputs], elapsed))
+    for k, (id, _) in enumerate(inputs):
+        for name, lang_results, elapsed in results:
+            out.write(record(name, id, lang_results[k], elapsed))
+    out.flush()
+
+
+def trie(strings):
+    """The strings as a trie of [indexes, children] nodes, indexes of the strings ending on that node."""
+    root = [[], {}]
+    for i, string in enumerate(strings):
+        node = root
+        for symbol in string:
+            child = node[1].get(symbol)
+            if child is None:
+                child = node[1][symbol] = [[], {}]
+            node = child
+        node[0].append(i)
+    return root
+
+
+def below(node):
+    """Indexes of every string ending on a trie node or under it."""
+    indexes = []
+    nodes = [node]
+    while nodes:
+        ends, children = nodes.pop()
+        indexes.extend(ends)
+        nodes.extend(children.itervalues())
+    return indexes
+
+
+def _work(langs, evaluate, conn):
+    langs = dict(langs)
+    while True:
+        tasks = conn.recv()
+        if tasks is None:
+            return
+        for name, id, input in tasks:
+            start = time.time()
+            result = _evaluate(evaluate, langs[name], input)
+            conn.send((result, time.time() - start))
+
+
+class _Worker(object):
+
+    def __init__(self, langs, evaluate):
+        # whatever is buffered would otherwise be written again by the child when it exits
+        sys.stdout.flush()
+        self.conn, conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work, args=(langs, evaluate, conn))
+        self.process.daemon = True
+        self.process.start()
+        conn.close()
+        self.tasks = deque()
+        self.since = None
+
+    def give(self, tasks):
+        self.tasks.extend(tasks)
+        self.since = time.time()
+        self.conn.send(tasks)
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.terminate()
+        else:
+            self.conn.send(None)
+        self.conn.close()
+        self.process.join()
+
+
+class Pool(object):
+    """Evaluates (name, id, input) tasks on a set of worker processes.
+
+    The langs are handed to every worker only once when it starts, tasks only
+    carry their names. Each worker gets `chunksize` tasks at a time and reports
+    every result back, one that goes `kill_after` seconds without doing so is
+    killed, its current task is reported as TIMEDOUT (CRASHED if the worker died
+    by itself) and a new worker takes its place.
+    """
+
+    def __init__(self, langs, evaluate, processes=None, kill_after=None, chunksize=64):
+        self.langs = langs
+        self.evaluate = evaluate
+        self.processes = processes or multiprocessing.cpu_count()
+        self.kill_after = kill_after
+        self.chunksize = chunksize
+
+    def imap(self, tasks):
+        """Iterate over (name, id, result, elapsed) for every task, in the order they complete."""
+        tasks = iter(tasks)
+        pending = deque()
+        workers = [_Worker(self.langs, self.evaluate) for _ in xrange(self.processes)]
+        poll = min(0.1, self.kill_after) if self.kill_after else None
+        try:
+            while True:
+                for worker in workers:
+                    if not worker.tasks:
+                        chunk = [pending.popleft() for _ in xrange(min(self.chunksize, len(pending)))]
+                        chunk.extend(islice(tasks, self.chunksize - len(chunk)))
+                        if chunk:
+                            worker.give(chunk)
+                busy = [worker for worker in workers if worker.tasks]
+                if not busy:
+                    return
+
+                ready = select.select([worker.conn for worker in busy], [], [], poll)[0]
+                for i, worker in enumerate(workers):
+                    if not worker.tasks:
+                        continue
+                    error = None
+                    if worker.conn in ready:
+                        try:
+                            result, elapsed = worker.conn.recv()
+                        except EOFError:
+                            error, elapsed = 'CRASHED', time.time() - worker.since
+                    elif self.kill_after and time.time() - worker.since > self.kill_after:
+                        error, elapsed = 'TIMEDOUT', time.time() - worker.since
+                    else:
+                        continue
+
+                    name, id, _ = worker.tasks.popleft()
+                    worker.since = time.time()
+                    if error is not None:
+                        result = {'accepted': None, 'steps': None, 'error': error}
+                        pending.extendleft(reversed(worker.tasks))
+                        worker.stop(kill=True)
+                        workers[i] = _Worker(self.langs, self.evaluate)
+                    yield name, id, result, elapsed
+        finally:
+            for worker in workers:
+                worker.stop(kill=bool(worker.tasks))
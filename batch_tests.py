@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of batch, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import json
+import time
+import unittest
+from StringIO import StringIO
+import batch
+
+
+def length(lang, input):
+    return {'accepted': len(input) % lang == 0, 'steps': len(input)}
+
+
+def stuck(lang, input):
+    # hangs on 'x' and dies on 'y'
+    if input == 'x':
+        time.sleep(60)
+    if input == 'y':
+        os._exit(1)
+    return length(lang, input)
+
+
+def results(out):
+    return [dict(json.loads(line), elapsed=None) for line in out.getvalue().splitlines()]
+
+
+class RunTest(unittest.TestCase):
+
+    def test_read_inputs(self):
+        f = StringIO('ab\n\nc\xc3\xa9\nlast')
+        self.assertEqual(list(batch.read_inputs(f)), [(1, u'ab'), (2, u''), (3, u'c\xe9'), (4, u'last')])
+        f = StringIO('ab\r\n\r\nc\xc3\xa9\r\nlast\r')
+        self.assertEqual(list(batch.read_inputs(f)), [(1, u'ab'), (2, u''), (3, u'c\xe9'), (4, u'last')])
+        # a line that isn't UTF-8 doesn't stop the others
+        inputs = list(batch.read_inputs(StringIO('ab\nc\xe9\n\xff\nd\n')))
+        self.assertEqual([id for id, _ in inputs], [1, 2, 3, 4])
+        self.assertEqual([inputs[0][1], inputs[3][1]], [u'ab', u'd'])
+        for _, input in inputs[1:3]:
+            self.assertIsInstance(input, batch.BadInput)
+            self.assertEqual(input.result['error'], 'BAD INPUT')
+
+    def test_record(self):
+        line = batch.record(u'l\xe9', 3, {'accepted': True, 'steps': 2}, 0.1234567)
+        self.assertTrue(line.endswith('\n'))
+        self.assertEqual(json.loads(line), {'lang': u'l\xe9', 'id': 3, 'accepted': True, 'steps': 2, 'elapsed': 0.123457})
+
+    def test_run(self):
+        out = StringIO()
+        batch.run([('two', 2), ('three', 3)], [(1, 'aa'), (2, 'aaa')], length, out)
+        self.assertEqual(results(out), [
+            {'lang': 'two', 'id': 1, 'accepted': True, 'steps': 2, 'elapsed': None},
+            {'lang': 'three', 'id': 1, 'accepted': False, 'steps': 2, 'elapsed': None},
+            {'lang': 'two', 'id': 2, 'accepted': False, 'steps': 3, 'elapsed': None},
+            {'lang': 'three', 'id': 2, 'accepted': True, 'steps': 3, 'elapsed': None},
+        ])
+
+    def test_bad_input(self):
+        # every check of a line that couldn't be decoded is an error, the same way on a shared run
+        inputs = [(1, 'aa'), (2, batch.BadInput('not utf-8')), (3, 'aaa')]
+        bad = {'accepted': None, 'steps': None, 'error': 'BAD INPUT', 'reason': 'not utf-8', 'elapsed': None}
+        out, shared = StringIO(), StringIO()
+        batch.run([('two', 2)], inputs, length, out)
+        batch.run_shared([('two', 2)], inputs, lambda lang, strings: [length(lang, string) for string in strings], shared)
+        for found in [out, shared]:
+            self.assertEqual(results(found), [
+                {'lang': 'two', 'id': 1, 'accepted': True, 'steps': 2, 'elapsed': None},
+                dict(bad, lang='two', id=2),
+                {'lang': 'two', 'id': 3, 'accepted': False, 'steps': 3, 'elapsed': None},
+            ])
+
+
+class PoolTest(unittest.TestCase):
+
+    def test_like_one_job(self):
+        inputs = [(i, 'a' * i if i % 50 else batch.BadInput('not utf-8')) for i in xrange(1, 200)]
+        langs = [('two', 2), ('three', 3)]
+        one, many = StringIO(), StringIO()
+        batch.run(langs, inputs, length, one)
+        batch.run(langs, inputs, length, many, jobs=3)
+        key = lambda result: (result['id'], result['lang'])
+        self.assertEqual(sorted(results(many), key=key), sorted(results(one), key=key))
+
+    def test_stuck_workers(self):
+        tasks = [('two', i, input) for i, input in enumerate(['aa', 'x', 'aaa', 'y', 'a'], 1)]
+        found = dict((id, result) for _, id, result, _ in batch.Pool([('two', 2)], stuck, 2, kill_after=0.5, chunksize=2).imap(tasks))
+        self.assertEqual(found, {
+            1: {'accepted': True, 'steps': 2},
+            2: {'accepted': None, 'steps': None, 'error': 'TIMEDOUT'},
+            3: {'accepted': False, 'steps': 3},
+            4: {'accepted': None, 'steps': None, 'error': 'CRASHED'},
+            5: {'accepted': False, 'steps': 1},
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Benchmarks of every engine of the checkers on inputs of growing size.
+
+Every case (a workload, an engine and a size) runs on a fresh process so the
+memory it reports is its own: the growth of the peak resident size over what
+loading the language and making the input took. Results can be saved as a JSON
+baseline and later runs compared to it, slower cases and changed verdicts are
+reported as regressions.
+"""
+import os
+import sys
+import math
+import json
+import random
+import resource
+import argparse
+import platform
+import multiprocessing
+from timeit import default_timer
+from library import Library, default_cache
+from automata import Budget, LIMIT, PDA
+import nfae_check
+import tm_check
+
+VERSION = '1.0.0'
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def _wwr(n, rand):
+    w = ''.join(rand.choice('01') for _ in xrange(n))
+    return w + w[::-1]
+
+
+def _ends_bb(n, rand):
+    # random prefix so every branch of maq1 keeps being taken
+    return ''.join(rand.choice('abc') for _ in xrange(n - 2)) + 'bb'
+
+
+def _abca(n, rand):
+    return 'a' * (n // 4) + 'b' * (n // 4) + 'c' * (n // 4) + 'a' * (n - 3 * (n // 4))
+
+
+# name: (checker, file, language, engines, sizes, input of size n)
+# the language may also be a function of the size, busy grows with its states (all of them on a tape with two sides)
+workloads = {
+    'anbn': ('pda', 'pda_examples.yaml', '0n1n', PDA.engines, [16, 64, 256, 1024], lambda n, rand: '0' * n + '1' * n),
+    'anbn_det': ('pda', 'pda_examples.yaml', '0n1n_det', PDA.engines, [16, 64, 256, 1024], lambda n, rand: '0' * n + '1' * n),
+    'wwr': ('pda', 'pda_examples.yaml', 'wwr', PDA.engines, [8, 32, 128, 512], _wwr),
+    'maq1': ('nfae', 'examples.yaml', 'maq1', ['auto', 'bits', 'dfa', 'lazy'], [1000, 10000, 100000, 1000000], _ends_bb),
+    'maq2': ('nfae', 'examples.yaml', 'maq2', ['auto', 'bits', 'dfa', 'lazy'], [1000, 10000, 100000, 1000000], _abca),
+    'busy': ('tm', 'tm_examples.yaml', lambda n: 'busy%d' % n, tm_check.DTM.engines, [3, 4, 5], lambda n, rand: ''),
+    'tm_anbn': ('tm', 'tm_examples.yaml', 'anbn', tm_check.DTM.engines, [16, 64, 256, 1024], lambda n, rand: 'a' * n + 'b' * n),
+}
+
+
+# the name of a document, by checker
+_names = {
+    'pda': lambda lang: lang['pda']['name'],
+    'nfae': lambda lang: lang['nfae']['name'],
+    'tm': lambda lang: lang['name'],
+}
+
+
+def _load(checker, filename, name, engine, cache):
+    with open(os.path.join(_here, filename), 'rb') as f:
+        if checker == 'pda':
+            return Library(f, lambda lang: PDA(lang['pda'], engine), _names[checker], ('pda', engine), cache)[name]
+        if checker == 'nfae':
+            build = lambda lang: (lang['nfae'], nfae_check.engines[engine](lang['nfae']))
+            return Library(f, build, _names[checker], ('nfae', engine, []), cache)[name]
+        build = lambda lang: tm_check.machine(lang, engine)
+        return Library(f, build, _names[checker], ('tm', engine, True, None, 1), cache)[name]
+
+
+def unknown_sizes(workload, sizes):
+    """The sizes of a workload that has no language for them in its file."""
+    checker, filename, name, _, _, _ = workloads[workload]
+    if not callable(name):
+        return []
+    with open(os.path.join(_here, filename), 'rb') as f:
+        names = Library(f, None, _names[checker]).names()
+    return [size for size in sizes if name(size) not in names]
+
+
+def _checker(checker, lang):
+    # a check(input, budget) giving a Result, without building chains
+    if checker == 'nfae':
+        nfae, built = lang
+        return lambda input, budget: nfae_check.check(nfae, input, False, built, budget)
+    return lambda input, budget: lang.check(input, budget, chain=False)
+
+
+def _maxrss():
+    # kilobytes on linux, bytes on mac
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def run_case(workload, engine, size, repeat, max_time, seed, cache):
+    """Time `repeat` checks of one case, stopping early once one runs out of budget.
+
+    An untimed check goes first, so what is only made on the first one (like the
+    function of a generated DTM) isn't timed. If that one runs out of budget it's
+    the only run, and its time counts.
+    """
+    checker, filename, name, _, _, make = workloads[workload]
+    if callable(name):
+        name = name(size)
+    check = _checker(checker, _load(checker, filename, name, engine, cache))
+    input = make(size, random.Random(seed + size))
+    base = _maxrss()
+    start = default_timer()
+    res = check(input, Budget(None, max_time))
+    times = [default_timer() - start] if res.verdict == LIMIT else []
+    for _ in xrange(repeat if res.verdict != LIMIT else 0):
+        start = default_timer()
+        res = check(input, Budget(None, max_time))
+        times.append(default_timer() - start)
+        if res.verdict == LIMIT:
+            break
+    total = sum(times)
+    return {
+        'workload': workload,
+        'engine': engine,
+        'size': size,
+        'symbols': len(input),
+        'verdict': res.verdict,
+        'steps': res.steps,
+        'peak': res.peak,
+        'runs': len(times),
+        'p50': percentile(times, 50),
+        'p90': percentile(times, 90),
+        'p99': percentile(times, 99),
+        'checks_per_s': len(times) / total if total else None,
+        'symbols_per_s': len(input) * len(times) / total if total else None,
+        'steps_per_s': res.steps * len(times) / total if total else None,
+        'memory_kb': _maxrss() - base,
+    }
+
+
+def _isolated(args):
+    return run_case(*args)
+
+
+def run(cases, repeat, max_time, seed, cache, isolate=True):
+    """Results of every (workload, engine, size) case, each on its own process unless not `isolate`."""
+    for workload, engine, size in cases:
+        args = workload, engine, size, repeat, max_time, seed, cache
+        if not isolate:
+            yield run_case(*args)
+            continue
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            yield pool.apply(_isolated, (args,))
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def compare(results, baseline, threshold):
+    """Lines telling what got slower than the baseline by more than `threshold` or changed its outcome."""
+    known = dict(((r['workload'], r['engine'], r['size']), r) for r in baseline['results'])
+    regressions = []
+    for r in results:
+        old = known.get((r['workload'], r['engine'], r['size']))
+        if old is None:
+            continue
+        case = '{workload}/{engine}/{size}'.format(**r)
+        if (r['verdict'], r['steps']) != (old['verdict'], old['steps']) and LIMIT not in (r['verdict'], old['verdict']):
+            regressions.append('{}: {} in {} steps, was {} in {}'.format(case, r['verdict'], r['steps'], old['verdict'], old['steps']))
+        elif r['verdict'] == LIMIT and old['verdict'] != LIMIT:
+            regressions.append('{}: {}, was {} in {:.6f}s'.format(case, LIMIT, old['verdict'], old['p50']))
+        elif old['verdict'] != LIMIT and r['p50'] > old['p50'] * (1 + threshold):
+            regressions.append('{}: {:.6f}s, was {:.6f}s ({:+.0%})'.format(case, r['p50'], old['p50'], r['p50'] / old['p50'] - 1))
+    return regressions
+
+
+def _rate(value):
+    if value is None:
+        return '-'
+    for unit, scale in (('G', 1e9), ('M', 1e6), ('k', 1e3)):
+        if value >= scale:
+            return '%.1f%s' % (value / scale, unit)
+    return '%.1f' % value
+
+
+def pretty_result(r):
+    return '%-9s %-11s %8d %-10s %10d %10.6f %10.6f %8s %8s %8s %8d' % (
+        r['workload'], r['engine'], r['size'], r['verdict'], r['steps'], r['p50'], r['p99'],
+        _rate(r['checks_per_s']), _rate(r['symbols_per_s']), _rate(r['steps_per_s']), r['memory_kb'])
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench', add_help=True)
+    parser.add_argument('--only', '-o', nargs='+', choices=sorted(workloads), help='workloads to run, all of them by default')
+    parser.add_argument('--engine', '-e', nargs='+', help='engines to run, all of each workload by default')
+    parser.add_argument('--sizes', '-s', nargs='+', type=int, help='sizes to run instead of the default ones of each workload')
+    parser.add_argument('--max-size', type=int, help='skip the sizes larger than this')
+    parser.add_argument('--repeat', '-r', default=5, type=int, help='checks timed on every case')
+    parser.add_argument('--timeout', '-t', default=10, type=float, help='max time in seconds of a single check, a case stops repeating past it')
+    parser.add_argument('--seed', default=0, type=int, help='seed of the random inputs')
+    parser.add_argument('--json', help='save the results as a baseline to this file', type=argparse.FileType('w'), metavar='FILE')
+    parser.add_argument('--compare', help='compare to this baseline and exit with 1 on regressions', type=argparse.FileType('rb'), metavar='BASELINE')
+    parser.add_argument('--threshold', default=0.2, type=float, help='how much slower than the baseline a case may get (0.2 is 20%%)')
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false', help='run every case on this process, memory is then shared among them')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='don\'t keep the built languages in the cache directory ($LFA_CACHE or ~/.cache/lfa)')
+    args = parser.parse_args()
+
+    cases = []
+    for workload in args.only or sorted(workloads):
+        _, filename, _, engines, sizes, _ = workloads[workload]
+        unknown = unknown_sizes(workload, args.sizes or sizes)
+        if unknown:
+            parser.error('{} has no language of size {} in {}'.format(workload, ', '.join(map(str, unknown)), filename))
+        for engine in engines:
+            if args.engine and engine not in args.engine:
+                continue
+            for size in args.sizes or sizes:
+                if args.max_size is None or size <= args.max_size:
+                    cases.append((workload, engine, size))
+
+    print 'bench v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
+    print '%-9s %-11s %8s %-10s %10s %10s %10s %8s %8s %8s %8s' % (
+        'workload', 'engine', 'size', 'verdict', 'steps', 'p50 (s)', 'p99 (s)', 'checks/s', 'symb/s', 'steps/s', 'mem (kB)')
+    results = []
+    for r in run(cases, args.repeat, args.timeout, args.seed, default_cache() if args.cache else None, args.isolate):
+        print pretty_result(r)
+        sys.stdout.flush()
+        results.append(r)
+
+    if args.json:
+        baseline = {
+            'version': VERSION,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'timeout': args.timeout,
+            'seed': args.seed,
+            'results': results,
+        }
+        json.dump(baseline, args.json, indent=2, sort_keys=True)
+        args.json.write('\n')
+    if args.compare:
+        regressions = compare(results, json.load(args.compare), args.threshold)
+        print
+        if regressions:
+            print '%d regressions:' % len(regressions)
+            for line in regressions:
+                print line
+            sys.exit(1)
+        print 'no regressions'
+
+
+if __name__ == '__main__':
+    main()
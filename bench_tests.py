@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of bench, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+import bench
+from automata import ACCEPTED, LIMIT
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+_keys = ['workload', 'engine', 'size', 'symbols', 'verdict', 'steps', 'peak', 'runs', 'p50', 'p90', 'p99',
+         'checks_per_s', 'symbols_per_s', 'steps_per_s', 'memory_kb']
+
+
+def run(*options):
+    """The exit code, stdout and stderr of bench with the options."""
+    command = [sys.executable, '-W', 'ignore', os.path.join(_here, 'bench.py'), '--no-cache'] + list(options)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    return process.returncode, out, err
+
+
+class BenchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_json(self):
+        # a small workload of every checker, on every engine
+        path = os.path.join(self.dir, 'base.json')
+        code, out, _ = run('--only', 'maq1', 'anbn', 'tm_anbn', '--sizes', '16', '--repeat', '2', '--json', path)
+        self.assertEqual(code, 0)
+        with open(path) as f:
+            baseline = json.load(f)
+        self.assertEqual(sorted(baseline), ['machine', 'python', 'repeat', 'results', 'seed', 'timeout', 'version'])
+        cases = [(name, engine) for name in ['maq1', 'anbn', 'tm_anbn'] for engine in bench.workloads[name][3]]
+        self.assertEqual([(r['workload'], r['engine']) for r in baseline['results']], cases)
+        for r in baseline['results']:
+            self.assertEqual(sorted(r), sorted(_keys))
+            self.assertEqual((r['size'], r['verdict'], r['runs']), (16, ACCEPTED, 2), r)
+        self.assertEqual(len(out.splitlines()), 2 + len(cases))
+        code, out, _ = run('--only', 'tm_anbn', '--sizes', '16', '--repeat', '2', '--compare', path, '--threshold', '1000')
+        self.assertEqual(code, 0)
+        self.assertTrue(out.endswith('no regressions\n'))
+
+    def test_unknown_sizes(self):
+        code, _, err = run('--only', 'busy', '--sizes', '3', '6', '7')
+        self.assertEqual(code, 2)
+        self.assertIn('busy has no language of size 6, 7 in tm_examples.yaml', err)
+        self.assertEqual(bench.unknown_sizes('busy', [3, 4, 5]), [])
+
+    def test_runs(self):
+        # every size of busy halts on a tape with two sides
+        for size, steps in [(3, 13), (4, 107)]:
+            r = bench.run_case('busy', 'generated', size, 3, 10, 0, None)
+            self.assertEqual((r['verdict'], r['steps'], r['runs']), (ACCEPTED, steps, 3))
+        # out of budget on the untimed check, that's the only run
+        r = bench.run_case('busy', 'interpreter', 5, 3, 0.01, 0, None)
+        self.assertEqual((r['verdict'], r['runs']), (LIMIT, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
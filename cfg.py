@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Context-free grammars built from pushdown automata, and an Earley parser to decide membership in O(n³)."""
+from collections import defaultdict
+
+# stack bottom and the extra states used when converting a PDA, they can't clash with the ones from YAML
+_bottom = object()
+_start = object()
+_drain = object()
+
+
+class Grammar(object):
+    """A context-free grammar, nonterminals are ints and terminals are input symbols.
+
+    `rules` is a list of (lhs, rhs, label) where rhs is a tuple of terminals and
+    nonterminals and label is whatever the rule stands for (the PDA transition it
+    came from, see `from_pda`) or None. `start` is the start nonterminal.
+    """
+
+    def __init__(self, rules, start):
+        self.rules, self.start = self._clean(rules, start)
+
+        self.by_lhs = defaultdict(list)
+        for r, (lhs, _, _) in enumerate(self.rules):
+            self.by_lhs[lhs].append(r)
+
+        # one ε-derivation (in preorder, as rule indexes) for every nullable nonterminal
+        self.null_tree = {}
+        changed = True
+        while changed:
+            changed = False
+            for r, (lhs, rhs, _) in enumerate(self.rules):
+                if lhs not in self.null_tree and all(_is_nonterminal(s) and s in self.null_tree for s in rhs):
+                    self.null_tree[lhs] = [r] + [x for s in rhs for x in self.null_tree[s]]
+                    changed = True
+        self.nullable = frozenset(self.null_tree)
+
+    @staticmethod
+    def _clean(rules, start):
+        """Drop non-generating and then unreachable nonterminals, renumbering what is left from 0."""
+
+        # generating: every nonterminal of some rule of it is generating, counted down per rule
+        missing = []
+        uses = defaultdict(list)
+        generating = set()
+        queue = []
+        for r, (lhs, rhs, _) in enumerate(rules):
+            nts = set(s for s in rhs if _is_nonterminal(s))
+            missing.append(len(nts))
+            for s in nts:
+                uses[s].append(r)
+            if not nts and lhs not in generating:
+                generating.add(lhs)
+                queue.append(lhs)
+        for nt in queue:
+            for r in uses[nt]:
+                missing[r] -= 1
+                lhs = rules[r][0]
+                if not missing[r] and lhs not in generating:
+                    generating.add(lhs)
+                    queue.append(lhs)
+        by_lhs = defaultdict(list)
+        for rule in rules:
+            if rule[0] in generating and all(s in generating for s in rule[1] if _is_nonterminal(s)):
+                by_lhs[rule[0]].append(rule)
+
+        # reachable from the start, numbered in the order they are reached
+        index = {start: 0}
+        queue = [start]
+        cleaned = []
+        for nt in queue:
+            for lhs, rhs, label in by_lhs[nt]:
+                for s in rhs:
+                    if _is_nonterminal(s) and s not in index:
+                        index[s] = len(queue)
+                        queue.append(s)
+                nrhs = tuple(index[s] if _is_nonterminal(s) else s for s in rhs)
+                cleaned.append((index[lhs], nrhs, label))
+        return cleaned, 0
+
+    @classmethod
+    def from_pda(cls, pda):
+        """The grammar of the language accepted (by final state) by a PDA.
+
+        The PDA is first turned into one accepting by empty stack: a new bottom is put
+        under the start stack and accepting states drain the stack. Pushes of more
+        than two symbols are split through fresh states. Then every nonterminal
+        (p, X, q) derives what takes the PDA from p to q popping X, the usual triple
+        construction. Rule labels are the (state, symbol, top, nstate, push) PDA
+        transitions, None for the extra ones.
+        """
+        transitions = []
+        fresh = [0]
+
+        def add(state, symbol, top, nstate, push, label):
+            while len(push) > 2:
+                fresh[0] += 1
+                tmp = (_start, fresh[0])
+                transitions.append((state, symbol, top, tmp, push[-2:], label))
+                state, symbol, top, push, label = tmp, None, push[-2], push[:-1], None
+            transitions.append((state, symbol, top, nstate, push, label))
+
+        for state, targets in pda.transition_relation.iteritems():
+            for nstate, trans in targets.iteritems():
+                for symbol, top, push in trans:
+                    push = tuple(push or ())
+                    add(state, symbol, top, nstate, push, (state, symbol, top, nstate, push))
+        add(_start, None, _bottom, pda.start_state, (pda.start_stack, _bottom), None)
+        for top in pda.stack_alphabet + [_bottom]:
+            for state in pda.accepting_states:
+                add(state, None, top, _drain, (), None)
+            add(_drain, None, top, _drain, (), None)
+
+        states = set([_start, _drain])
+        for state, _, _, nstate, _, _ in transitions:
+            states.update((state, nstate))
+
+        rules = []
+        for state, symbol, top, nstate, push, label in transitions:
+            head = (symbol,) if symbol is not None else ()
+            if not push:
+                rules.append(((state, top, nstate), head, label))
+            elif len(push) == 1:
+                for q in states:
+                    rules.append(((state, top, q), head + ((nstate, push[0], q),), label))
+            else:
+                for s in states:
+                    for q in states:
+                        rules.append(((state, top, q), head + ((nstate, push[0], s), (s, push[1], q)), label))
+        rules.append(((), ((_start, _bottom, _drain),), None))
+        return cls(rules, ())
+
+
+def _is_nonterminal(s):
+    # before cleaning nonterminals are tuples, after it they are ints
+    return isinstance(s, (tuple, int))
+
+
+class Earley(object):
+    """Earley parser with the nullable fix of Aycock and Horspool, O(n³) on any grammar.
+
+    Items are (rule, dot, origin) and every one keeps a back pointer to the item it
+    was advanced from and the child that advanced it, so a derivation can be built
+    afterwards. `parse` goes one set at a time, `items` counts how many exist and
+    `largest` the most in a single set.
+    """
+
+    def __init__(self, grammar, symbols):
+        self.grammar = grammar
+        self.symbols = symbols
+        self.items = 0
+        self.largest = 0
+        self.sets = []
+        self.accepted = None
+
+    def _add(self, j, item, back):
+        back_map, agenda, _ = self.sets[j]
+        if item not in back_map:
+            back_map[item] = back
+            agenda.append(item)
+            self.items += 1
+
+    def parse(self):
+        """Iterate over the set positions as they are done, `accepted` is set at the end."""
+        rules = self.grammar.rules
+        by_lhs = self.grammar.by_lhs
+        nullable = self.grammar.nullable
+        symbols = self.symbols
+        end = len(symbols)
+
+        self.sets = [({}, [], defaultdict(list)) for _ in xrange(end + 1)]
+        for r in by_lhs[self.grammar.start]:
+            self._add(0, (r, 0, 0), None)
+
+        for j in xrange(end + 1):
+            _, agenda, waiting = self.sets[j]
+            predicted = set()
+            symbol = symbols[j] if j < end else None
+            i = 0
+            while i < len(agenda):
+                item = agenda[i]
+                i += 1
+                r, dot, origin = item
+                lhs, rhs, _ = rules[r]
+                if dot == len(rhs):
+                    for witem in list(self.sets[origin][2][lhs]):
+                        self._add(j, (witem[0], witem[1] + 1, witem[2]), ((origin, witem), ('item', (j, item))))
+                    continue
+
+                s = rhs[dot]
+                if isinstance(s, int):
+                    waiting[s].append(item)
+                    if s not in predicted:
+                        predicted.add(s)
+                        for nr in by_lhs[s]:
+                            self._add(j, (nr, 0, j), None)
+                    if s in nullable:
+                        self._add(j, (r, dot + 1, origin), ((j, item), ('null', s)))
+                elif s == symbol:
+                    self._add(j + 1, (r, dot + 1, origin), ((j, item), None))
+            self.largest = max(self.largest, len(agenda))
+            yield j
+
+        self.accepted = self._final() is not None
+
+    def _final(self):
+        start = self.grammar.start
+        for item in self.sets[-1][1]:
+            r, dot, origin = item
+            lhs, rhs, _ = self.grammar.rules[r]
+            if lhs == start and dot == len(rhs) and origin == 0:
+                return len(self.sets) - 1, item
+
+    def derivation(self):
+        """Rule indexes of the leftmost derivation of an accepted input, that is its parse tree in preorder."""
+        rules = []
+        stack = [('item', self._final())]
+        while stack:
+            kind, node = stack.pop()
+            if kind == 'null':
+                rules.extend(self.grammar.null_tree[node])
+                continue
+            rules.append(node[1][0])
+            children = []
+            j, item = node
+            while item[1]:
+                (j, item), child = self.sets[j][0][item]
+                if child is not None:
+                    children.append(child)
+            # children were collected right to left, so the leftmost one is popped first
+            stack.extend(children)
+        return rules
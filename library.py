@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Languages read from YAML files, only built when asked for and cached on disk by the hash of the file.
+
+Documents are parsed with the C loader of PyYAML when it was built with libyaml.
+The cache of a file is a directory with every language pickled on its own as
+it gets built, and the names of all of them once they were needed, so a
+language is only ever built, written or read back when it's asked for.
+"""
+import os
+import re
+import glob
+import hashlib
+import tempfile
+import cPickle as pickle
+import yaml
+
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# a line starting with --- starts a new document, along with the directives (and comments among them) right before it
+_document_start = re.compile(r'^(?:%.*\n(?:[ \t]*(?:#.*)?\n)*)*---(?=\s|$)', re.M)
+
+
+def default_cache():
+    """Where cache files go: $LFA_CACHE, or lfa under the user's cache directory."""
+    return os.environ.get('LFA_CACHE') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache')), 'lfa')
+
+
+def sources(text):
+    """The YAML source of every document of a file, they can be parsed one at a time."""
+    starts = [m.start() for m in _document_start.finditer(text)]
+    if not starts or text[:starts[0]].strip():
+        starts.insert(0, 0)
+    return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+def _code_digest():
+    # pickles are only good for the code that made them, so the sources next to this one (not the tests) go into the key
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        if path.endswith('_tests.py'):
+            continue
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Library(object):
+    """The languages of a YAML file by name, each built by `build(document)` the first time it's asked for.
+
+    `name(document)` tells the name of a document, empty ones are skipped. `key`
+    must tell apart whatever changes what `build` gives, like the options passed
+    into it. With a `cache` directory a language is read back from there when the
+    same file was loaded with the same key before, otherwise it's built and
+    written there right away. A language that fails to build, or to pickle, is
+    just not cached.
+    """
+
+    def __init__(self, f, build, name, key=(), cache=None):
+        self.build = build
+        self.name = name
+        self._built = {}
+        self._documents = {}
+        # left to parse, last one first
+        self._sources = None
+        self._names = []
+
+        text = f.read()
+        self._text = text
+        self._dir = None
+        if cache is not None:
+            digest = hashlib.sha1(text)
+            digest.update(repr((key, _code_digest())))
+            self._dir = os.path.join(cache, digest.hexdigest())
+
+    def _path(self, name):
+        return os.path.join(self._dir, hashlib.sha1(pickle.dumps(name, pickle.HIGHEST_PROTOCOL)).hexdigest() + '.pickle')
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return True, pickle.load(f)
+        except Exception:
+            # stale or broken, a pickle may fail to load in many ways
+            return False, None
+
+    def _write(self, path, value):
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        try:
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir)
+            fd, tmp = tempfile.mkstemp(dir=self._dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            pass
+
+    def _parse(self, until=None):
+        # documents are parsed in order as far as needed, each only once
+        if self._sources is None:
+            self._sources = sources(self._text)[::-1]
+        while self._sources and until not in self._documents:
+            document = yaml.load(self._sources.pop(), Loader=Loader)
+            if document is not None:
+                self._documents[self.name(document)] = document
+                self._names.append(self.name(document))
+
+    def names(self):
+        """Names of every language in the file, in order."""
+        if self._dir is not None and self._sources is None:
+            found, names = self._read(os.path.join(self._dir, 'names.pickle'))
+            if found:
+                return list(names)
+        parsed = self._sources == []
+        self._parse()
+        if self._dir is not None and not parsed:
+            self._write(os.path.join(self._dir, 'names.pickle'), self._names)
+        return list(self._names)
+
+    def __contains__(self, name):
+        if name in self._built or self._dir is not None and os.path.exists(self._path(name)):
+            return True
+        self._parse(name)
+        return name in self._documents
+
+    def __getitem__(self, name):
+        if name not in self._built:
+            found = False
+            if self._dir is not None:
+                found, lang = self._read(self._path(name))
+            if not found:
+                self._parse(name)
+                if name not in self._documents:
+                    raise KeyError(name)
+                lang = self.build(self._documents[name])
+                if self._dir is not None:
+                    self._write(self._path(name), lang)
+            self._built[name] = lang
+        return self._built[name]
+
+    def all(self):
+        """Every language in the file, in order."""
+        return [self[name] for name in self.names()]
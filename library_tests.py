@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of library, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from library import Library, sources
+
+text = """\
+# a comment before the first one
+name: a
+value: 1
+---
+name: b
+value: 2
+---
+---
+name: c
+value: 3
+"""
+
+
+class LibraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.built = []
+
+    def tearDown(self):
+        shutil.rmtree(self.cache)
+
+    def library(self, text=text, key=(), cache=True):
+        def build(document):
+            self.built.append(document['name'])
+            return document['value'] * 10
+        return Library(StringIO(text), build, lambda document: document['name'], key, self.cache if cache else None)
+
+    def test_sources(self):
+        self.assertEqual(len(sources(text)), 4)
+        self.assertEqual(sources('a: 1\n'), ['a: 1\n'])
+        # directives go with the document after them
+        directives = '%YAML 1.1\n%TAG !e! tag:example.com,2000:\n# a comment\n---\nname: a\nvalue: 1\n...\n%YAML 1.1\n---\nname: b\nvalue: 2\n'
+        self.assertEqual(sources(directives), [directives[:directives.index('%YAML', 1)], directives[directives.index('%YAML', 1):]])
+        library = self.library(directives)
+        self.assertEqual((library.names(), library.all()), (['a', 'b'], [10, 20]))
+
+    def test_only_what_is_asked(self):
+        for cache in [False, True]:
+            del self.built[:]
+            library = self.library(cache=cache)
+            self.assertEqual(library['b'], 20)
+            self.assertEqual(library['b'], 20)
+            self.assertEqual(self.built, ['b'])
+            self.assertIn('c', library)
+            self.assertNotIn('d', library)
+            self.assertRaises(KeyError, lambda: library['d'])
+            self.assertEqual(self.built, ['b'])
+            self.assertEqual(library.names(), ['a', 'b', 'c'])
+            self.assertEqual(library.all(), [10, 20, 30])
+            self.assertEqual(self.built, ['b', 'a', 'c'])
+
+    def test_cache(self):
+        self.library()['b']
+        # a language built once is read back, the others are still built when asked for
+        library = self.library()
+        self.assertIn('b', library)
+        self.assertEqual(library['b'], 20)
+        self.assertEqual(self.built, ['b'])
+        self.assertEqual(library['c'], 30)
+        self.assertEqual(self.built, ['b', 'c'])
+        library.names()
+        library = self.library()
+        self.assertEqual((library.names(), library.all()), (['a', 'b', 'c'], [10, 20, 30]))
+        self.assertEqual(self.built, ['b', 'c', 'a'])
+
+    def test_cache_key(self):
+        self.library().all()
+        self.library(key=('other',))['a']
+        self.library(text.replace('value: 1', 'value: 4'))['a']
+        self.assertEqual(self.built, ['a', 'b', 'c', 'a', 'a'])
+        self.assertEqual(len(os.listdir(self.cache)), 3)
+
+    def test_broken_cache(self):
+        # empty, cut short, of a class that's gone and of one that's no longer there
+        for blob in ['', '\x80\x02}q', 'cnope\nThing\nq\x00)\x81q\x01.', 'clibrary\nNope\nq\x00)\x81q\x01.']:
+            del self.built[:]
+            shutil.rmtree(self.cache)
+            self.library().all()
+            for root, _, files in os.walk(self.cache):
+                for name in files:
+                    with open(os.path.join(root, name), 'wb') as f:
+                        f.write(blob)
+            library = self.library()
+            self.assertEqual((library.names(), library.all()), (['a', 'b', 'c'], [10, 20, 30]), repr(blob))
+            self.assertEqual(self.built, ['a', 'b', 'c'] * 2, repr(blob))
+
+
+if __name__ == '__main__':
+    unittest.main()
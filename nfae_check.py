@@ -7,80 +7,805 @@
 # of the MIT license.  See the LICENSE file for details.
 #
 import sys
+import time
+import mmap
+import codecs
 import argparse
-import yaml
+import batch
+from collections import deque
+from itertools import islice
+from library import Library, default_cache
+from automata import Budget, Interner, Profile, Result, ACCEPTED, REJECTED, LIMIT, write_profiles
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 VERSION = '1.0.0'
 _ignore_symbols = ['\n']
 
 
-def check(nfae, string, state=None, chain='', visited=set()):
-    """This is a depth algorithm to find a match on a string for a given nfae language."""
+class DFATooLarge(Exception):
+    pass
 
-    # start with the initial state if not already started
-    if state is None:
-        state = nfae['initial']
 
-    nchain = chain + state
+def _moves(nfae, state, symbol):
+    return ((nfae['transitions'] or {}).get(state) or {}).get(symbol) or []
 
-    try:
-        # walk through all ε-moves first
-        if None in nfae['transitions'][state]:
-            nnchain = '%s [] ' % nchain
 
-            # and recurse into every states it moves to
-            for nstate in nfae['transitions'][state][None]:
+def closure(nfae, states):
+    """The ε-closure of the given states: every state reachable from them through ε-moves only."""
+    stack = list(states)
+    closed = set(stack)
+    while stack:
+        for nstate in _moves(nfae, stack.pop(), None):
+            if nstate not in closed:
+                closed.add(nstate)
+                stack.append(nstate)
+    return frozenset(closed)
+
+
+class DFA(object):
+    """Deterministic automaton built from a nfae through the subset construction.
+
+    Every DFA state is an index into `sets`, which holds the ε-closed set of nfae
+    states it stands for, and `table[d]` maps each symbol to the next DFA state.
+    Ignored symbols loop on every state and missing entries are dead ends.
+    Building more than `max_states` states raises DFATooLarge.
+
+    With `minimize` the table is then reduced to its fewest states (see
+    `_minimize`), a state then stands for several sets and `sets` holds the
+    union of them, so it is `merged`.
+    """
+
+    merged = False
+
+    def __init__(self, nfae, max_states=None, minimize=False):
+        self.nfae = nfae
+        finals = set(nfae['finals'])
 
-                # unless that state was visited before consuming a symbol
-                # that way we have no infinite loops
-                if nstate not in visited:
+        self.start = 0
+        self.sets = [closure(nfae, [nfae['initial']])]
+        self.table = []
+        self.finals = set()
+        index = {self.sets[0]: 0}
 
-                    # remember to add the just visited state to the list
-                    chain = check(nfae, string, nstate, nnchain, visited | {nstate})
-                    if chain:
-                        return chain
-    except KeyError:
-        pass
+        d = 0
+        while d < len(self.sets):
+            dset = self.sets[d]
+            row = {}
+            for symbol in nfae['symbols']:
+                targets = set()
+                for state in dset:
+                    targets.update(_moves(nfae, state, symbol))
+                if not targets:
+                    continue
+                nset = closure(nfae, targets)
+                if nset not in index:
+                    if max_states is not None and len(self.sets) >= max_states:
+                        raise DFATooLarge('{} has more than {} states'.format(nfae['name'], max_states))
+                    index[nset] = len(self.sets)
+                    self.sets.append(nset)
+                row[symbol] = index[nset]
+            for symbol in _ignore_symbols:
+                row[symbol] = d
+            self.table.append(row)
+            if dset & finals:
+                self.finals.add(d)
+            d += 1
+        if minimize:
+            self._minimize()
 
-    # when reaching the end of the input
-    if string == '':
+    def _minimize(self):
+        """Hopcroft's O(n log n) partition refinement, states telling the same strings apart are merged.
 
-        # check if the current state is final
-        if state in nfae['finals']:
-            return nchain
+        Missing entries go to an extra dead state, whatever ends up with it is
+        dropped so dead ends are met as early as possible.
+        """
+        n = len(self.table)
+        dead = n
+        symbols = [symbol for symbol in self.nfae['symbols'] if symbol not in _ignore_symbols]
+        inverse = dict((symbol, [[] for _ in xrange(n + 1)]) for symbol in symbols)
+        for d, row in enumerate(self.table):
+            for symbol in symbols:
+                inverse[symbol][row.get(symbol, dead)].append(d)
+        for symbol in symbols:
+            inverse[symbol][dead].append(dead)
 
-        # otherwise it's a known fail
+        blocks = [block for block in (set(self.finals), set(xrange(n + 1)) - self.finals) if block]
+        block_of = [0] * (n + 1)
+        for i, block in enumerate(blocks):
+            for d in block:
+                block_of[d] = i
+        pending = set([min(xrange(len(blocks)), key=lambda i: len(blocks[i]))]) if len(blocks) > 1 else set()
+
+        # split every block by whether its states go into the splitter, only the smaller half needs to split others
+        while pending:
+            splitter = list(blocks[pending.pop()])
+            for symbol in symbols:
+                touched = {}
+                for d in splitter:
+                    for p in inverse[symbol][d]:
+                        touched.setdefault(block_of[p], set()).add(p)
+                for i, inside in touched.iteritems():
+                    if len(inside) == len(blocks[i]):
+                        continue
+                    blocks[i] -= inside
+                    j = len(blocks)
+                    blocks.append(inside)
+                    for p in inside:
+                        block_of[p] = j
+                    if i in pending or len(inside) <= len(blocks[i]):
+                        pending.add(j)
+                    else:
+                        pending.add(i)
+
+        # number the blocks in the order they are reached from the start one
+        order = {block_of[self.start]: 0}
+        queue = [block_of[self.start]]
+        for i in queue:
+            d = next(iter(blocks[i] - set([dead])))
+            for symbol in symbols:
+                j = block_of[self.table[d].get(symbol, dead)]
+                if j != block_of[dead] and j not in order:
+                    order[j] = len(queue)
+                    queue.append(j)
+
+        table = []
+        for m, i in enumerate(queue):
+            d = next(iter(blocks[i] - set([dead])))
+            row = dict.fromkeys(_ignore_symbols, m)
+            for symbol in symbols:
+                j = block_of[self.table[d].get(symbol, dead)]
+                if j in order:
+                    row[symbol] = order[j]
+            table.append(row)
+        self.sets = [frozenset().union(*[self.sets[s] for s in blocks[i] if s != dead]) for i in queue]
+        self.finals = set(m for m, i in enumerate(queue) if blocks[i] & self.finals)
+        self.table = table
+        self.start = 0
+        self.merged = True
+
+    def run(self, state, string, trail=None):
+        """Consume the string from the given DFA state and return the reached one, or None on a dead end.
+
+        When a `trail` list is given every reached state is appended to it.
+        """
+        table = self.table
+        if trail is None:
+            for symbol in string:
+                state = table[state].get(symbol)
+                if state is None:
+                    return
         else:
+            for symbol in string:
+                state = table[state].get(symbol)
+                if state is None:
+                    return
+                trail.append(state)
+        return state
+
+    def accepts(self, state):
+        return state in self.finals
+
+    def nfae_states(self, state):
+        return self.sets[state]
+
+
+_missing = object()
+
+
+class LazyDFA(object):
+    """DFA built on demand, a state is only determinized when the input reaches it.
+
+    States are the ε-closed sets of nfae states themselves. At most `max_states` of
+    them are kept with their transitions, the least recently used ones are evicted,
+    along with the transitions into them, and rebuilt if they are reached again. `hits`, `misses` and `evictions` count
+    how well the cache is doing.
+    """
+
+    def __init__(self, nfae, max_states=1024):
+        self.nfae = nfae
+        self.max_states = max_states
+        self.symbols = frozenset(nfae['symbols'])
+        self.finals = frozenset(nfae['finals'])
+        self.start = closure(nfae, [nfae['initial']])
+
+        self.rows = {}
+        self.used = {}
+        self.tick = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def _row(self, state):
+        row = self.rows.get(state)
+        if row is None:
+            if len(self.rows) >= self.max_states:
+                self._evict()
+            row = self.rows[state] = dict.fromkeys(_ignore_symbols, state)
+        self.tick += 1
+        self.used[state] = self.tick
+        return row
+
+    def _evict(self):
+        # drop the least recently used quarter at once, that way evicting is cheap on average
+        count = max(1, len(self.rows) // 4)
+        for state in sorted(self.used, key=self.used.get)[:count]:
+            del self.rows[state]
+            del self.used[state]
+        self.evictions += count
+        # and the transitions into them, so no state is kept but the ones with a row
+        rows = self.rows
+        for row in rows.itervalues():
+            for symbol in [symbol for symbol, nstate in row.iteritems() if nstate is not None and nstate not in rows]:
+                del row[symbol]
+
+    def _next(self, state, symbol):
+        if symbol not in self.symbols:
             return
+        targets = set()
+        for nstate in state:
+            targets.update(_moves(self.nfae, nstate, symbol))
+        if targets:
+            return closure(self.nfae, targets)
+
+    def run(self, state, string, trail=None):
+        """Same as `DFA.run`, determinizing the missing transitions along the way."""
+        row = self._row(state)
+        for symbol in string:
+            nstate = row.get(symbol, _missing)
+            if nstate is _missing:
+                self.misses += 1
+                nstate = row[symbol] = self._next(state, symbol)
+            else:
+                self.hits += 1
+            if nstate is None:
+                return
+            if nstate is not state:
+                state = nstate
+                row = self._row(state)
+            if trail is not None:
+                trail.append(state)
+        return state
+
+    def accepts(self, state):
+        return bool(state & self.finals)
+
+    def nfae_states(self, state):
+        return state
+
+    def stats(self):
+        return dict(states=len(self.rows), hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
+class BitNFA(object):
+    """Simulates the nfae keeping the set of active states as the bits of an integer.
 
-    # if everything reached this point there is a symbol to be processed
-    # and there isn't a ε-move available
-    symbol = string[0]
-    nstring = string[1:]
-    nchain = '%s [%s] ' % (nchain, symbol)
+    State i of the interned `states` is bit i. For every symbol the ε-closed targets of all the
+    256 combinations of each byte of the mask are precomputed, so a symbol costs a
+    lookup and an or for every 8 states, whatever the amount of active ones.
+    """
 
-    # so we skip the ignored symbols
-    if symbol in _ignore_symbols:
-        return check(nfae, nstring, state, chain)
+    def __init__(self, nfae):
+        self.nfae = nfae
+        self.states = Interner(nfae['states'])
 
-    # and fail when there is an unkown symbol
-    elif symbol not in nfae['symbols']:
-        #print nchain, 'found symbol {} not in symbols {}'.format(symbol, nfae['symbols'])
-        return
+        self.closures = [self.mask(closure(nfae, [state])) for state in self.states.values]
+        self.start = self.closures[self.states.ids[nfae['initial']]]
+        self.finals = self.mask(nfae['finals'])
 
+        self.table = dict.fromkeys(_ignore_symbols)
+        for symbol in nfae['symbols']:
+            if symbol in self.table:
+                continue
+            targets = [self.mask(closure(nfae, _moves(nfae, state, symbol))) for state in self.states.values]
+            self.table[symbol] = [self._byte_table(targets[k:k + 8]) for k in xrange(0, len(targets), 8)]
+
+    @staticmethod
+    def _byte_table(targets):
+        table = [0] * 256
+        for byte in xrange(1, 256):
+            low = byte & -byte
+            i = low.bit_length() - 1
+            table[byte] = table[byte ^ low] | (targets[i] if i < len(targets) else 0)
+        return table
+
+    def mask(self, states):
+        mask = 0
+        for state in states:
+            mask |= 1 << self.states.ids[state]
+        return mask
+
+    def run(self, state, string, trail=None):
+        """Same as `DFA.run`, a state here is the mask of active nfae states."""
+        table = self.table
+        for symbol in string:
+            chunks = table.get(symbol, _missing)
+            if chunks is _missing:
+                return
+            if chunks is not None:
+                nstate = 0
+                k = 0
+                while state:
+                    nstate |= chunks[k][state & 255]
+                    state >>= 8
+                    k += 1
+                state = nstate
+                if not state:
+                    return
+            if trail is not None:
+                trail.append(state)
+        return state
+
+    def accepts(self, state):
+        return bool(state & self.finals)
+
+    def nfae_states(self, state):
+        return frozenset(s for i, s in enumerate(self.states.values) if state >> i & 1)
+
+
+# how unicode strings are turned into code points, narrow builds count surrogates apart
+_utf, _utf_dtype = ('utf-32-le', '<u4') if sys.maxunicode > 0xffff else ('utf-16-le', '<u2')
+
+
+class BatchDFA(object):
+    """The table of a DFA as a NumPy array, to run a whole batch of strings at once.
+
+    Strings are encoded as a matrix of symbol columns padded to the longest one
+    and every string advances one symbol at a time together with the others.
+    Column 0 keeps the state, that's both the padding and the ignored symbols,
+    unknown symbols and missing entries go to an extra `dead` state.
+    """
+
+    def __init__(self, dfa):
+        symbols = [symbol for symbol in dfa.nfae['symbols']
+                   if isinstance(symbol, basestring) and len(symbol) == 1 and symbol not in _ignore_symbols]
+        n = len(dfa.table)
+        self.start = dfa.start
+        self.dead = n
+        self.unknown = len(symbols) + 1
+        self.width = len(symbols) + 2
+        self.dtype = numpy.uint8 if self.width <= 1 << 8 else numpy.uint16 if self.width <= 1 << 16 else numpy.uint32
+
+        table = numpy.full((n + 1, self.width), self.dead, numpy.intp)
+        table[:, 0] = numpy.arange(n + 1)
+        for d, row in enumerate(dfa.table):
+            for column, symbol in enumerate(symbols, 1):
+                if row.get(symbol) is not None:
+                    table[d, column] = row[symbol]
+        self.table = table.ravel()
+
+        # column of every code point up to the largest symbol, the last entry stands for all the ones past it
+        points = [(ord(symbol), column) for column, symbol in enumerate(symbols, 1)] + [(ord(symbol), 0) for symbol in _ignore_symbols]
+        self.columns = numpy.full(max(point for point, _ in points) + 2, self.unknown, self.dtype)
+        for point, column in points:
+            self.columns[point] = column
+
+        self.accepting = numpy.zeros(n + 1, bool)
+        self.accepting[sorted(dfa.finals)] = True
+        self.peaks = numpy.array([len(dfa.nfae_states(d)) for d in xrange(n)] + [0], numpy.intp)
+
+    def encode(self, strings):
+        """The (matrix, lengths) of a list of strings, either all byte strings or unicode ones."""
+        lengths = numpy.fromiter(map(len, strings), numpy.intp, len(strings))
+        if all(isinstance(string, str) for string in strings):
+            points = numpy.frombuffer(''.join(strings), numpy.uint8)
+        else:
+            points = numpy.frombuffer(u''.join(strings).encode(_utf), _utf_dtype)
+        codes = self.columns[numpy.minimum(points, len(self.columns) - 1)]
+        matrix = numpy.zeros((len(strings), lengths.max() if len(strings) else 0), self.dtype, order='F')
+        matrix[numpy.arange(matrix.shape[1]) < lengths[:, None]] = codes
+        return matrix, lengths
+
+    def run(self, matrix):
+        """The state reached by every row of an encoded matrix, `dead` for the rejected ones on the way."""
+        states = numpy.full(matrix.shape[0], self.start, numpy.intp)
+        for j in xrange(matrix.shape[1]):
+            states = self.table[states * self.width + matrix[:, j]]
+            if j & 63 == 63 and (states == self.dead).all():
+                break
+        return states
+
+    def accepts(self, strings):
+        """A boolean array telling which of the strings are accepted."""
+        return self.accepting[self.run(self.encode(strings)[0])]
+
+
+def auto(nfae, max_states=4096, minimize=False):
+    """A DFA unless it would have more than `max_states`, then a BitNFA."""
     try:
-        # otherwise test every state reachable from the current symbol
-        for nstate in nfae['transitions'][state][symbol]:
-            chain = check(nfae, nstring, nstate, nchain)
-            if chain:
-                return chain
+        return DFA(nfae, max_states, minimize)
+    except DFATooLarge:
+        return BitNFA(nfae)
+
+
+def _eps_path(nfae, source, target):
+    """Shortest list of states from source to target using only ε-moves, None if there is none."""
+    parent = {source: None}
+    queue = [source]
+    for state in queue:
+        if state == target:
+            path = []
+            while state is not None:
+                path.append(state)
+                state = parent[state]
+            return path[::-1]
+        for nstate in _moves(nfae, state, None):
+            if nstate not in parent:
+                parent[nstate] = state
+                queue.append(nstate)
+
+
+def witness(nfae, sets, string):
+    """Rebuild an accepting path from the ε-closed sets of states reached before and after each symbol.
+
+    The path is the states with the symbol read between each, [] for ε-moves, e.g.: 'q1 [] q2 [b] qf'.
+    """
+    ordered = lambda states: [s for s in nfae['states'] if s in states]
+    state = ordered(set(sets[-1]) & set(nfae['finals']))[0]
+
+    # walk backwards finding for every symbol which state it came from
+    tokens = [state]
+    for i in reversed(xrange(len(string))):
+        symbol = string[i]
+        if symbol in _ignore_symbols:
+            continue
+        for pstate in ordered(sets[i]):
+            path = None
+            for nstate in _moves(nfae, pstate, symbol):
+                path = _eps_path(nfae, nstate, state)
+                if path is not None:
+                    break
+            if path is not None:
+                break
+        for s in reversed(path[:-1]):
+            tokens += ['[]', s]
+        tokens += ['[%s]' % symbol, pstate]
+        state = pstate
+
+    # and at last how the initial state got to the first one
+    for s in reversed(_eps_path(nfae, nfae['initial'], state)[:-1]):
+        tokens += ['[]', s]
+    return ' '.join(reversed(tokens))
+
+
+def shortest_witness(nfae, string):
+    """An accepting path with the fewest ε-moves, None when the string is rejected.
+
+    Breadth-first over (position, state) pairs, each keeping only the pair it
+    was reached from and the token of that move, the path is built once a final
+    state is reached at the end. Formatted like `witness`.
+    """
+    start = 0, nfae['initial']
+    parents = {start: None}
+    queue = [start]
+    for node in queue:
+        i, state = node
+        if i == len(string) and state in nfae['finals']:
+            tokens = [state]
+            while parents[node] is not None:
+                node, token = parents[node]
+                if token is not None:
+                    tokens += [token, node[1]]
+            return ' '.join(reversed(tokens))
+        moves = [((i, nstate), '[]') for nstate in _moves(nfae, state, None)]
+        symbol = string[i] if i < len(string) else None
+        if symbol in _ignore_symbols:
+            moves.append(((i + 1, state), None))
+        elif symbol in nfae['symbols']:
+            moves += [((i + 1, nstate), '[%s]' % symbol) for nstate in _moves(nfae, state, symbol)]
+        for nnode, token in moves:
+            if nnode not in parents:
+                parents[nnode] = node, token
+                queue.append(nnode)
 
-    # and if no match was found it's a dead end
-    except KeyError:
-        pass
 
+def replay(nfae, string):
+    """The ε-closed sets of states reached before and after each symbol straight from the nfae, up to a dead end."""
+    states = closure(nfae, [nfae['initial']])
+    sets = [states]
+    for symbol in string:
+        if symbol not in _ignore_symbols:
+            states = closure(nfae, [nstate for state in states for nstate in _moves(nfae, state, symbol)]) if symbol in nfae['symbols'] else frozenset()
+            if not states:
+                break
+        sets.append(states)
+    return sets
 
-def pretty_check(langs):
+
+def counterexample(a, b):
+    """A shortest string accepted by only one of two nfaes, None when they accept the same language.
+
+    Both are determinized on the fly side by side and pairs of states are merged
+    with union-find as they are found (Hopcroft and Karp), so each state of
+    either is only expanded once.
+    """
+    symbols = sorted(set(a['symbols']) | set(b['symbols']))
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def step(nfae, states, symbol):
+        if symbol not in nfae['symbols'] or symbol in _ignore_symbols:
+            return states if symbol in _ignore_symbols else frozenset()
+        return closure(nfae, [nstate for state in states for nstate in _moves(nfae, state, symbol)])
+
+    accepts = lambda nfae, states: bool(states & set(nfae['finals']))
+    start = closure(a, [a['initial']]), closure(b, [b['initial']])
+    parent[0, start[0]] = 1, start[1]
+    queue = deque([(start, '')])
+    while queue:
+        (x, y), string = queue.popleft()
+        if accepts(a, x) != accepts(b, y):
+            return string
+        for symbol in symbols:
+            if symbol in _ignore_symbols:
+                continue
+            nx, ny = step(a, x, symbol), step(b, y, symbol)
+            rx, ry = find((0, nx)), find((1, ny))
+            if rx != ry:
+                parent[rx] = ry
+                queue.append(((nx, ny), string + symbol))
+
+
+def _count(nfae, sets, string, profile):
+    """Count on `profile` what the states in the ε-closed sets reached before each symbol did.
+
+    Every state in a set is a visit and every move out of it a transition, a state
+    with no move on the next symbol is a branch that died there.
+    """
+    for i, states in enumerate(sets):
+        for state in states:
+            profile.states[state] += 1
+            for nstate in _moves(nfae, state, None):
+                profile.transitions[state, None, nstate] += 1
+        if i == len(string) or string[i] in _ignore_symbols:
+            continue
+        symbol = string[i]
+        for state in states:
+            nstates = _moves(nfae, state, symbol)
+            if not nstates:
+                profile.backtracks[state] += 1
+            for nstate in nstates:
+                profile.transitions[state, symbol, nstate] += 1
+
+
+engines = {
+    'auto': auto,
+    'bits': BitNFA,
+    'dfa': DFA,
+    'lazy': LazyDFA,
+}
+_compiled = {}
+
+
+def compiled(nfae, engine='auto', **options):
+    """The given engine for a nfae, it is only built (with the given options) on the first call."""
+    key = id(nfae), engine
+    if key not in _compiled:
+        # keep a reference to nfae so its id is not reused
+        _compiled[key] = nfae, engines[engine](nfae, **options)
+    return _compiled[key][1]
+
+
+def _sets(nfae, engine, trail, string):
+    if getattr(engine, 'merged', False):
+        return replay(nfae, string[:len(trail) - 1])
+    return [engine.nfae_states(d) for d in trail]
+
+
+_batched = {}
+
+
+def batched(engine):
+    """The `BatchDFA` of a DFA engine, only built on the first call."""
+    if id(engine) not in _batched:
+        _batched[id(engine)] = engine, BatchDFA(engine)
+    return _batched[id(engine)][1]
+
+
+def check_all(nfae, strings, engine='auto'):
+    """Results of checking every string, without chains, a prefix shared by many of them is only read once.
+
+    The strings are walked as a trie carrying the engine state along, so the
+    symbols read are the nodes of the trie and not all the symbols of them.
+    """
+    start = time.time()
+    if isinstance(engine, basestring):
+        engine = compiled(nfae, engine)
+    found = [(REJECTED, 0)] * len(strings)
+    nodes = [(batch.trie(strings), engine.start)]
+    while nodes:
+        (ends, children), state = nodes.pop()
+        for i in ends:
+            found[i] = ACCEPTED if engine.accepts(state) else REJECTED, len(engine.nfae_states(state))
+        for symbol, child in children.iteritems():
+            nstate = engine.run(state, symbol)
+            if nstate is not None:
+                nodes.append((child, nstate))
+    elapsed = (time.time() - start) / max(len(strings), 1)
+    return [Result(verdict, None, len(string), len(string) + 1, peak, elapsed) for (verdict, peak), string in zip(found, strings)]
+
+
+def check(nfae, string, chain=True, engine='auto', budget=None, profile=None, shortest=False):
+    """Match a string on a compiled nfae language, without recursion so any length works.
+
+    Returns a Result with the accepting path (see `witness`, or `shortest_witness`
+    with `shortest`) as its chain, None when rejected or `chain` is off. The run
+    itself never builds a path, that's only done once the input is accepted. The engine is either a name from `engines` or
+    an already built one. `steps` are the symbols read, past the `max_steps` of
+    the budget the input is cut there with a LIMIT verdict. `peak` is the nfae
+    states active when it stopped, how large a DFA may grow is up to the engine.
+    On a `merged` engine the peak counts every set the state stands for and the
+    sets of the chain and profile are replayed from the nfae.
+
+    A `Profile` gets the states and moves of the sets the engine went through,
+    counted from its trail once it's done so the run itself is the usual one.
+    """
+    start = time.time()
+    budget = budget or Budget()
+    if profile is not None:
+        profile.start()
+    if isinstance(engine, basestring):
+        engine = compiled(nfae, engine)
+    if profile is not None:
+        profile.lap('compile')
+    limited = budget.max_steps is not None and len(string) > budget.max_steps
+    if limited:
+        string = string[:budget.max_steps]
+    trail = [engine.start] if (chain and not shortest) or profile is not None else None
+    state = engine.run(engine.start, string, trail)
+    if profile is not None:
+        profile.lap('run')
+        _count(nfae, _sets(nfae, engine, trail, string), string, profile)
+        profile.lap('count')
+    steps = len(string)
+    peak = len(engine.nfae_states(state)) if state is not None else 0
+    if state is None or not (limited or engine.accepts(state)):
+        return Result(REJECTED, None, steps, steps + 1, peak, time.time() - start)
+    if limited:
+        return Result(LIMIT, None, steps, steps + 1, peak, time.time() - start, reason='more than {} steps'.format(budget.max_steps))
+    path = None
+    if chain:
+        path = shortest_witness(nfae, string) if shortest else witness(nfae, _sets(nfae, engine, trail, string), string)
+    if profile is not None:
+        profile.lap('witness')
+    return Result(ACCEPTED, path, steps, steps + 1, peak, time.time() - start)
+
+
+class Matcher(object):
+    """Incremental match of an input given in chunks, only the current state is kept.
+
+    Chunks are decoded with `encoding` (None to feed strings as they are), a
+    character split between two chunks is completed on the next one.
+
+        matcher = Matcher(nfae)
+        for chunk in chunks:
+            matcher.feed(chunk)
+        accepted = matcher.finish()
+    """
+
+    def __init__(self, nfae, engine='auto', encoding='utf-8'):
+        if isinstance(engine, basestring):
+            engine = compiled(nfae, engine)
+        self.engine = engine
+        self.state = engine.start
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace') if encoding else None
+        self.read = 0
+
+    @property
+    def dead(self):
+        return self.state is None
+
+    def feed(self, chunk, final=False):
+        """Consume a chunk, returns False once no state is active anymore."""
+        if self.state is None:
+            return False
+        if self.decoder is not None:
+            chunk = self.decoder.decode(chunk, final)
+        self.read += len(chunk)
+        self.state = self.engine.run(self.state, chunk)
+        return self.state is not None
+
+    def finish(self):
+        """Whether everything fed so far is accepted."""
+        if self.decoder is not None:
+            self.feed('', final=True)
+        return self.state is not None and self.engine.accepts(self.state)
+
+
+def read_chunks(f, size=1 << 20):
+    """Iterate over the content of a file in chunks, through mmap when it can be mapped."""
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        # empty files, pipes and the like can't be mapped
+        data = None
+
+    if data is None:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        try:
+            for offset in xrange(0, len(data), size):
+                yield data[offset:offset + size]
+        finally:
+            data.close()
+
+
+def check_file(nfaes, f, engine='auto', size=1 << 20):
+    """Match the whole content of a file against every nfae in one pass without loading it into memory.
+
+    Returns whether each one accepts it, reading stops as soon as none could.
+    """
+    matchers = [Matcher(nfae, engine) for nfae in nfaes]
+    chunks = read_chunks(f, size)
+    for chunk in chunks:
+        alive = [matcher.feed(chunk) for matcher in matchers]
+        if not any(alive):
+            break
+    chunks.close()
+    return [matcher.finish() for matcher in matchers]
+
+
+def evaluate(nfae, string, engine='auto', trace=False, max_steps=None, profile=None, shortest=False):
+    """Result of a check as used by `batch`, a step is one input symbol."""
+    return summary(check(nfae, string, chain=trace, engine=engine, budget=Budget(max_steps), profile=profile, shortest=shortest), trace)
+
+
+def summary(res, trace=False):
+    """The result dict of `batch` for a Result."""
+    result = {'accepted': res.accepted, 'steps': res.steps, 'configs': res.configs, 'peak': res.peak}
+    if res.verdict == LIMIT:
+        result.update(error=LIMIT, reason=res.reason)
+    if trace and res.accepted:
+        result['trace'] = res.chain
+    return result
+
+
+def run_batch(nfaes, inputs, engine, out, size=4096):
+    """Same as `batch.run` with `evaluate` on DFA engines, but `size` inputs at a time through their `BatchDFA`.
+
+    The elapsed time of each result is its share of the time of the batch.
+    """
+    fast = [(nfae['name'], batched(compiled(nfae, engine))) for nfae in nfaes]
+    while True:
+        chunk = list(islice(inputs, size))
+        if not chunk:
+            break
+        strings = [input for _, input in chunk if not isinstance(input, batch.BadInput)]
+        results = []
+        for name, dfa in fast:
+            if not strings:
+                break
+            start = time.time()
+            matrix, lengths = dfa.encode(strings)
+            states = dfa.run(matrix)
+            results.append((name, dfa.accepting[states], lengths, dfa.peaks[states], (time.time() - start) / len(strings)))
+        k = 0
+        for id, input in chunk:
+            if isinstance(input, batch.BadInput):
+                for name, _ in fast:
+                    out.write(batch.record(name, id, input.result, 0))
+                continue
+            for name, accepted, lengths, peaks, elapsed in results:
+                steps = int(lengths[k])
+                result = {'accepted': bool(accepted[k]), 'steps': steps, 'configs': steps + 1, 'peak': int(peaks[k])}
+                out.write(batch.record(name, id, result, elapsed))
+            k += 1
+    out.flush()
+
+
+def pretty_check(nfaes, engine, max_steps=None, stats=False, profiles=None, shortest=False):
     try:
         print
         string = raw_input('> ')
@@ -93,11 +818,17 @@ def pretty_check(langs):
         print
         return False
 
-    for lang in langs:
-        nfae = lang['nfae']
+    for nfae in nfaes:
         print '%s:' % nfae['name']
-        chain = check(nfae, string)
-        print 'ACCEPTED: %s' % chain if chain else 'REJECTED!'
+        res = check(nfae, string, engine=engine, budget=Budget(max_steps), profile=(profiles or {}).get(nfae['name']), shortest=shortest)
+        if res.accepted:
+            print 'ACCEPTED: %s' % res.chain
+        elif res.verdict == LIMIT:
+            print 'LIMIT! (%s)' % res.reason
+        else:
+            print 'REJECTED!'
+        if stats:
+            print '%d steps, %d states active at the end, %.3fs' % (res.steps, res.peak, res.elapsed)
         print
 
     return True
@@ -105,16 +836,82 @@ def pretty_check(langs):
 
 def main():
     parser = argparse.ArgumentParser(prog='nfae_check', add_help=True)
+    parser.add_argument('--engine', '-e', default='auto', choices=sorted(engines), help='how languages are compiled')
+    parser.add_argument('--cache-size', default=1024, help='max states cached by the lazy engine', type=int)
+    parser.add_argument('--dfa-size', default=4096, help='max states of a DFA before the auto engine uses bit masks', type=int)
+    parser.add_argument('--minimize', action='store_true', help='reduce the DFAs of the dfa and auto engines to their fewest states')
+    parser.add_argument('--equivalent', nargs=2, help='tell whether these two languages accept the same strings, or a shortest one only one of them does', metavar='NAME')
+    parser.add_argument('--stats', action='store_true', help='show the steps and time of every check and the cache counters of the lazy engine when done')
+    parser.add_argument('--max-steps', help='max symbols read by a single check', type=int)
+    parser.add_argument('--input', '-i', action='append', help='check the content of this file instead of asking (can be repeated)', type=file)
+    parser.add_argument('--batch', '-b', nargs='?', const='-', help='check every line of this file (stdin by default) printing JSON lines', type=argparse.FileType('rb'))
+    parser.add_argument('--jobs', '-j', default=1, help='processes to spread the batch checks over', type=int)
+    parser.add_argument('--trace', action='store_true', help='include the accepting path on batch results')
+    parser.add_argument('--shortest', action='store_true', help='give the accepting path with the fewest ε-moves, found breadth-first')
+    parser.add_argument('--shared', action='store_true', help='read the whole batch first and check it as a trie, so common prefixes are read once')
+    parser.add_argument('--profile', action='store_true', help='count the states and transitions of every check and report the hottest when done (batch checks then run on one job)')
+    parser.add_argument('--profile-json', help='write those counts as JSON to this file', type=argparse.FileType('w'), metavar='FILE')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='don\'t keep the built languages in the cache directory ($LFA_CACHE or ~/.cache/lfa)')
     parser.add_argument('lang_file', nargs=1, help='file describing the language formatted in YAML', type=file)
     args = parser.parse_args()
-    langs = list(yaml.load_all(args.lang_file[0]))
+    options = {
+        'auto': {'max_states': args.dfa_size, 'minimize': args.minimize},
+        'dfa': {'minimize': args.minimize},
+        'lazy': {'max_states': args.cache_size},
+    }.get(args.engine, {})
 
-    print 'nfae_check v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
-    print 'Type the strings you want to check, you can do it multiple times:'
-    while True:
-        if not pretty_check(langs):
-            break
-    print 'Bye!'
+    # every nfae comes with its engine already built, both pickled together when cached
+    build = lambda lang: (lang['nfae'], engines[args.engine](lang['nfae'], **options))
+    key = 'nfae', args.engine, sorted(options.items())
+    nfaes = []
+    for nfae, built in Library(args.lang_file[0], build, lambda lang: lang['nfae']['name'], key, default_cache() if args.cache else None).all():
+        _compiled[id(nfae), args.engine] = nfae, built
+        nfaes.append(nfae)
+    profiles = {}
+    if args.profile or args.profile_json:
+        profiles = dict((nfae['name'], Profile()) for nfae in nfaes)
+        args.jobs = 1
+
+    if args.equivalent:
+        byname = dict((nfae['name'], nfae) for nfae in nfaes)
+        for name in args.equivalent:
+            if name not in byname:
+                parser.error('no language named {}'.format(name))
+        a, b = [byname[name] for name in args.equivalent]
+        string = counterexample(a, b)
+        if string is None:
+            print '%s and %s are equivalent' % (a['name'], b['name'])
+        else:
+            print '%s and %s differ on %r: only %s accepts it' % (a['name'], b['name'], string, (a if check(a, string, False).accepted else b)['name'])
+        sys.exit(string is not None)
+
+    vectorized = numpy is not None and args.jobs == 1 and not (args.trace or profiles or args.max_steps is not None)
+    if args.batch and args.shared and not (args.trace or profiles or args.max_steps is not None):
+        check_shared = lambda nfae, strings: [summary(res) for res in check_all(nfae, strings, args.engine)]
+        batch.run_shared([(nfae['name'], nfae) for nfae in nfaes], batch.read_inputs(args.batch), check_shared, sys.stdout)
+    elif args.batch and vectorized and all(isinstance(compiled(nfae, args.engine), DFA) for nfae in nfaes):
+        run_batch(nfaes, batch.read_inputs(args.batch), args.engine, sys.stdout)
+    elif args.batch:
+        run = lambda nfae, string: evaluate(nfae, string, args.engine, args.trace, args.max_steps, profiles.get(nfae['name']), args.shortest)
+        batch.run([(nfae['name'], nfae) for nfae in nfaes], batch.read_inputs(args.batch), run, sys.stdout, args.jobs)
+    elif args.input:
+        for f in args.input:
+            for nfae, accepted in zip(nfaes, check_file(nfaes, f, args.engine)):
+                print '%s %s: %s' % (f.name, nfae['name'], 'ACCEPTED' if accepted else 'REJECTED!')
+    else:
+        print 'nfae_check v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
+        print 'Type the strings you want to check, you can do it multiple times:'
+        while True:
+            if not pretty_check(nfaes, args.engine, args.max_steps, args.stats, profiles, args.shortest):
+                break
+        print 'Bye!'
+
+    if args.stats and args.engine == 'lazy':
+        for nfae in nfaes:
+            stats = compiled(nfae, args.engine).stats()
+            print '%s: %s' % (nfae['name'], ', '.join('%s=%s' % i for i in sorted(stats.items())))
+    if profiles:
+        write_profiles([(nfae['name'], profiles[nfae['name']]) for nfae in nfaes], sys.stderr if args.profile else None, args.profile_json)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of nfae_check, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import json
+import random
+import tempfile
+import unittest
+from itertools import product
+from StringIO import StringIO
+import yaml
+import batch
+from automata import Budget, REJECTED, LIMIT
+from nfae_check import DFA, DFATooLarge, LazyDFA, BitNFA, BatchDFA, Matcher, auto, check, check_all, check_file, counterexample, evaluate, run_batch, numpy
+from nfae_check import shortest_witness
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def examples():
+    with open(os.path.join(_here, 'examples.yaml')) as f:
+        return dict((d['nfae']['name'], d['nfae']) for d in yaml.safe_load_all(f) if d)
+
+
+def random_nfae(rand, size=None):
+    states = ['q%d' % i for i in xrange(size or rand.randint(1, 6))]
+    transitions = {}
+    for state in states:
+        for symbol in ['a', 'b', None]:
+            if rand.random() < (0.3 if symbol is None else 0.6):
+                transitions.setdefault(state, {})[symbol] = rand.sample(states, rand.randint(1, min(2, len(states))))
+    return {
+        'name': 'random',
+        'states': states,
+        'finals': rand.sample(states, rand.randint(1, len(states))),
+        'initial': states[0],
+        'symbols': ['a', 'b'],
+        'transitions': transitions,
+    }
+
+
+def random_string(rand, n=8, symbols='ab'):
+    return ''.join(rand.choice(symbols) for _ in xrange(rand.randint(0, n)))
+
+
+def accepts(nfae, string):
+    # straight from the definition: the ε-closed set of states reached after each symbol
+    def closure(states):
+        states = set(states)
+        while True:
+            more = set(n for s in states for n in (nfae['transitions'].get(s) or {}).get(None, [])) - states
+            if not more:
+                return states
+            states |= more
+    states = closure([nfae['initial']])
+    for symbol in string:
+        if symbol == '\n':
+            continue
+        if symbol not in nfae['symbols']:
+            return False
+        states = closure(n for s in states for n in (nfae['transitions'].get(s) or {}).get(symbol, []))
+    return bool(states & set(nfae['finals']))
+
+
+class WitnessMixin(object):
+
+    def assertWitness(self, nfae, string, path):
+        # a walk from the initial state to a final one reading exactly the string
+        tokens = path.split(' ')
+        self.assertEqual(tokens[0], nfae['initial'])
+        self.assertIn(tokens[-1], nfae['finals'])
+        read = ''
+        for state, move, nstate in zip(tokens[::2], tokens[1::2], tokens[2::2]):
+            symbol = move[1:-1] or None
+            self.assertIn(nstate, (nfae['transitions'].get(state) or {}).get(symbol, []), path)
+            read += symbol or ''
+        self.assertEqual(read, string.replace('\n', ''))
+
+
+def doubling(n):
+    # (a|b)*a(a|b)^n needs 2^(n+1) states as a DFA
+    states = ['q%d' % i for i in xrange(n + 2)]
+    transitions = dict((states[i], {'a': [states[i + 1]], 'b': [states[i + 1]]}) for i in xrange(1, n + 1))
+    transitions['q0'] = {'a': ['q0', 'q1'], 'b': ['q0']}
+    return {'name': 'big', 'states': states, 'finals': [states[-1]], 'initial': 'q0', 'symbols': ['a', 'b'], 'transitions': transitions}
+
+
+class DFATest(WitnessMixin, unittest.TestCase):
+
+    def test_examples(self):
+        langs = examples()
+        self.assertEqual(check(langs['maq1'], 'abb').chain, 'q1 [a] q1 [b] q2 [b] qf')
+        self.assertEqual(check(langs['maq1'], 'ab').verdict, REJECTED)
+        self.assertEqual(check(langs['maq2'], 'ab').chain, 'q1 [a] q1 [] q2 [b] q2 [] q3 [] qf')
+        self.assertEqual(check(langs['maq2'], 'cb').verdict, REJECTED)
+
+    def test_like_the_nfae(self):
+        rand = random.Random(0)
+        for _ in xrange(200):
+            nfae = random_nfae(rand)
+            dfa = DFA(nfae)
+            for _ in xrange(10):
+                string = random_string(rand, symbols='ab\nc')
+                expected = accepts(nfae, string)
+                res = check(nfae, string, engine=dfa)
+                self.assertEqual(res.accepted, expected, (nfae, string))
+                if expected:
+                    self.assertWitness(nfae, string, res.chain)
+
+    def test_max_states(self):
+        n = 6
+        nfae = doubling(n)
+        self.assertRaises(DFATooLarge, DFA, nfae, 100)
+        self.assertEqual(len(DFA(nfae).table), 2 ** (n + 1))
+        self.assertIsInstance(auto(nfae, 100), BitNFA)
+        self.assertTrue(check(nfae, 'ba' + 'b' * n, engine=auto(nfae, 100)).accepted)
+
+    def test_step_budget(self):
+        res = check(examples()['maq1'], 'abcabc', budget=Budget(3))
+        self.assertEqual((res.verdict, res.steps, res.reason), (LIMIT, 3, 'more than 3 steps'))
+
+
+def outcome(res):
+    return res.verdict, res.chain, res.steps, res.peak
+
+
+class EngineTest(unittest.TestCase):
+    """The other engines give the same results the DFA gives."""
+
+    def assertLikeDFA(self, build, seed):
+        rand = random.Random(seed)
+        for _ in xrange(200):
+            nfae = random_nfae(rand)
+            dfa, engine = DFA(nfae), build(nfae)
+            for _ in xrange(10):
+                string = random_string(rand, 12, symbols='ab\nc')
+                self.assertEqual(outcome(check(nfae, string, engine=engine)), outcome(check(nfae, string, engine=dfa)), (nfae, string))
+
+    def test_lazy(self):
+        self.assertLikeDFA(LazyDFA, 1)
+        # with room for two states it keeps evicting and rebuilding them
+        self.assertLikeDFA(lambda nfae: LazyDFA(nfae, max_states=2), 2)
+        maq1 = examples()['maq1']
+        engine = LazyDFA(maq1, max_states=2)
+        self.assertEqual(outcome(check(maq1, 'abccabbc' * 8, engine=engine)), outcome(check(maq1, 'abccabbc' * 8, engine=DFA(maq1))))
+        self.assertLessEqual(len(engine.rows), 2)
+        self.assertGreater(engine.evictions, 0)
+
+    def test_lazy_bound(self):
+        # the states kept, as rows or as targets of their transitions, are never more than the room there is
+        nfae = doubling(6)
+        engine = LazyDFA(nfae, max_states=8)
+        rand = random.Random(3)
+        for _ in xrange(20):
+            check(nfae, random_string(rand, 200), engine=engine)
+            kept = set(engine.rows) | set(nstate for row in engine.rows.itervalues() for nstate in row.itervalues() if nstate is not None)
+            self.assertLessEqual(len(kept), 8)
+        self.assertGreater(engine.evictions, 0)
+
+    def test_bits(self):
+        self.assertLikeDFA(BitNFA, 4)
+        # more than 8 states take more than a byte of the mask
+        rand = random.Random(5)
+        for _ in xrange(50):
+            nfae = random_nfae(rand, 20)
+            string = random_string(rand, 30)
+            self.assertEqual(outcome(check(nfae, string, engine=BitNFA(nfae))), outcome(check(nfae, string, engine=DFA(nfae))), (nfae, string))
+
+
+def strings(n, symbols='ab'):
+    for k in xrange(n + 1):
+        for string in product(symbols, repeat=k):
+            yield ''.join(string)
+
+
+class MinimizeTest(WitnessMixin, unittest.TestCase):
+
+    def test_like_the_nfae(self):
+        rand = random.Random(8)
+        for _ in xrange(200):
+            nfae = random_nfae(rand)
+            minimal = DFA(nfae, minimize=True)
+            for _ in xrange(10):
+                string = random_string(rand, symbols='ab\nc')
+                res = check(nfae, string, engine=minimal)
+                self.assertEqual(res.accepted, accepts(nfae, string), (nfae, string))
+                if res.accepted:
+                    self.assertWitness(nfae, string, res.chain)
+
+    def test_fewest_states(self):
+        # every state but the start of an empty language can still accept, and any two are told apart by a string
+        # shorter than the states there are
+        rand = random.Random(9)
+        for _ in xrange(100):
+            nfae = random_nfae(rand)
+            minimal = DFA(nfae, minimize=True)
+            n = len(minimal.table)
+            self.assertLessEqual(n, len(DFA(nfae).table))
+            tails = list(strings(n))
+            signatures = set()
+            for d in xrange(n):
+                signature = tuple(minimal.run(d, tail) is not None and minimal.accepts(minimal.run(d, tail)) for tail in tails)
+                self.assertTrue(any(signature) or d == minimal.start, (nfae, d))
+                signatures.add(signature)
+            self.assertEqual(len(signatures), n, nfae)
+
+    def test_equivalent(self):
+        langs = examples()
+        self.assertIsNone(counterexample(langs['maq1'], langs['maq1']))
+        self.assertEqual(counterexample(langs['maq1'], langs['maq2']), '')
+        rand = random.Random(10)
+        for _ in xrange(300):
+            a, b = random_nfae(rand, 3), random_nfae(rand, 3)
+            found = counterexample(a, b)
+            # the shortest string only one accepts, if there is one it's shorter than both DFAs together
+            expected = next((s for s in strings(len(DFA(a).table) + len(DFA(b).table)) if accepts(a, s) != accepts(b, s)), None)
+            if expected is None:
+                self.assertIsNone(found, (a, b))
+            else:
+                self.assertEqual(len(found), len(expected), (a, b))
+                self.assertNotEqual(accepts(a, found), accepts(b, found))
+            self.assertIsNone(counterexample(a, dict(a, states=a['states'][::-1])))
+
+
+class SharedTest(unittest.TestCase):
+
+    def test_like_check(self):
+        rand = random.Random(13)
+        for _ in xrange(100):
+            nfae = random_nfae(rand)
+            bases = [random_string(rand, 6) for _ in xrange(5)]
+            inputs = [base + random_string(rand, 4, symbols='ab\nc') for base in bases for _ in xrange(4)]
+            for engine in [DFA(nfae), LazyDFA(nfae), BitNFA(nfae)]:
+                found = check_all(nfae, inputs, engine)
+                for input, res in zip(inputs, found):
+                    expected = check(nfae, input, False, engine)
+                    self.assertEqual((res.verdict, res.steps, res.configs, res.peak), (expected.verdict, expected.steps, expected.configs, expected.peak), (nfae, input))
+
+
+def fewest_moves(nfae, string):
+    # the fewest ε-moves of an accepting path, relaxing every state on each position until nothing changes
+    moves = lambda state, symbol: (nfae['transitions'].get(state) or {}).get(symbol, [])
+    dist = {nfae['initial']: 0}
+    for i in xrange(len(string) + 1):
+        changed = True
+        while changed:
+            changed = False
+            for state, d in dist.items():
+                for nstate in moves(state, None):
+                    if dist.get(nstate, d + 2) > d + 1:
+                        dist[nstate] = d + 1
+                        changed = True
+        if i < len(string):
+            if string[i] == '\n':
+                continue
+            ndist = {}
+            for state, d in dist.iteritems():
+                for nstate in moves(state, string[i]):
+                    ndist[nstate] = min(ndist.get(nstate, d), d)
+            dist = ndist
+    found = [d for state, d in dist.iteritems() if state in nfae['finals']]
+    return min(found) if found else None
+
+
+class ShortestTest(WitnessMixin, unittest.TestCase):
+
+    def test_fewest_epsilon_moves(self):
+        rand = random.Random(14)
+        for _ in xrange(300):
+            nfae = random_nfae(rand)
+            string = random_string(rand, 8, symbols='ab\n')
+            path = shortest_witness(nfae, string)
+            expected = fewest_moves(nfae, string)
+            if expected is None:
+                self.assertIsNone(path)
+                continue
+            self.assertWitness(nfae, string, path)
+            self.assertEqual(path.split(' ').count('[]'), expected, (nfae, string, path))
+            self.assertEqual(check(nfae, string, shortest=True).chain, path)
+
+    def test_example(self):
+        # breadth-first the ε-moves come before the symbols
+        self.assertEqual(check(examples()['maq2'], 'aa', shortest=True).chain, 'q1 [] q2 [] q3 [] qf [a] qf [a] qf')
+
+
+class MatcherTest(unittest.TestCase):
+
+    def test_chunks(self):
+        rand = random.Random(6)
+        for _ in xrange(200):
+            nfae = random_nfae(rand)
+            string = random_string(rand, 20, symbols='ab\nc')
+            matcher = Matcher(nfae, DFA(nfae), encoding=None)
+            i = 0
+            while i < len(string):
+                n = rand.randint(1, 5)
+                matcher.feed(string[i:i + n])
+                i += n
+            self.assertEqual(matcher.finish(), accepts(nfae, string), (nfae, string))
+
+    def test_file(self):
+        # a character of two bytes split between chunks is still read as one
+        rand = random.Random(7)
+        for _ in xrange(50):
+            nfaes = [random_nfae(rand) for _ in xrange(3)]
+            for nfae in nfaes:
+                nfae['symbols'] = ['a', u'\xe9']
+                for moves in nfae['transitions'].itervalues():
+                    if 'b' in moves:
+                        moves[u'\xe9'] = moves.pop('b')
+            string = random_string(rand, 20, symbols=u'a\xe9')
+            with tempfile.TemporaryFile() as f:
+                f.write(string.encode('utf-8'))
+                f.seek(0)
+                found = check_file(nfaes, f, size=3)
+            self.assertEqual(found, [accepts(nfae, string) for nfae in nfaes], (nfaes, string))
+
+    def test_empty_file(self):
+        maq2 = examples()['maq2']
+        with tempfile.TemporaryFile() as f:
+            self.assertEqual(check_file([maq2, examples()['maq1']], f), [True, False])
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class BatchTest(unittest.TestCase):
+
+    def test_accepts(self):
+        rand = random.Random(11)
+        for _ in xrange(100):
+            nfae = random_nfae(rand)
+            dfa = DFA(nfae, minimize=rand.random() < 0.5)
+            strings = [random_string(rand, 12, symbols=u'ab\nc\xe9') for _ in xrange(20)]
+            self.assertEqual(list(BatchDFA(dfa).accepts(strings)), [accepts(nfae, string) for string in strings], nfae)
+            self.assertEqual(list(BatchDFA(dfa).accepts([str(string) for string in strings if u'\xe9' not in string])),
+                             [accepts(nfae, string) for string in strings if u'\xe9' not in string], nfae)
+
+    def test_like_one_by_one(self):
+        # the same lines a batch gives, but for the time each took
+        lines = lambda out: [dict(json.loads(line), elapsed=None) for line in out.getvalue().splitlines()]
+        rand = random.Random(12)
+        for _ in xrange(50):
+            nfaes = [random_nfae(rand) for _ in xrange(2)]
+            # lines that couldn't be decoded among them
+            inputs = list(enumerate([random_string(rand, 12, symbols=u'abc\xe9') if rand.random() < 0.9 else batch.BadInput('not utf-8')
+                                     for _ in xrange(30)], 1))
+            out, expected = StringIO(), StringIO()
+            run_batch(nfaes, iter(inputs), 'dfa', out, size=7)
+            batch.run([(nfae['name'], nfae) for nfae in nfaes], iter(inputs), lambda nfae, string: evaluate(nfae, string, 'dfa'), expected)
+            self.assertEqual(lines(out), lines(expected), nfaes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,164 +7,39 @@
 # of the MIT license.  See the LICENSE file for details.
 #
 import sys
-import signal
 import argparse
-import yaml
+import batch
+from library import Library, default_cache
+from automata import Budget, Result, MalformedInput, TimeoutError, LIMIT, timeout, pretty_chain, Profile, write_profiles, PDA
 
 VERSION = '1.0.0'
 _ignore_symbols = ['\n']
 
 
-def symb(s):
-    return unicode(s) if s is not None else None
-
-
-def pretty_symb(s):
-    return symb(s) or u'ɛ'
-
-
-class MalformedDesc(Exception):
-    pass
-
-
-class MalformedInput(Exception):
-    pass
-
-
-class TimeoutError(Exception):
-    pass
-
-
-class PDA(object):
-
-    def __init__(self, dikt):
-        self.name = dikt['name']
-
-        self.input_alphabet = map(symb, dikt['input_alphabet'])
-
-        self.states = dikt['states']
-        self.start_state = dikt['start_state']
-        self.accepting_states = dikt['accepting_states']
-
-        self.stack_alphabet = map(symb, dikt['stack_alphabet'])
-        self.start_stack = symb(dikt['start_stack'])
-        self._check_stack_symbol(self.start_stack)
-
-        trans = self.transition_relation = {}
-        for state in self.states:
-            trans[state] = {}
-            for nstate in self.states:
-                trans[state][nstate] = []
-
-        transition_relation = dikt['transition_relation']
-        for state, symbols in transition_relation.iteritems():
-            self._check_state(state)
-
-            for symbol, stack_symbols in symbols.iteritems():
-                symbol = symb(symbol)
-                self._check_symbol(symbol)
-
-                for stack_symbol, state_stack_output in stack_symbols.iteritems():
-                    stack_symbol = symb(stack_symbol)
-                    self._check_stack_symbol(stack_symbol)
-
-                    if len(state_stack_output) != 2:
-                        raise MalformedDesc('{} is not a pair'.format(state_stack_output))
-                    state_output, stack_output = state_stack_output
-                    self._check_state(state_output)
-                    stack_output = symb(stack_output)
-                    if stack_output is not None:
-                        stack_output = list(stack_output)
-                        map(self._check_stack_symbol, stack_output)
-
-                    trans[state][state_output].append((symbol, stack_symbol, stack_output))
-
-
-    def _check_state(self, state):
-        if state not in self.states:
-            raise MalformedDesc('{} is not a valid state ({} are valid)'.format(state, self.states))
-
-    def _check_symbol(self, symbol):
-        if symbol is None:
-            return
-        if symbol not in self.input_alphabet:
-            raise MalformedDesc('{} is not a valid symbol ({} are valid)'.format(symbol, self.input_alphabet))
-
-    def _check_stack_symbol(self, symbol):
-        if symbol is None:
-            return
-        if symbol not in self.stack_alphabet:
-            raise MalformedDesc('{} is not a valid stack symbol ({} are valid)'.format(symbol, self.stack_alphabet))
-
-    def _check_input(self, state, input, stack, chain, visited=[]):
-        nchain = chain + [(state, input, stack)]
-
-        if input == '' and state in self.accepting_states:
-            return True, nchain
-
-
-        nsymbol_map = self.transition_relation[state]
-        for nstate, ntrans in nsymbol_map.iteritems():
-            for nsymbol, ntop, nstack_top in ntrans:
-
-                if nsymbol is None:
-                    ninput = input[:]
-                    if (state, stack) in visited:
-                        continue
-                    nvisited = visited + [(state, stack)]
-
-                else:
-                    if input == '':
-                        continue
-
-                    symbol = input[0]
-                    if symbol not in self.input_alphabet:
-                        raise MalformedInput(symbol)
-                    ninput = input[1:]
-                    nvisited = []
-
-                    if symbol != nsymbol:
-                        continue
-
-                top = stack[0]
-                nstack = (nstack_top or []) + stack[1:]
-
-                if top != ntop:
-                    continue
-
-                ok, fchain = self._check_input(nstate, ninput, nstack, nchain, nvisited)
-                if ok:
-                    return ok, fchain
-
-        return False, nchain
-
-    def check(self, input_string):
-        """This is a depth algorithm to find a match on a string for a given pushdown automaton (PDA)."""
-        return self._check_input(self.start_state, input_string, [self.start_stack], [])
+def evaluate(lang, input, maxtime=None, max_steps=None, trace=False, max_stack=None, profile=None, shortest=False):
+    """Result of a check as used by `batch`, a step is one configuration the search went through."""
+    try:
+        res = lang.check(input, Budget(max_steps, maxtime, max_stack), chain=trace, profile=profile, shortest=shortest)
+    except MalformedInput as e:
+        return malformed(e, lang.steps)
+    return summary(res, trace)
 
 
-# from: http://stackoverflow.com/questions/2281850/timeout-function-if-it-takes-too-long-to-finish
-class timeout(object):
-    def __init__(self, seconds=1, error_message='Timeout'):
-        self.seconds = seconds
-        self.error_message = error_message
-    def handle_timeout(self, signum, frame):
-        raise TimeoutError(self.error_message)
-    def __enter__(self):
-        signal.signal(signal.SIGALRM, self.handle_timeout)
-        signal.alarm(self.seconds)
-    def __exit__(self, type, value, traceback):
-        signal.alarm(0)
+def malformed(e, steps=0):
+    return {'accepted': None, 'steps': steps, 'error': u'SYMBOL {} REJECTED'.format(e.message)}
 
 
-def pretty_chain(chain):
-    chain = [(unicode(s), pretty_symb(i), pretty_symb(''.join(z))) for s, i, z in chain]
-    li = max(len(i) for _, i, _ in chain)
-    lz = max(len(z) for _, _, z in chain)
-    return u' ⊢\n'.join(u'({}, {:>{}s}, {:>{}s})'.format(s, i, li, z, lz) for s, i, z in chain)
+def summary(res, trace=False):
+    """The result dict of `batch` for a Result."""
+    result = {'accepted': res.accepted, 'steps': res.steps, 'configs': res.configs, 'peak': res.peak}
+    if res.verdict == LIMIT:
+        result.update(error=LIMIT, reason=res.reason)
+    if trace and res.accepted:
+        result['trace'] = [(s, i, u''.join(z)) for s, i, z in res.chain]
+    return result
 
 
-def pretty_check(langs, maxtime):
+def pretty_check(langs, maxtime, max_steps=None, max_stack=None, stats=False, profiles=None, shortest=False):
     try:
         print
         input = raw_input('> ')
@@ -181,8 +56,17 @@ def pretty_check(langs, maxtime):
         print '%s:' % lang.name
         try:
             with timeout(seconds=maxtime):
-                ok, ch = lang.check(input)
-                print 'ACCEPTED:\n%s' % pretty_chain(ch) if ok else 'REJECTED!'
+                res = lang.check(input, Budget(max_steps, None, max_stack), profile=(profiles or {}).get(lang.name), shortest=shortest)
+            if res.accepted:
+                print 'ACCEPTED:\n%s' % pretty_chain(res.chain)
+            elif res.verdict == LIMIT:
+                print 'LIMIT! (%s)' % res.reason
+            else:
+                print 'REJECTED!'
+            if stats and lang.engine == 'earley':
+                print '%d Earley items, %d in a single set at most, %.3fs' % (res.steps, res.peak, res.elapsed)
+            elif stats:
+                print '%d steps, %d configurations, %d on the stack at most, %.3fs' % (res.steps, res.configs, res.peak, res.elapsed)
         except MalformedInput as e:
             print 'SYMBOL {} REJECTED'.format(e.message)
         except TimeoutError:
@@ -194,20 +78,45 @@ def pretty_check(langs, maxtime):
 
 def main():
     parser = argparse.ArgumentParser(prog='pda_check', add_help=True)
-    parser.add_argument('--timeout', '-t', default=1, help='max time in seconds of a single check', type=int)
+    parser.add_argument('--timeout', '-t', default=1, help='max time in seconds of a single check', type=float)
+    parser.add_argument('--batch', '-b', nargs='?', const='-', help='check every line of this file (stdin by default) printing JSON lines', type=argparse.FileType('rb'))
+    parser.add_argument('--engine', '-e', default='search', choices=PDA.engines, help='how acceptance is decided')
+    parser.add_argument('--max-steps', help='max steps of a single check', type=int)
+    parser.add_argument('--max-stack', help='max symbols on the stack of a single check', type=int)
+    parser.add_argument('--stats', action='store_true', help='show the steps, configurations, stack and time of every check')
+    parser.add_argument('--jobs', '-j', default=1, help='processes to spread the batch checks over', type=int)
+    parser.add_argument('--trace', action='store_true', help='include the accepting configurations on batch results')
+    parser.add_argument('--shortest', action='store_true', help='search non-deterministic PDAs breadth-first, for the shortest accepting configurations')
+    parser.add_argument('--shared', action='store_true', help='read the whole batch first and check it as a trie, so a deterministic PDA runs common prefixes once')
+    parser.add_argument('--profile', action='store_true', help='count the states and transitions of every check and report the hottest when done (batch checks then run on one job)')
+    parser.add_argument('--profile-json', help='write those counts as JSON to this file', type=argparse.FileType('w'), metavar='FILE')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='don\'t keep the built languages in the cache directory ($LFA_CACHE or ~/.cache/lfa)')
     parser.add_argument('lang_file', nargs=1, help='file describing the language formatted in YAML', type=file)
     args = parser.parse_args()
-    langs = list(yaml.load_all(args.lang_file[0]))
+    build = lambda lang: PDA(lang['pda'], args.engine)
+    langs = Library(args.lang_file[0], build, lambda lang: lang['pda']['name'], ('pda', args.engine), default_cache() if args.cache else None).all()
     maxtime = args.timeout
-
-    print 'pda_check v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
-    print 'Give the input you want to check, you can do it multiple times:'
-
-    langs = [PDA(lang['pda']) for lang in langs]
-    while True:
-        if not pretty_check(langs, maxtime):
-            break
-    print 'Bye!'
+    profiles = {}
+    if args.profile or args.profile_json:
+        profiles = dict((lang.name, Profile()) for lang in langs)
+        args.jobs = 1
+
+    if args.batch and args.shared and not (args.trace or profiles):
+        check_shared = lambda lang, inputs: [summary(res) if isinstance(res, Result) else malformed(res) for res in lang.check_all(inputs, Budget(args.max_steps, maxtime, args.max_stack))]
+        batch.run_shared([(lang.name, lang) for lang in langs], batch.read_inputs(args.batch), check_shared, sys.stdout)
+    elif args.batch:
+        run = lambda lang, input: evaluate(lang, input, maxtime, args.max_steps, args.trace, args.max_stack, profiles.get(lang.name), args.shortest)
+        batch.run([(lang.name, lang) for lang in langs], batch.read_inputs(args.batch), run, sys.stdout, args.jobs, 2 * maxtime + 1)
+    else:
+        print 'pda_check v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
+        print 'Give the input you want to check, you can do it multiple times:'
+        while True:
+            if not pretty_check(langs, maxtime, args.max_steps, args.max_stack, args.stats, profiles, args.shortest):
+                break
+        print 'Bye!'
+
+    if profiles:
+        write_profiles([(lang.name, profiles[lang.name]) for lang in langs], sys.stderr if args.profile else None, args.profile_json)
 
 
 if __name__ == '__main__':
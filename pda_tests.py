@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of the PDA checks, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import random
+import unittest
+from itertools import product
+import yaml
+from automata import PDA, Budget, Profile, MalformedInput, ACCEPTED, REJECTED, LIMIT
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def examples():
+    with open(os.path.join(_here, 'pda_examples.yaml')) as f:
+        return dict((d['pda']['name'], d['pda']) for d in yaml.safe_load_all(f) if d)
+
+
+def balanced(s):
+    depth = 0
+    for c in s:
+        depth += 1 if c == '(' else -1
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+# the languages of the examples
+languages = {
+    '0n1n': lambda s: s == '0' * (len(s) // 2) + '1' * (len(s) // 2),
+    'wwr': lambda s: len(s) % 2 == 0 and s == s[::-1],
+    'bal': balanced,
+    'bal2': balanced,
+    'xcxr': lambda s: s.count('c') == 1 and s.split('c')[0] == s.split('c')[1][::-1],
+    '0n1n_det': lambda s: s == '0' * (len(s) // 2) + '1' * (len(s) // 2),
+}
+
+
+def strings(alphabet, n):
+    for k in xrange(n + 1):
+        for symbols in product(alphabet, repeat=k):
+            yield ''.join(symbols)
+
+
+def random_pda(rand):
+    states = ['q%d' % i for i in xrange(rand.randint(1, 4))]
+    tops = ['Z', 'A', 'B']
+    relation = {}
+    for state in states:
+        for top in tops:
+            for symbol in ['0', '1', None]:
+                if rand.random() < (0.25 if symbol is None else 0.5):
+                    push = ''.join(rand.choice(tops) for _ in xrange(rand.choice([0, 1, 1, 2, 2, 3])))
+                    relation.setdefault(state, {}).setdefault(symbol, {})[top] = [rand.choice(states), push or None]
+    return {
+        'name': 'random',
+        'states': states,
+        'input_alphabet': ['0', '1'],
+        'stack_alphabet': tops,
+        'start_state': 'q0',
+        'start_stack': 'Z',
+        'accepting_states': rand.sample(states, rand.randint(1, len(states))),
+        'transition_relation': relation,
+    }
+
+
+class ChainMixin(object):
+
+    def assertChain(self, pda, input, chain):
+        # every configuration follows from the previous one by a transition of the pda
+        self.assertEqual(chain[0], (pda.start_state, input, [pda.start_stack]))
+        self.assertIn(chain[-1][0], pda.accepting_states)
+        self.assertEqual(chain[-1][1], '')
+        for (state, rest, stack), (nstate, nrest, nstack) in zip(chain, chain[1:]):
+            moves = pda.transition_relation[state][nstate]
+            self.assertTrue(any(
+                top == stack[0] and nstack == (push or []) + stack[1:] and nrest == (rest[1:] if symbol is not None else rest)
+                and (symbol is None or rest[:1] == symbol) for symbol, top, push in moves),
+                ((state, rest, stack), (nstate, nrest, nstack)))
+
+
+def reachable(pda, input, depth):
+    # whether a final configuration is reached straight on the transition relation, with stacks up to `depth` symbols
+    start = pda.start_state, input, (pda.start_stack,)
+    seen, todo = set([start]), [start]
+    while todo:
+        state, rest, stack = todo.pop()
+        if state in pda.accepting_states and not rest:
+            return True
+        for nstate, moves in pda.transition_relation[state].iteritems():
+            for symbol, top, push in moves:
+                if stack and top == stack[0] and (symbol is None or rest[:1] == symbol):
+                    nconfig = nstate, rest[1:] if symbol is not None else rest, tuple(push or ()) + stack[1:]
+                    if len(nconfig[2]) <= depth and nconfig not in seen:
+                        seen.add(nconfig)
+                        todo.append(nconfig)
+    return False
+
+
+class SearchTest(ChainMixin, unittest.TestCase):
+
+    def test_examples(self):
+        for name, d in sorted(examples().iteritems()):
+            pda = PDA(d)
+            for input in strings(pda.input_alphabet, 6):
+                res = pda.check(input)
+                self.assertEqual(res.accepted, languages[name](input), (name, input))
+                if res.accepted:
+                    self.assertChain(pda, input, res.chain)
+
+    def test_like_the_relation(self):
+        # the interned and indexed transitions are the ones of the relation
+        for name, d in sorted(examples().iteritems()):
+            pda = PDA(d)
+            for input in strings(pda.input_alphabet, 6):
+                self.assertEqual(pda.check(input, chain=False).accepted, reachable(pda, input, len(input) + 2), (name, input))
+        rand = random.Random(7)
+        for _ in xrange(150):
+            pda = PDA(random_pda(rand))
+            for input in strings('01', 4):
+                res = pda.check(input, Budget(5000))
+                if res.verdict == LIMIT:
+                    continue
+                # a bound on the stack only takes acceptances away
+                if res.accepted:
+                    self.assertChain(pda, input, res.chain)
+                else:
+                    self.assertFalse(reachable(pda, input, 8), input)
+
+    def test_budget(self):
+        wwr = PDA(examples()['wwr'])
+        res = wwr.check('0110' * 10, Budget(20))
+        self.assertEqual((res.verdict, res.steps, res.reason), (LIMIT, 21, 'more than 20 steps'))
+        res = wwr.check('0110' * 10, Budget(None, None, 5))
+        self.assertEqual((res.verdict, res.peak, res.reason), (LIMIT, 6, 'more than 5 stack symbols'))
+        self.assertEqual(wwr.check('0110' * 10, Budget(None, None, 21)).verdict, ACCEPTED)
+
+    def test_profile(self):
+        # every configuration the search goes into comes from a transition, but the first one
+        for name, d in sorted(examples().iteritems()):
+            pda = PDA(d)
+            for input in strings(pda.input_alphabet, 4):
+                profile = Profile()
+                res = pda.check(input, profile=profile)
+                self.assertEqual(res.accepted, pda.check(input).accepted)
+                self.assertEqual(sum(profile.states.values()), res.configs if not pda.deterministic else res.steps + 1, (name, input))
+                self.assertEqual(sum(profile.transitions.values()), sum(profile.states.values()) - 1, (name, input))
+                if not pda.deterministic and not res.accepted:
+                    self.assertEqual(sum(profile.backtracks.values()), res.configs, (name, input))
+
+    def test_malformed(self):
+        self.assertRaises(MalformedInput, PDA(examples()['wwr']).check, '012')
+
+
+def fewest_configurations(pda, input, most):
+    # breadth-first straight on the transition relation, up to `most` configurations long
+    level = set([(pda.start_state, input, (pda.start_stack,))])
+    for n in xrange(1, most + 1):
+        if any(state in pda.accepting_states and not rest for state, rest, _ in level):
+            return n
+        nlevel = set()
+        for state, rest, stack in level:
+            for nstate, moves in pda.transition_relation[state].iteritems():
+                for symbol, top, push in moves:
+                    if stack and top == stack[0] and (symbol is None or rest[:1] == symbol):
+                        nlevel.add((nstate, rest[1:] if symbol is not None else rest, tuple(push or ()) + stack[1:]))
+        level = nlevel
+
+
+class ShortestTest(ChainMixin, unittest.TestCase):
+
+    def test_examples(self):
+        wwr = PDA(examples()['wwr'])
+        res = wwr.check('0110', shortest=True)
+        self.assertEqual(len(res.chain), 7)
+        self.assertChain(wwr, '0110', res.chain)
+
+    def test_no_longer_than_the_search(self):
+        rand = random.Random(3)
+        for _ in xrange(150):
+            pda = PDA(random_pda(rand))
+            for input in strings('01', 4):
+                expected = pda.check(input, Budget(5000))
+                if expected.verdict == LIMIT:
+                    continue
+                res = pda.check(input, Budget(50000), shortest=True)
+                self.assertEqual(res.verdict, expected.verdict, input)
+                if res.accepted:
+                    self.assertChain(pda, input, res.chain)
+                    self.assertLessEqual(len(res.chain), len(expected.chain))
+                    self.assertEqual(fewest_configurations(pda, input, len(res.chain)), len(res.chain), input)
+
+
+class DeterministicTest(ChainMixin, unittest.TestCase):
+    """The single pass of a deterministic PDA decides like the search."""
+
+    def test_examples(self):
+        langs = examples()
+        self.assertTrue(PDA(langs['0n1n_det']).deterministic)
+        self.assertFalse(PDA(langs['0n1n']).deterministic)
+
+    def test_like_the_search(self):
+        rand = random.Random(1)
+        found = 0
+        while found < 100:
+            d = random_pda(rand)
+            run = PDA(d)
+            if not run.deterministic:
+                continue
+            found += 1
+            search = PDA(d)
+            search.deterministic = False
+            for input in strings('01', 5):
+                expected = search.check(input, Budget(2000))
+                res = run.check(input, Budget(2000))
+                if expected.verdict != LIMIT:
+                    self.assertEqual(res.verdict, expected.verdict, (d, input))
+                if res.accepted:
+                    self.assertChain(run, input, res.chain)
+
+    def test_endless_epsilon_moves(self):
+        # pushes A forever on ε, then goes around on Z without consuming anything
+        d = {
+            'states': ['p', 'q'],
+            'input_alphabet': ['0'],
+            'stack_alphabet': ['A', 'Z'],
+            'start_state': 'p',
+            'start_stack': 'Z',
+            'accepting_states': ['q'],
+            'transition_relation': {'p': {None: {'Z': ['p', 'AZ'], 'A': ['p', 'AA']}}},
+        }
+        pda = PDA(d)
+        self.assertTrue(pda.deterministic)
+        self.assertEqual(pda.check('0', Budget(1000, None, 50)).verdict, REJECTED)
+        d['transition_relation'] = {'p': {None: {'Z': ['q', 'Z']}}, 'q': {None: {'Z': ['p', 'Z']}}}
+        self.assertEqual(PDA(d).check('0', Budget(1000)).verdict, REJECTED)
+
+    # the same (state, top) comes back on ε-moves, but lower on the stack each time
+    popping = {
+        'states': ['p', 'r', 'q'],
+        'input_alphabet': ['0'],
+        'stack_alphabet': ['A', 'Z'],
+        'start_state': 'p',
+        'start_stack': 'Z',
+        'accepting_states': ['q'],
+        'transition_relation': {'p': {'0': {'Z': ['r', 'AAAZ']}}, 'r': {None: {'A': ['r', None], 'Z': ['q', 'Z']}}},
+    }
+
+    def test_epsilon_pops(self):
+        pda = PDA(self.popping)
+        self.assertTrue(pda.deterministic)
+        res = pda.check('0')
+        self.assertEqual((res.verdict, res.steps), (ACCEPTED, 5))
+        self.assertChain(pda, '0', res.chain)
+
+
+class SharedTest(unittest.TestCase):
+
+    def test_like_check(self):
+        rand = random.Random(2)
+        found = 0
+        while found < 60:
+            pda = PDA(random_pda(rand))
+            if not pda.deterministic:
+                continue
+            found += 1
+            inputs = sorted(set(a + b for a in strings('01', 4) for b in ['', '0', '11', '2', '0101']))
+            for budget in [(None, None), (15, None), (None, 4)]:
+                for input, res in zip(inputs, pda.check_all(inputs, Budget(budget[0], None, budget[1]))):
+                    if '2' in input:
+                        self.assertIsInstance(res, MalformedInput)
+                        continue
+                    expected = pda.check(input, Budget(budget[0], None, budget[1]), chain=False)
+                    self.assertEqual((res.verdict, res.steps, res.configs, res.peak, res.reason),
+                                     (expected.verdict, expected.steps, expected.configs, expected.peak, expected.reason), (input, budget))
+
+    def test_epsilon_pops(self):
+        pda = PDA(DeterministicTest.popping)
+        self.assertEqual([res.verdict for res in pda.check_all(['', '0', '00'])], [REJECTED, ACCEPTED, REJECTED])
+
+
+class EarleyTest(ChainMixin, unittest.TestCase):
+
+    def test_examples(self):
+        for name, d in sorted(examples().iteritems()):
+            pda = PDA(d, 'earley')
+            for input in strings(pda.input_alphabet, 6):
+                res = pda.check(input)
+                self.assertEqual(res.accepted, languages[name](input), (name, input))
+                if res.accepted:
+                    self.assertChain(pda, input, res.chain)
+
+    def test_like_the_search(self):
+        rand = random.Random(0)
+        for _ in xrange(150):
+            d = random_pda(rand)
+            search, earley = PDA(d), PDA(d, 'earley')
+            for input in strings('01', 4):
+                expected = search.check(input, Budget(5000), chain=False)
+                if expected.verdict == LIMIT:
+                    continue
+                res = earley.check(input)
+                self.assertEqual(res.verdict, expected.verdict, (d, input))
+                if res.accepted:
+                    self.assertChain(earley, input, res.chain)
+
+    def test_peak(self):
+        earley = PDA(examples()['wwr'], 'earley')
+        res = earley.check('0110')
+        self.assertEqual((res.verdict, res.steps, res.configs), (ACCEPTED, earley.steps, earley.configs))
+        self.assertGreater(res.peak, 0)
+        self.assertLess(res.peak, res.steps)
+        self.assertGreater(earley.check('0110' * 4).peak, res.peak)
+        res = earley.check('0110' * 4, Budget(30))
+        self.assertEqual(res.verdict, LIMIT)
+        self.assertGreater(res.peak, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
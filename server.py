@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""A server that keeps every language of some YAML files built and checks the inputs sent to it.
+
+It listens on a TCP or Unix socket for JSON lines like {"lang": "maq1", "input":
+"abb", "max_steps": 100, "trace": false}, `id` is echoed back and only `lang`
+and `input` are needed, and answers each with the JSON line a batch check
+would give. NFA-ε, PDA and TM files can be mixed, every document is told apart
+by its keys. A name in more than one file is taken from the last one.
+
+Connections are served on threads, checks run on a pool of processes forked
+with every language already built so only the input and the result go between
+them. On SIGHUP the files are read again, the ones that changed are rebuilt and
+a new pool takes over, the old one finishes what it was given.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import hashlib
+import argparse
+import threading
+import SocketServer
+import multiprocessing
+from StringIO import StringIO
+import batch
+import nfae_check
+import pda_check
+import tm_check
+from library import Library, default_cache
+from automata import Budget, PDA
+
+VERSION = '1.0.0'
+
+
+def kind(document):
+    """Which checker a YAML document is written for: nfae, pda or tm, the last also has PDAs named outside of them."""
+    if 'nfae' in document:
+        return 'nfae'
+    if 'name' in document:
+        return 'tm'
+    return 'pda'
+
+
+def _name(document):
+    k = kind(document)
+    return document[k]['name'] if k != 'tm' else document['name']
+
+
+def _build(document):
+    # the nfae goes with its engine, like on nfae_check
+    k = kind(document)
+    if k == 'nfae':
+        return k, (document['nfae'], nfae_check.engines['auto'](document['nfae']))
+    if k == 'pda':
+        return k, PDA(document['pda'])
+    return k, tm_check.machine(document)
+
+
+def evaluate(lang, input, maxtime=None, max_steps=None, trace=False):
+    """The result dict of `batch` for a check of input on a (kind, lang) pair."""
+    k, lang = lang
+    if k == 'nfae':
+        nfae, built = lang
+        return nfae_check.summary(nfae_check.check(nfae, input, trace, built, Budget(max_steps, maxtime)), trace)
+    if k == 'pda':
+        return pda_check.evaluate(lang, input, maxtime, max_steps, trace)
+    return tm_check.evaluate(lang, input, maxtime, max_steps, trace)
+
+
+class Languages(object):
+    """The languages of a set of files by name, `reload` rebuilds the files whose content changed."""
+
+    def __init__(self, paths, cache=None):
+        self.paths = paths
+        self.cache = cache
+        self._files = {}
+        self.langs = {}
+        self.reload()
+
+    def reload(self):
+        """Read every file again and rebuild the changed ones, gives their paths.
+
+        A file that fails to load keeps its languages as they were and the error
+        goes to stderr.
+        """
+        changed = []
+        for path in self.paths:
+            try:
+                with open(path, 'rb') as f:
+                    text = f.read()
+                digest = hashlib.sha1(text).hexdigest()
+                if path in self._files and self._files[path][0] == digest:
+                    continue
+                library = Library(StringIO(text), _build, _name, ('server',), self.cache)
+                langs = dict(zip(library.names(), library.all()))
+            except Exception as e:
+                sys.stderr.write(u'{}: {}\n'.format(path, e).encode('utf-8'))
+                continue
+            self._files[path] = digest, langs
+            changed.append(path)
+        if changed:
+            self.langs = dict((name, lang) for path in self.paths if path in self._files for name, lang in self._files[path][1].iteritems())
+        return changed
+
+
+_langs = None
+
+
+def _init(langs):
+    global _langs
+    _langs = langs
+    # the server handles these, a hangup or ^C of the terminal reaches the workers too
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _check(name, input, maxtime, max_steps, trace):
+    start = time.time()
+    result = evaluate(_langs[name], input, maxtime, max_steps, trace)
+    return result, time.time() - start
+
+
+class Checker(object):
+    """Answers requests on the languages, checking them on `jobs` processes or on the calling thread with 0.
+
+    `current` is the pool and the languages its workers have, swapped together
+    on a reload so a request always goes to a pool that knows its language.
+    """
+
+    def __init__(self, languages, jobs=None, maxtime=None):
+        self.languages = languages
+        self.jobs = jobs
+        self.maxtime = maxtime
+        self._lock = threading.Lock()
+        self.current = None, {}
+        self._start(languages.langs)
+
+    def _start(self, langs):
+        pool = multiprocessing.Pool(self.jobs, _init, (langs,)) if self.jobs != 0 else None
+        with self._lock:
+            old, self.current = self.current[0], (pool, langs)
+        if old is not None:
+            # what the old pool was given is still waited for, its workers then exit
+            old.close()
+            joiner = threading.Thread(target=old.join)
+            joiner.daemon = True
+            joiner.start()
+
+    def reload(self):
+        changed = self.languages.reload()
+        if changed:
+            self._start(self.languages.langs)
+        return changed
+
+    def answer(self, line):
+        """The JSON line answering a request line."""
+        start = time.time()
+        try:
+            request = json.loads(line)
+            name, input = request['lang'], request['input']
+            if not isinstance(input, basestring):
+                raise TypeError('input must be a string')
+            id = request.get('id')
+            max_steps = request.get('max_steps')
+            if max_steps is not None and (not isinstance(max_steps, (int, long)) or isinstance(max_steps, bool) or max_steps < 0):
+                raise TypeError('max_steps must be a non-negative integer')
+            trace = bool(request.get('trace'))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return batch.record(None, None, {'accepted': None, 'steps': None, 'error': 'BAD REQUEST', 'reason': str(e)}, time.time() - start)
+        with self._lock:
+            pool, langs = self.current
+        if name not in langs:
+            return batch.record(name, id, {'accepted': None, 'steps': None, 'error': 'LANG NOT FOUND'}, time.time() - start)
+        try:
+            if pool is None:
+                result, elapsed = evaluate(langs[name], unicode(input), self.maxtime, max_steps, trace), time.time() - start
+            else:
+                # the budget ends the check itself, this is only if a worker gets stuck
+                result, elapsed = self._submit(pool, name, unicode(input), max_steps, trace).get(2 * self.maxtime + 1 if self.maxtime else None)
+        except multiprocessing.TimeoutError:
+            result, elapsed = {'accepted': None, 'steps': None, 'error': 'TIMEDOUT'}, time.time() - start
+        except Exception as e:
+            # the connection still gets an answer
+            result, elapsed = {'accepted': None, 'steps': None, 'error': 'CRASHED', 'reason': str(e)}, time.time() - start
+        return batch.record(name, id, result, elapsed)
+
+    def _submit(self, pool, name, input, max_steps, trace):
+        # a reload may close the pool once it's taken (it then asserts on Python 2), the check goes to the one taking over if it has the language
+        while True:
+            try:
+                return pool.apply_async(_check, (name, input, self.maxtime, max_steps, trace))
+            except (AssertionError, ValueError):
+                with self._lock:
+                    npool, langs = self.current
+                if npool is pool or name not in langs:
+                    raise
+                pool = npool
+
+    def close(self):
+        pool = self.current[0]
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+class Handler(SocketServer.StreamRequestHandler):
+    """Answers every line of a connection in order."""
+
+    def handle(self):
+        # iterating the file would read ahead, waiting on requests not sent yet
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            self.wfile.write(self.server.checker.answer(line))
+            self.wfile.flush()
+
+
+class TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='server', add_help=True)
+    parser.add_argument('--unix', '-u', help='listen on a Unix socket at this path instead of TCP', metavar='PATH')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', '-p', default=4242, help='TCP port to listen on', type=int)
+    parser.add_argument('--jobs', '-j', help='processes to run the checks on, the number of CPUs by default, 0 checks on the connection threads', type=int)
+    parser.add_argument('--timeout', '-t', default=3, help='max time in seconds of a single check', type=float)
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='don\'t keep the built languages in the cache directory ($LFA_CACHE or ~/.cache/lfa)')
+    parser.add_argument('lang_files', nargs='+', help='files describing the languages formatted in YAML', metavar='lang_file')
+    args = parser.parse_args()
+    for path in args.lang_files:
+        if not os.path.isfile(path):
+            parser.error('no file {}'.format(path))
+
+    languages = Languages([os.path.abspath(path) for path in args.lang_files], default_cache() if args.cache else None)
+    if not languages.langs:
+        parser.error('no languages loaded')
+    checker = Checker(languages, args.jobs, args.timeout)
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = UnixServer(args.unix, Handler)
+        where = args.unix
+    else:
+        server = TCPServer((args.host, args.port), Handler)
+        where = '%s:%d' % server.server_address
+    server.checker = checker
+
+    def hangup(signum, frame):
+        changed = checker.reload()
+        sys.stderr.write('reloaded %d files\n' % len(changed))
+
+    signal.signal(signal.SIGHUP, hangup)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write('server v%s -- (c) 2014 Jan Segre <jan@segre.in>\n' % VERSION)
+    sys.stderr.write('%d languages, listening on %s\n' % (len(languages.langs), where))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        checker.close()
+        if args.unix:
+            os.unlink(args.unix)
+
+
+if __name__ == '__main__':
+    main()
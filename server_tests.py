@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of server, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+from StringIO import StringIO
+from server import Languages, Checker
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+class CheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for name in ['examples.yaml', 'pda_examples.yaml', 'tm_examples.yaml']:
+            self.paths.append(os.path.join(self.dir, name))
+            shutil.copy(os.path.join(_here, name), self.paths[-1])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def answer(self, checker, request):
+        result = json.loads(checker.answer(json.dumps(request) if isinstance(request, dict) else request))
+        del result['elapsed']
+        return result
+
+    def test_answers(self):
+        checker = Checker(Languages(self.paths), jobs=0)
+        self.assertEqual(self.answer(checker, {'lang': 'maq1', 'input': 'abb', 'id': 7}),
+                         {'lang': 'maq1', 'id': 7, 'accepted': True, 'steps': 3, 'configs': 4, 'peak': 3})
+        self.assertEqual(self.answer(checker, {'lang': 'maq1', 'input': 'abb', 'trace': True})['trace'], 'q1 [a] q1 [b] q2 [b] qf')
+        self.assertTrue(self.answer(checker, {'lang': 'wwr', 'input': '0110'})['accepted'])
+        self.assertFalse(self.answer(checker, {'lang': 'anbn', 'input': 'aab'})['accepted'])
+        self.assertEqual(self.answer(checker, {'lang': 'busy4', 'input': '', 'max_steps': 10})['error'], 'LIMIT')
+
+    def test_bad_requests(self):
+        checker = Checker(Languages(self.paths), jobs=0)
+        self.assertEqual(self.answer(checker, '{"lang": "maq1"')['error'], 'BAD REQUEST')
+        self.assertEqual(self.answer(checker, {'lang': 'maq1'})['error'], 'BAD REQUEST')
+        self.assertEqual(self.answer(checker, {'lang': 'maq1', 'input': 3})['error'], 'BAD REQUEST')
+        self.assertEqual(self.answer(checker, {'lang': 'nope', 'input': ''})['error'], 'LANG NOT FOUND')
+        for max_steps in ['10', 1.5, -1, True, [10]]:
+            self.assertEqual(self.answer(checker, {'lang': 'maq1', 'input': 'abb', 'max_steps': max_steps})['error'], 'BAD REQUEST', max_steps)
+        self.assertEqual(self.answer(checker, {'lang': 'maq1', 'input': 'abb', 'max_steps': 0})['error'], 'LIMIT')
+        # a check that fails still gets its answer
+        checker.current[1]['broken'] = 'tm', None
+        self.assertEqual(self.answer(checker, {'lang': 'broken', 'input': ''})['error'], 'CRASHED')
+
+    def test_pool(self):
+        checker = Checker(Languages(self.paths), jobs=2, maxtime=3)
+        try:
+            for input, accepted in [('abb', True), ('ab', False), ('c' * 1000 + 'b', False)]:
+                self.assertEqual(self.answer(checker, {'lang': 'maq1', 'input': input})['accepted'], accepted)
+        finally:
+            checker.close()
+
+    def test_reload(self):
+        languages = Languages(self.paths)
+        self.assertEqual(languages.reload(), [])
+        with open(self.paths[0], 'a') as f:
+            f.write('---\nnfae:\n  name: maq3\n  states: [q]\n  finals: [q]\n  initial: q\n  symbols: [a]\n  transitions: {q: {a: [q]}}\n')
+        with open(self.paths[1], 'a') as f:
+            f.write('---\n[broken\n')
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            self.assertEqual(languages.reload(), [self.paths[0]])
+            self.assertTrue(sys.stderr.getvalue().startswith(self.paths[1]))
+        finally:
+            sys.stderr = stderr
+        self.assertIn('maq3', languages.langs)
+        # the broken file keeps what it had
+        self.assertIn('wwr', languages.langs)
+        checker = Checker(languages, jobs=0)
+        self.assertTrue(self.answer(checker, {'lang': 'maq3', 'input': 'aaa'})['accepted'])
+
+    def test_reload_in_flight(self):
+        # requests sent while the files are reloaded go to a pool knowing their language
+        checker = Checker(Languages(self.paths), jobs=2, maxtime=3)
+        answers, latest, stop = [], ['maq1'], threading.Event()
+
+        def ask():
+            while not stop.is_set():
+                name = latest[0]
+                try:
+                    answers.append((name, self.answer(checker, {'lang': name, 'input': 'aa'})))
+                except Exception as e:
+                    answers.append((name, e))
+        threads = [threading.Thread(target=ask) for _ in xrange(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for i in xrange(5):
+                latest[0] = 'new%d' % i
+                with open(self.paths[0], 'a') as f:
+                    f.write('---\nnfae:\n  name: new%d\n  states: [q]\n  finals: [q]\n  initial: q\n  symbols: [a]\n  transitions: {q: {a: [q]}}\n' % i)
+                self.assertEqual(checker.reload(), [self.paths[0]])
+                self.assertTrue(self.answer(checker, {'lang': 'new%d' % i, 'input': 'aa'})['accepted'])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            checker.close()
+        self.assertTrue(answers)
+        reference = Checker(Languages(self.paths), jobs=0)
+        for name, answer in answers:
+            # a new language is either not there yet or checked
+            if answer != {'lang': name, 'id': None, 'accepted': None, 'steps': None, 'error': 'LANG NOT FOUND'}:
+                self.assertEqual(answer, self.answer(reference, {'lang': name, 'input': 'aa'}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,10 +6,20 @@
 # This software may be modified and distributed under the terms
 # of the MIT license.  See the LICENSE file for details.
 #
-import signal
+import sys
+import time
+import hashlib
 import argparse
-import yaml
+import linecache
+import batch
+import multiprocessing
+from array import array
+from collections import deque
+from itertools import islice
+from random import getrandbits
 from abc import ABCMeta, abstractmethod
+from library import Library, default_cache
+from automata import Budget, Interner, Stacks, symb, pretty_symb, Malformed, MalformedDesc, MalformedInput, LimitError, TimeoutError, NonHalting, timeout, measured, Result, ACCEPTED, REJECTED, LIMIT, NONHALTING, Profile, write_profiles, PDA
 
 VERSION = '1.0.0'
 _ignore_symbols = ['\n']
@@ -18,41 +28,39 @@ _ignore_symbols = ['\n']
 # UTILS
 
 
-def symb(s):
-    return unicode(s) if s is not None else None
-
-
-def pretty_symb(s):
-    return symb(s) or u'ɛ'
-
-
 def pretty_list(l):
     return u'[{}]'.format(u', '.join(u'%s' % i for i in l))
 
 
-class Malformed(Exception):
-    pass
-
-
-class MalformedDesc(Malformed):
-    pass
+def machine(dikt, engine='compiled', cycles=True, max_frontier=None, workers=1):
+    if 'dtm' in dikt:
+        return DTM(dikt['dtm'], engine, cycles)
+    elif 'ntm' in dikt:
+        return NTM(dikt['ntm'], max_frontier, workers)
+    elif 'pda' in dikt:
+        return PDA(dikt['pda'])
 
 
-class MalformedInput(Malformed):
-    pass
+def _short_tape(cells):
+    # compiled tape of a DTM with more symbols than a byte holds
+    return array('H', cells)
 
 
-class TimeoutError(Exception):
-    pass
+# functions of generated DTMs by their source, compiled once for any DTM giving it
+_runners = {}
 
 
-def machine(dikt):
-    if 'dtm' in dikt:
-        return DTM(dikt['dtm'])
-    elif 'ntm' in dikt:
-        return NTM(dikt['ntm'])
-    elif 'pda' in dikt:
-        return PDA(dikt['pda'])
+def _runner(source):
+    """The `run` function defined by the source of a generated DTM."""
+    run = _runners.get(source)
+    if run is None:
+        filename = '<dtm %s>' % hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+        # so tracebacks and pdb can show its lines
+        linecache.cache[filename] = len(source), None, source.splitlines(True), filename
+        namespace = {'LimitError': LimitError}
+        exec compile(source, filename, 'exec') in namespace
+        run = _runners[source] = namespace['run']
+    return run
 
 
 class growing_list(list):
@@ -79,118 +87,6 @@ class growing_list(list):
         return list.__getitem__(self, index)
 
 
-class PDA(object):
-
-    def __init__(self, dikt):
-        self.input_alphabet = map(symb, dikt['input_alphabet'])
-
-        self.states = dikt['states']
-        self.start_state = dikt['start_state']
-        self.final_states = dikt['final_states']
-
-        self.stack_alphabet = map(symb, dikt['stack_alphabet'])
-        self.start_stack = symb(dikt['start_stack'])
-        self._check_stack_symbol(self.start_stack)
-
-        trans = self.transition_relation = {}
-        for state in self.states:
-            trans[state] = {}
-            for nstate in self.states:
-                trans[state][nstate] = []
-
-        transition_relation = dikt['transition_relation']
-        for state, symbols in transition_relation.iteritems():
-            self._check_state(state)
-
-            for symbol, stack_symbols in symbols.iteritems():
-                symbol = symb(symbol)
-                self._check_symbol(symbol)
-
-                for stack_symbol, state_stack_output in stack_symbols.iteritems():
-                    stack_symbol = symb(stack_symbol)
-                    self._check_stack_symbol(stack_symbol)
-
-                    if len(state_stack_output) != 2:
-                        raise MalformedDesc('{} is not a pair'.format(state_stack_output))
-                    state_output, stack_output = state_stack_output
-                    self._check_state(state_output)
-                    stack_output = symb(stack_output)
-                    if stack_output is not None:
-                        stack_output = list(stack_output)
-                        map(self._check_stack_symbol, stack_output)
-
-                    trans[state][state_output].append((symbol, stack_symbol, stack_output))
-
-
-    def _check_state(self, state):
-        if state not in self.states:
-            raise MalformedDesc('{} is not a valid state ({} are valid)'.format(state, self.states))
-
-    def _check_symbol(self, symbol):
-        if symbol is None:
-            return
-        if symbol not in self.input_alphabet:
-            raise MalformedDesc('{} is not a valid symbol ({} are valid)'.format(symbol, self.input_alphabet))
-
-    def _check_stack_symbol(self, symbol):
-        if symbol is None:
-            return
-        if symbol not in self.stack_alphabet:
-            raise MalformedDesc('{} is not a valid stack symbol ({} are valid)'.format(symbol, self.stack_alphabet))
-
-    def _check_input(self, state, input, stack, chain, visited=[]):
-        nchain = chain + [(state, input, stack)]
-
-        if input == '' and state in self.final_states:
-            return True, nchain
-
-
-        nsymbol_map = self.transition_relation[state]
-        for nstate, ntrans in nsymbol_map.iteritems():
-            for nsymbol, ntop, nstack_top in ntrans:
-
-                if nsymbol is None:
-                    ninput = input[:]
-                    if (state, stack) in visited:
-                        continue
-                    nvisited = visited + [(state, stack)]
-
-                else:
-                    if input == '':
-                        continue
-
-                    symbol = input[0]
-                    if symbol not in self.input_alphabet:
-                        raise MalformedInput(symbol)
-                    ninput = input[1:]
-                    nvisited = []
-
-                    if symbol != nsymbol:
-                        continue
-
-                top = stack[0]
-                nstack = (nstack_top or []) + stack[1:]
-
-                if top != ntop:
-                    continue
-
-                ok, fchain = self._check_input(nstate, ninput, nstack, nchain, nvisited)
-                if ok:
-                    return ok, fchain
-
-        return False, nchain
-
-    def check(self, input_string):
-        """This is a depth algorithm to find a match on a string for a given pushdown automaton (PDA)."""
-        return self._check_input(self.start_state, input_string, [self.start_stack], [])
-
-    def pretty_chain(self, chain):
-        chain = [(unicode(s), pretty_symb(i), pretty_symb(''.join(z))) for s, i, z in chain]
-        li = max(len(i) for _, i, _ in chain)
-        lz = max(len(z) for _, _, z in chain)
-        return u' ⊢\n'.join(u'({}, {:>{}s}, {:>{}s})'.format(s, i, li, z, lz) for s, i, z in chain)
-
-
 class TM:
     __metaclass__ = ABCMeta
 
@@ -198,6 +94,9 @@ class TM:
     right_markers = u'RDrd>→'
 
     def __init__(self, dikt):
+        # transitions taken, configurations gone through and most tape cells used by the last check
+        self.steps = self.configs = self.peak = 0
+
         # Q is a finite, non-empty set of states
         self.states = dikt['states']
 
@@ -260,9 +159,19 @@ class TM:
             return 1
 
     @abstractmethod
-    def check(self, input_string):
+    def check(self, input_string, budget=None, chain=True, profile=None):
         return False, []
 
+    def check_all(self, inputs, budget=None):
+        """Results of checking every input, without chains, an input that's malformed gets the error instead."""
+        results = []
+        for input in inputs:
+            try:
+                results.append(self.check(input, budget, chain=False))
+            except MalformedInput as e:
+                results.append(e)
+        return results
+
     def pretty_chain(self, chain):
         chain = [(unicode(s), str(i), pretty_symb(''.join(z))) for s, i, z in chain]
         li = max(len(i) for _, i, _ in chain)
@@ -271,7 +180,24 @@ class TM:
 
 
 class DTM(TM):
-    def __init__(self, dikt):
+    """Deterministic Turing machine.
+
+    The `interpreter` engine walks the transition function as given in YAML. The
+    `compiled` one numbers states and tape symbols with small ints: the tape is a
+    bytearray (an array of shorts past 256 symbols) and the transitions a flat list
+    indexed by `state * width + symbol`, symbols not in Γ all share the last column
+    which has no transitions. The `macro` one runs the same tables on a run-length
+    tape for long runs, taking a whole sweep over a block as one move. The
+    `generated` one turns the tables into Python source with a block per state,
+    kept as `source`, and runs that (see `_generate`).
+
+    With `cycles` the compiled engine also watches for configurations that repeat,
+    maybe with the head shifted, and gives up on them with a NONHALTING verdict.
+    """
+
+    engines = ['compiled', 'interpreter', 'macro', 'generated']
+
+    def __init__(self, dikt, engine='compiled', cycles=True):
         super(DTM, self).__init__(dikt)
         trans_map = dikt['transition_function']
         t = self.transition_function = {}
@@ -287,54 +213,997 @@ class DTM(TM):
                 self._check_state(nstate)
                 t[(state, symbol)] = nsymbol, self._conv_shift(shift), nstate
 
+        self.engine = engine
+        self.cycles = cycles
+        if engine != 'interpreter':
+            self._compile()
+        if engine == 'generated':
+            self.source = self._generate()
+
+    def _compile(self):
+        # the blank may be outside of Γ, then reading it halts like any other unknown symbol
+        self.symbol_ids = Interner(self.tape_alphabet + [self.blank_symbol])
+        self.state_ids = Interner(self.states)
+        self._unknown = len(self.symbol_ids)
+        width = self._width = self._unknown + 1
+        self._tape = bytearray if width <= 256 else _short_tape
+
+        # a state is the index of its row, so the next one is stored already multiplied
+        self._blank = self._tape([self.symbol_ids.ids[self.blank_symbol]])
+        self.table = table = [None] * (len(self.state_ids) * width)
+        for (state, symbol), (nsymbol, shift, nstate) in self.transition_function.iteritems():
+            base = self.state_ids.ids[state] * width
+            table[base + self.symbol_ids.ids[symbol]] = self.symbol_ids.ids[nsymbol], shift, self.state_ids.ids[nstate] * width
+        self._finals = frozenset(self.state_ids.ids[state] * width for state in self.final_states)
+        self._start = self.state_ids.ids[self.start_state] * width
+
     def _transition(self, state, symbol):
         return self.transition_function.get((state, symbol))
 
-    def check(self, input_string):
+    @measured
+    def check(self, input_string, budget=None, chain=True, profile=None):
+        """Whether the DTM halts on a final state, and the configurations it went through.
+
+        Gives a Result, `steps` are the transitions taken and `peak` the tape cells
+        given or visited, going over the budget ends it with a LIMIT verdict.
+        `chain` is True for every configuration, an int N for the last N of them or
+        False for none. The compiled engine only logs what each step writes, the
+        configurations come as a `Trace` that rebuilds tapes as it's read, the
+        macro and generated engines run compiled for them.
+
+        A `Profile` gets every transition and state from that same log, so those
+        also run compiled when profiled.
+        """
+        budget = budget or Budget()
+        try:
+            return self._check(input_string, budget, chain, profile)
+        finally:
+            # every step reaches a configuration but the one falling off the tape, which sets them itself
+            self.configs = self.configs or self.steps + 1
+
+    def runs_on(self, chain=True, profiled=False, shared=False):
+        """The engine that really runs a check asking for these, or for a `check_all` if `shared`.
+
+        Configurations, profiles and shared runs all come from the compiled tables.
+        """
+        if self.engine in ('macro', 'generated') and (chain or profiled or shared):
+            return 'compiled'
+        return self.engine
+
+    def _check(self, input_string, budget, chain, profile):
+        if profile is not None:
+            profile.start()
+        if self.engine == 'interpreter':
+            return self._interpret(input_string, budget, chain, profile)
+        cells = ([self.start_marker] if self.has_start_marker else []) + list(unicode(input_string))
+        if not chain and profile is None:
+            if self.engine == 'macro':
+                return self._sweep(cells, budget), []
+            if self.engine == 'generated':
+                return self._run_generated(cells, budget), []
+            return self._execute(cells, budget)[0], []
+
+        log = [] if chain is True else deque(maxlen=chain or 1)
+        reached = [] if chain and chain is not True else None
+        accepted, tape, origin = self._execute(cells, budget, log.append if profile is None else self._profiler(profile, log.append),
+                                               reached=reached.append if reached is not None else None)
+        if profile is not None:
+            profile.lap('run')
+        if not chain:
+            return accepted, []
+        if chain is True:
+            return accepted, Trace(self, cells, {}, log)
+
+        # the tape at the first configuration kept, undoing the later writes on the final one
+        values = self.symbol_ids.values
+        blank = self._blank[0]
+        kept = (self.configs or self.steps + 1) - len(log)
+        right = [values[z] if z != self._unknown else cells[i] for i, z in enumerate(tape[origin:])]
+        first = growing_list(right, none=self.blank_symbol, double=self.double_sided)
+        for i in xrange(origin):
+            if tape[i] != blank:
+                first[i - origin] = values[tape[i]]
+        for _, _, wpos, _, read in islice(reversed(log), len(log) - 1):
+            first[wpos] = values[read]
+        left = dict((-i - 1, z) for i, z in enumerate(first._dark_side)) if self.double_sided else {}
+        # like on the full chain the tape only goes as far as the input and the cells written before it
+        end = len(cells)
+        if kept:
+            end = max(end, 1 + max([cell for steps, cell in reached if steps < kept] or [0]))
+        if profile is not None:
+            profile.lap('chain')
+        return accepted, Trace(self, first[:end], left, log)
+
+    def check_all(self, inputs, budget=None):
+        """Results of checking every input, without chains, a run shared by inputs with a common prefix is only done once.
+
+        The inputs are walked as a trie. The run of a node goes for everything
+        under it until the head first reads the cell past it, there it's suspended
+        and taken on once for every way the inputs go on. They all run on the
+        compiled tables and the time of the budget goes for all of them, with a
+        budget on space they are checked one by one instead. A cycle may be caught
+        some steps later than `check` would.
+        """
+        budget = budget or Budget()
+        if budget.max_space is not None:
+            return super(DTM, self).check_all(inputs, budget)
+        if not hasattr(self, 'table'):
+            self._compile()
+        start = time.time()
+        marker = [self.start_marker] if self.has_start_marker else []
+        strings = [unicode(input) for input in inputs]
+        found = [None] * len(strings)
+
+        def settle(indexes, outcome):
+            verdict, steps, configs, (low, high), reason, cycle = outcome
+            for i in indexes:
+                # every input cell counts as used, like on `check`
+                peak = max(high, max(len(marker) + len(strings[i]), 1) - 1) - low + 1
+                found[i] = Result(verdict, [], steps, configs, peak, reason=reason, cycle=cycle)
+
+        # runs of the root start from scratch, the others take on the one suspended at the wall of their node
+        nodes = [(batch.trie(strings), None)]
+        while nodes:
+            (ends, children), run = nodes.pop()
+            if ends:
+                settle(ends, self._shared(budget, marker, run)[1])
+            for symbol, child in children.iteritems():
+                cells = [symbol]
+                while not child[0] and len(child[1]) == 1:
+                    symbol, child = child[1].items()[0]
+                    cells.append(symbol)
+                suspended, outcome = self._shared(budget, marker, run, cells, bool(child[1]))
+                if suspended is not None:
+                    nodes.append((child, suspended))
+                else:
+                    settle(batch.below(child), outcome)
+        elapsed = (time.time() - start) / max(len(strings), 1)
+        for res in found:
+            res.elapsed = elapsed
+        return found
+
+    def _shared(self, budget, marker, run, cells=(), wall=False):
+        # a run for `check_all` going on with the cells, gives the suspended one or (verdict, steps, configs, extent, reason, cycle)
+        self.configs = 0
+        try:
+            if run is None:
+                cells = marker + list(cells)
+                accepted = self._execute(cells, budget, wall=len(cells) if wall else None)[0]
+            else:
+                accepted = self._execute(None, budget, wall=run[3] - run[1] + len(cells) if wall else None, run=self._resume(run, cells, wall))[0]
+            if self.suspended is not None:
+                return self.suspended, None
+            verdict, reason, cycle = ACCEPTED if accepted else REJECTED, None, None
+        except LimitError as e:
+            verdict, reason, cycle = LIMIT, str(e), None
+        except NonHalting as e:
+            verdict, reason, cycle = NONHALTING, None, e.period
+        return None, (verdict, self.steps, self.configs or self.steps + 1, self.extent, reason, cycle)
+
+    def _profiler(self, profile, log):
+        """A log for `_execute` that passes its entries on and counts them on `profile`."""
+        states, symbols, width = self.state_ids.values, self.symbol_ids.values, self._width
+        last = [None]
+
+        def counted(entry):
+            log(entry)
+            state = states[entry[0] // width]
+            profile.states[state] += 1
+            if last[0] is not None:
+                profile.transitions[last[0], symbols[entry[4]], state] += 1
+            last[0] = state
+        return counted
+
+    def _execute(self, cells, budget, log=None, wall=None, run=None, reached=None):
+        """Run of the compiled machine, returns whether it accepted and the final tape and its origin.
+
+        `log` is given (state, pos, written pos, written symbol, read symbol) for
+        every configuration. `extent` is left with the first and last cells used,
+        from the first input cell, and `reached` is given (steps, cell) whenever
+        the head gets past the last one.
+
+        A `wall` is the cell, from the first input cell, where what's on the tape
+        is not known yet: reaching it suspends the run, `suspended` is then left
+        with it for `_resume`, the one given as `run` to take it on.
+
+        Cycles are looked for against snapshots taken at powers of 2 steps. An exact
+        repeat needs the same state and head position and a tape with the same
+        hash, kept as the sum of what every write changed times a random key of its
+        cell. A shifted one can only show on a step that reaches a new cell on the
+        side the head drifts to, the snapshot for it is taken on such a step too.
+        """
+        ids = self.symbol_ids.ids
+        unknown = self._unknown
+        blank = self._blank
+        double_sided = self.double_sided
+        cycles = self.cycles
+        max_space = budget.max_space
+
+        table = self.table
+        finals = self._finals
+        accepted = suspended = False
+        if run is not None:
+            tape, origin, base, p, steps, first, last = run[:7]
+            if cycles:
+                keys, digest, snext, rnext, snapshot, rsnapshot, sdigest, sbase, spos, rbase, rside, seen_lo, seen_hi, lo, hi = run[7:]
+            self.peak = last - first + 1
+            self.extent = first - origin, last - origin
+        else:
+            size = max(16, 2 * len(cells))
+            origin = size // 2 if double_sided else 0
+            tape = blank * size
+            tape[origin:origin + len(cells)] = self._tape([ids.get(c, unknown) for c in cells])
+            if wall is not None:
+                tape[origin + wall] = unknown
+
+            base = self._start
+            p = origin
+            steps = 0
+            # ends of the cells used so far, the tape only grows when they reach its own
+            first, last = origin, origin + max(len(cells), 1) - 1
+            self.peak = last - first + 1
+            self.extent = first - origin, last - origin
+            if max_space is not None and self.peak > max_space:
+                raise LimitError('more than {} tape cells'.format(max_space))
+            if log is not None:
+                log((base, 0, None, None, None))
+
+            if cycles:
+                keys = [getrandbits(30) for _ in xrange(size)]
+                digest = 0
+                snext = rnext = 1
+                snapshot = rsnapshot = None
+                sdigest = sbase = spos = rbase = rside = None
+                # cells ever visited (or given) and those visited since the shifted snapshot, a wall counts as given
+                seen_lo, seen_hi = 0, len(cells) - 1 if wall is None else wall
+                lo = hi = 0
+        while True:
+            if base in finals:
+                accepted = True
+                break
+            read = tape[p]
+            t = table[base + read]
+            if t is None:
+                break
+            wsymbol, shift, base = t
+            steps += 1
+            if steps >= budget.next:
+                self.steps = steps
+                reason = budget.exceeded(steps)
+                if reason:
+                    raise LimitError(reason)
+            tape[p] = wsymbol
+            if cycles and wsymbol != read:
+                digest += (wsymbol - read) * keys[p]
+            p += shift
+            if p < first:
+                if p < 0:
+                    if not double_sided:
+                        # the last configuration is the one before this step, leave the tape like it
+                        tape[p - shift] = read
+                        self.configs = steps
+                        break
+                    grow = len(tape)
+                    tape[:0] = blank * grow
+                    origin += grow
+                    p += grow
+                    last += grow
+                    if cycles:
+                        keys[:0] = [getrandbits(30) for _ in xrange(grow)]
+                first = p
+                self.peak = last - first + 1
+                self.extent = first - origin, last - origin
+                if max_space is not None and self.peak > max_space:
+                    self.steps = steps
+                    raise LimitError('more than {} tape cells'.format(max_space))
+            elif p > last:
+                if p >= len(tape):
+                    if cycles:
+                        keys += [getrandbits(30) for _ in xrange(len(tape))]
+                    tape += blank * len(tape)
+                last = p
+                self.peak = last - first + 1
+                self.extent = first - origin, last - origin
+                if reached is not None:
+                    reached((steps, last - origin))
+                if max_space is not None and self.peak > max_space:
+                    self.steps = steps
+                    raise LimitError('more than {} tape cells'.format(max_space))
+                if p - origin == wall:
+                    suspended = True
+                    break
+            if log is not None:
+                log((base, p - origin, p - origin - shift, wsymbol, read))
+            if not cycles:
+                continue
+
+            q = p - origin
+            if digest == sdigest and q == spos and base == sbase and self._repeats(snapshot, tape, origin, q, seen_lo, seen_hi) is not None:
+                self.steps = steps
+                raise NonHalting(steps - snapshot[0])
+            if steps >= snext:
+                snapshot = steps, q, tape[:], origin
+                sdigest, spos, sbase = digest, q, base
+                snext *= 2
+
+            side = 0
+            if q < lo:
+                lo = q
+                if q < seen_lo:
+                    seen_lo, side = q, -1
+            elif q > hi:
+                hi = q
+                if q > seen_hi:
+                    seen_hi, side = q, 1
+            if not side:
+                continue
+            if side == rside and base == rbase:
+                shift = self._repeats(rsnapshot, tape, origin, q, lo, hi)
+                if shift is not None:
+                    self.steps = steps
+                    raise NonHalting(steps - rsnapshot[0], shift)
+            if steps >= rnext:
+                rsnapshot = steps, q, tape[:], origin
+                rbase, rside = base, side
+                lo = hi = q
+                while rnext <= steps:
+                    rnext *= 2
+
+        self.steps = steps
+        self.suspended = None
+        if suspended:
+            self.suspended = [tape, origin, base, p, steps, first, last]
+            if cycles:
+                # the cycle checks of the step onto the wall are skipped, but the wall is read next so it's one of the cells visited
+                self.suspended += [keys, digest, snext, rnext, snapshot, rsnapshot, sdigest, sbase, spos, rbase, rside, seen_lo, seen_hi, lo, max(hi, p - origin)]
+        return accepted, tape, origin
+
+    def _resume(self, run, cells, wall):
+        """A copy of a suspended run with the given cells from its wall on, the tape goes on blank after them or with a new wall.
+
+        The snapshots it looks for cycles against get the same cells, they stand
+        for the tape these would have had since the start.
+        """
+        ids, unknown, blank = self.symbol_ids.ids, self._unknown, self._blank
+        codes = [ids.get(c, unknown) for c in cells] + [unknown] if wall else [ids.get(c, unknown) for c in cells]
+        codes = self._tape(codes) if codes else blank
+        run = list(run)
+        tape, origin, p, last = run[0][:], run[1], run[3], run[6]
+        while len(tape) < p + len(codes):
+            tape += blank * len(tape)
+        tape[p:p + len(codes)] = codes
+        run[0] = tape
+        run[6] = max(last, p + len(cells) - 1)
+        if self.cycles:
+            run[7] = run[7] + [getrandbits(30) for _ in xrange(len(tape) - len(run[7]))]
+            # the snapshot and the shifted one
+            for k in (11, 12):
+                if run[k] is not None:
+                    ssteps, spos, stape, sorigin = run[k]
+                    stape = stape + blank * max(0, sorigin + p - origin + len(codes) - len(stape))
+                    stape[sorigin + p - origin:sorigin + p - origin + len(codes)] = codes
+                    run[k] = ssteps, spos, stape, sorigin
+            run[19] = max(run[19], p - origin + len(codes) - 1)
+        return run
+
+    def _repeats(self, snapshot, tape, origin, pos, lo, hi):
+        """How far the head went if the run since `snapshot` is a cycle, None if it isn't.
+
+        That run only read the cells in `lo`..`hi`, so it happens again shifted when
+        they are found shifted now. Shifted snapshots are taken on the farthest cell
+        visited, so the cells the head is heading to were blank back then.
+        """
+        _, spos, stape, sorigin = snapshot
+        shift = pos - spos
+        if self._cells(stape, sorigin, lo, hi) != self._cells(tape, origin, lo + shift, hi + shift):
+            return None
+        return shift
+
+    def _cells(self, tape, origin, lo, hi):
+        # cells lo..hi of a compiled tape, blank where it didn't grow to yet
+        n = hi - lo + 1
+        i = origin + lo
+        cut = tape[max(i, 0):max(i + n, 0)]
+        left = min(n, max(0, -i))
+        return self._blank * left + cut + self._blank * (n - left - len(cut))
+
+    def _sweep(self, cells, budget):
+        """Run of the compiled machine on a run-length tape, returns whether it accepted.
+
+        The tape is two stacks of [symbol, count] blocks, the head is on the first
+        cell of the top of `right`. A transition that keeps the state and reads the
+        symbol of the block it moves into is taken over the whole block at once,
+        `steps` still counts every transition.
+        """
+        ids = self.symbol_ids.ids
+        unknown = self._unknown
+        blank = ids[self.blank_symbol]
+        double_sided = self.double_sided
+        table = self.table
+        finals = self._finals
+        max_space = budget.max_space
+
+        def push(stack, symbol, count):
+            if stack and stack[-1][0] == symbol:
+                stack[-1][1] += count
+            else:
+                stack.append([symbol, count])
+
+        left = []
+        right = []
+        for c in reversed(cells):
+            push(right, ids.get(c, unknown), 1)
+
+        base = self._start
+        pos = 0
+        steps = 0
+        accepted = False
+        first, last = 0, max(len(cells), 1) - 1
+        self.peak = last - first + 1
+        if max_space is not None and self.peak > max_space:
+            raise LimitError('more than {} tape cells'.format(max_space))
+        while True:
+            if pos < first or pos > last:
+                first, last = min(first, pos), max(last, pos)
+                self.peak = last - first + 1
+                if max_space is not None and self.peak > max_space:
+                    self.steps = steps
+                    raise LimitError('more than {} tape cells'.format(max_space))
+            if base in finals:
+                accepted = True
+                break
+            if not right:
+                right.append([blank, 1])
+            block = right[-1]
+            symbol = block[0]
+            t = table[base + symbol]
+            if t is None:
+                break
+            wsymbol, shift, nbase = t
+
+            # how many times in a row this same transition is taken
+            k = 1
+            if nbase == base:
+                if shift > 0:
+                    k = block[1]
+                elif left and left[-1][0] == symbol:
+                    k += left[-1][1]
+                    if not double_sided:
+                        k = min(k, pos + 1)
+            if steps + k > budget.next:
+                k = budget.next - steps
+            steps += k
+            if steps >= budget.next:
+                self.steps = steps
+                reason = budget.exceeded(steps)
+                if reason:
+                    raise LimitError(reason)
+            base = nbase
+
+            if shift > 0:
+                block[1] -= k
+                if not block[1]:
+                    right.pop()
+                push(left, wsymbol, k)
+                pos += k
+                continue
+
+            # the head cell and the k - 1 on its left are written, then the head lands on the next one
+            block[1] -= 1
+            if not block[1]:
+                right.pop()
+            if k > 1:
+                left[-1][1] -= k - 1
+                if not left[-1][1]:
+                    left.pop()
+            push(right, wsymbol, k)
+            pos -= k
+            if pos < 0 and not double_sided:
+                self.configs = steps
+                break
+            if left:
+                symbol = left[-1][0]
+                left[-1][1] -= 1
+                if not left[-1][1]:
+                    left.pop()
+            else:
+                symbol = blank
+            push(right, symbol, 1)
+
+        self.steps = steps
+        return accepted
+
+    def _generate(self):
+        """Python source of a `run` function doing what `_execute` does on this machine, without logs or cycles.
+
+        Every state that's not final gets a block, picked by bisecting on its id,
+        that loops by itself while the transitions stay on it. Each branch of a
+        block is one transition with its symbols and shift written in, a move to a
+        final state returns right away. `run(m, tape, origin, first, last, budget,
+        max_space)` gives whether it accepted, the steps and the ends of the cells
+        used, it leaves `steps` and `peak` on `m` when going over the budget.
+        """
+        width = self._width
+        names, symbols = self.state_ids.values, self.symbol_ids.values
+        finals = self._finals
+        lines = []
+
+        def emit(depth, line):
+            lines.append(u'    ' * depth + line)
+
+        def name(value):
+            return u'{}'.format(value).replace(u'\n', u' ')
+
+        def block(state, depth):
+            emit(depth, u'# {}'.format(name(names[state])))
+            emit(depth, u'while True:')
+            emit(depth + 1, u'c = tape[p]')
+            branches = 0
+            for symbol in xrange(width):
+                t = self.table[state * width + symbol]
+                if t is None:
+                    continue
+                wsymbol, shift, nbase = t
+                emit(depth + 1, u'{} c == {}:'.format(u'elif' if branches else u'if', symbol))
+                branches += 1
+                d = depth + 2
+                emit(d, u'# {} -> {}, {}, {}'.format(name(symbols[symbol]), name(symbols[wsymbol]), u'R' if shift > 0 else u'L', name(names[nbase // width])))
+                emit(d, u'steps += 1')
+                emit(d, u'if steps >= limit:')
+                emit(d + 1, u'm.steps = steps')
+                emit(d + 1, u'm.peak = last - first + 1')
+                emit(d + 1, u'reason = budget.exceeded(steps)')
+                emit(d + 1, u'if reason:')
+                emit(d + 2, u'raise LimitError(reason)')
+                emit(d + 1, u'limit = budget.next')
+                if wsymbol != symbol:
+                    emit(d, u'tape[p] = {}'.format(wsymbol))
+                if shift > 0:
+                    emit(d, u'p += 1')
+                    emit(d, u'if p > last:')
+                    emit(d + 1, u'if p >= len(tape):')
+                    emit(d + 2, u'tape += blank * len(tape)')
+                    emit(d + 1, u'last = p')
+                else:
+                    emit(d, u'p -= 1')
+                    emit(d, u'if p < first:')
+                    if self.double_sided:
+                        emit(d + 1, u'if p < 0:')
+                        emit(d + 2, u'grow = len(tape)')
+                        emit(d + 2, u'tape[:0] = blank * grow')
+                        emit(d + 2, u'p += grow')
+                        emit(d + 2, u'last += grow')
+                    else:
+                        emit(d + 1, u'if p < 0:')
+                        emit(d + 2, u'tape[0] = c')
+                        emit(d + 2, u'm.configs = steps')
+                        emit(d + 2, u'return False, steps, first, last')
+                    emit(d + 1, u'first = p')
+                emit(d + 1, u'if max_space is not None and last - first + 1 > max_space:')
+                emit(d + 2, u'm.steps = steps')
+                emit(d + 2, u'm.peak = last - first + 1')
+                emit(d + 2, u"raise LimitError('more than {} tape cells'.format(max_space))")
+                if nbase in finals:
+                    emit(d, u'return True, steps, first, last')
+                elif nbase == state * width:
+                    emit(d, u'continue')
+                else:
+                    emit(d, u's = {}'.format(nbase // width))
+                    emit(d, u'break')
+            if not branches:
+                emit(depth + 1, u'return False, steps, first, last')
+            else:
+                emit(depth + 1, u'else:')
+                emit(depth + 2, u'return False, steps, first, last')
+
+        def dispatch(states, depth):
+            if len(states) == 1:
+                block(states[0], depth)
+                return
+            middle = len(states) // 2
+            emit(depth, u'if s < {}:'.format(states[middle]))
+            dispatch(states[:middle], depth + 1)
+            emit(depth, u'else:')
+            dispatch(states[middle:], depth + 1)
+
+        emit(0, u'def run(m, tape, origin, first, last, budget, max_space):')
+        if self._start in finals:
+            emit(1, u'return True, 0, first, last')
+            return u'\n'.join(lines) + u'\n'
+        emit(1, u'blank = m._blank')
+        emit(1, u'limit = budget.next')
+        emit(1, u'steps = 0')
+        emit(1, u'p = origin')
+        emit(1, u's = {}'.format(self._start // width))
+        emit(1, u'while True:')
+        dispatch([state for state in xrange(len(names)) if state * width not in finals], 2)
+        return u'\n'.join(lines) + u'\n'
+
+    def _run_generated(self, cells, budget):
+        """Run of the generated source, returns whether it accepted."""
+        run = _runner(self.source)
+        size = max(16, 2 * len(cells))
+        origin = size // 2 if self.double_sided else 0
+        tape = self._blank * size
+        ids, unknown = self.symbol_ids.ids, self._unknown
+        tape[origin:origin + len(cells)] = self._tape([ids.get(c, unknown) for c in cells])
+        first, last = origin, origin + max(len(cells), 1) - 1
+        self.peak = last - first + 1
+        if budget.max_space is not None and self.peak > budget.max_space:
+            raise LimitError('more than {} tape cells'.format(budget.max_space))
+        accepted, self.steps, first, last = run(self, tape, origin, first, last, budget, budget.max_space)
+        self.peak = last - first + 1
+        return accepted
+
+    def _interpret(self, input_string, budget, chain=True, profile=None):
         state = self.start_state
         tape = self._init_tape(input_string)
         pos = 0
-
-        chain = []
+        self.steps = 0
+        first, last = 0, max(len(tape), 1) - 1
+        self.peak = last - first + 1
+        if budget.max_space is not None and self.peak > budget.max_space:
+            raise LimitError('more than {} tape cells'.format(budget.max_space))
+
+        if chain is True:
+            configs = []
+        elif chain:
+            configs = deque(maxlen=chain)
+        else:
+            configs = None
+        if profile is not None:
+            profile.states[state] += 1
+        accepted = False
         while True:
-            chain.append((state, pos, tape[:]))
+            if configs is not None:
+                configs.append((state, pos, tape[:]))
             if state in self.final_states:
-                return True, chain
+                accepted = True
+                break
             symbol = tape[pos]
             if symbol not in self.tape_alphabet:
                 break
             trans = self._transition(state, symbol)
             if trans is None:
                 break
+            if profile is not None:
+                fired = state, symbol, trans[2]
             wsymbol, shift, state = trans
+            self.steps += 1
+            if self.steps >= budget.next:
+                reason = budget.exceeded(self.steps)
+                if reason:
+                    raise LimitError(reason)
             tape[pos] = wsymbol
             pos += shift
-            if pos < 0:
+            if pos < 0 and not self.double_sided:
+                self.configs = self.steps
                 break
-
-        return False, chain
+            if pos < first or pos > last:
+                first, last = min(first, pos), max(last, pos)
+                self.peak = last - first + 1
+                if budget.max_space is not None and self.peak > budget.max_space:
+                    raise LimitError('more than {} tape cells'.format(budget.max_space))
+            if profile is not None:
+                profile.transitions[fired] += 1
+                profile.states[state] += 1
+
+        if profile is not None:
+            profile.lap('run')
+        return accepted, list(configs or [])
+
+
+class Trace(object):
+    """Configurations of a compiled DTM run, rebuilt from what each step wrote as they are read.
+
+    `log` has (state, pos, written pos, written symbol, read symbol) per
+    configuration, `cells` and `left` are the tape at the first one: the cells
+    from 0 on and a dict of those on the left of 0.
+    """
+
+    def __init__(self, tm, cells, left, log):
+        self.tm = tm
+        self.cells = cells
+        self.left = left
+        self.log = log
+
+    def __len__(self):
+        return len(self.log)
+
+    def __iter__(self):
+        tm = self.tm
+        states, width, values = tm.state_ids.values, tm._width, tm.symbol_ids.values
+        tape = growing_list(self.cells, none=tm.blank_symbol, double=tm.double_sided)
+        for pos, symbol in self.left.iteritems():
+            tape[pos] = symbol
+        for i, (base, pos, wpos, wsymbol, _) in enumerate(self.log):
+            if i:
+                tape[wpos] = values[wsymbol]
+            yield states[base // width], pos, tape[:]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return next(islice(self, i, None))
 
 
 class NTM(TM):
-    #TODO[jansegre]: implement non-deterministic turing machine
-    pass
+    """Nondeterministic Turing machine, searched breadth-first.
+
+    Like a DTM but `transition_relation` gives a list of [symbol, shift, state]
+    for each state and symbol. A configuration is (state, pos, left, right) with
+    the tape as two `Stacks`: the cells on the left of the head, nearest on top,
+    and those from the head on. Branches share what their tapes have in common
+    and blanks on the far ends are never pushed, so equal configurations are
+    equal tuples of ints and each is explored once.
+
+    Past `max_frontier` configurations on a level the check runs out. With more
+    than one of `workers` the frontier, once large enough, is split over that many
+    processes, each searching its part on its own.
+    """
+
+    def __init__(self, dikt, max_frontier=None, workers=1):
+        super(NTM, self).__init__(dikt)
+        trans_map = dikt['transition_relation']
+        t = self.transition_relation = {}
+        for state, input_map in trans_map.iteritems():
+            self._check_state(state)
+            for symbol, outputs in input_map.iteritems():
+                symbol = symb(symbol)
+                self._check_tape_symbol(symbol)
+                if outputs and not isinstance(outputs[0], list):
+                    outputs = [outputs]
+                for output in outputs:
+                    nsymbol, shift, nstate = tuple(output)
+                    nsymbol = symb(nsymbol)
+                    self._check_tape_symbol(nsymbol)
+                    self._check_shift(shift)
+                    self._check_state(nstate)
+                    t.setdefault((state, symbol), []).append((nsymbol, self._conv_shift(shift), nstate))
+        self.max_frontier = max_frontier
+        self.workers = workers
+
+        self.symbol_ids = Interner(self.tape_alphabet + [self.blank_symbol])
+        self.state_ids = Interner(self.states)
+        self._unknown = len(self.symbol_ids)
+        width = self._width = self._unknown + 1
+        self._blank = self.symbol_ids.ids[self.blank_symbol]
+        self.table = table = [()] * (len(self.state_ids) * width)
+        for (state, symbol), outputs in t.iteritems():
+            table[self.state_ids.ids[state] * width + self.symbol_ids.ids[symbol]] = tuple(
+                (self.symbol_ids.ids[nsymbol], shift, self.state_ids.ids[nstate] * width) for nsymbol, shift, nstate in outputs)
+        self._finals = frozenset(self.state_ids.ids[state] * width for state in self.final_states)
+        self._start = self.state_ids.ids[self.start_state] * width
+
+    @measured
+    def check(self, input_string, budget=None, chain=True, profile=None):
+        """Whether some branch halts on a final state, and the configurations of the first one found.
+
+        Gives a Result, `steps` are the configurations reached and `peak` the most
+        tape cells on one of them, going over the budget ends it with a LIMIT verdict.
+        A `Profile` gets the transitions into new configurations, a profiled search
+        isn't split over the workers.
+        """
+        budget = budget or Budget()
+        try:
+            return self._check(input_string, budget, chain, profile)
+        finally:
+            self.configs = self.steps + 1
+
+    def _check(self, input_string, budget, chain, profile):
+        if profile is not None:
+            profile.start()
+        cells = ([self.start_marker] if self.has_start_marker else []) + list(unicode(input_string))
+        stacks = Stacks()
+        start = self._start, 0, 0, self._extend(stacks, 0, [self.symbol_ids.ids.get(c, self._unknown) for c in cells])
+        parents = {start: None} if chain else None
+
+        split = None
+        if self.workers > 1 and profile is None and not multiprocessing.current_process().daemon:
+            split = 4 * self.workers
+        found, frontier = self._search(stacks, [start], budget, parents, split, profile)
+        if frontier:
+            return self._split(stacks, frontier, budget, parents, cells, chain)
+        if profile is not None:
+            profile.lap('search')
+        if found is None:
+            return False, [self._config(stacks, start, cells)] if chain else []
+        path = self._path(stacks, parents, found, cells) if chain else []
+        if profile is not None:
+            profile.lap('chain')
+        return True, path
+
+    def _extend(self, stacks, stack, symbols):
+        # blanks at the bottom are left out, so a tape has a single form
+        for symbol in reversed(symbols):
+            if stack or symbol != self._blank:
+                stack = stacks.push(stack, symbol)
+        return stack
+
+    def _search(self, stacks, frontier, budget, parents=None, split=None, profile=None):
+        """Breadth-first search from the `frontier` configurations.
+
+        Returns an accepting configuration or None and what is left of the
+        frontier, which is only something when it grew to `split`.
+        """
+        table, finals, width = self.table, self._finals, self._width
+        tops, rests, push, depths = stacks.tops, stacks.rests, stacks.push, stacks.depths
+        blank = self._blank
+        double_sided = self.double_sided
+        max_frontier = self.max_frontier
+        max_space = budget.max_space
+        if profile is not None:
+            states, symbols = self.state_ids.values, self.symbol_ids.values
+        for config in frontier:
+            self.peak = max(self.peak, depths[config[2]] + depths[config[3]])
+            if max_space is not None and self.peak > max_space:
+                raise LimitError('more than {} tape cells'.format(max_space))
+            if profile is not None:
+                profile.states[states[config[0] // width]] += 1
+            if config[0] in finals:
+                return config, []
+
+        visited = set(frontier)
+        steps = self.steps
+        while frontier:
+            if split is not None and len(frontier) >= split:
+                self.steps = steps
+                return None, frontier
+            level = []
+            for config in frontier:
+                base, pos, left, right = config
+                read = tops[right] if right else blank
+                rest = rests[right]
+                for wsymbol, shift, nbase in table[base + read]:
+                    if shift > 0:
+                        nleft = push(left, wsymbol) if left or wsymbol != blank else 0
+                        nconfig = nbase, pos + 1, nleft, rest
+                    else:
+                        if pos == 0 and not double_sided:
+                            continue
+                        nright = push(rest, wsymbol) if rest or wsymbol != blank else 0
+                        top = tops[left] if left else blank
+                        nright = push(nright, top) if nright or top != blank else 0
+                        nconfig = nbase, pos - 1, rests[left], nright
+                    if nconfig in visited:
+                        continue
+                    visited.add(nconfig)
+                    size = depths[nconfig[2]] + depths[nconfig[3]]
+                    if size > self.peak:
+                        self.peak = size
+                        if max_space is not None and size > max_space:
+                            self.steps = steps
+                            raise LimitError('more than {} tape cells'.format(max_space))
+                    steps += 1
+                    if steps >= budget.next:
+                        self.steps = steps
+                        reason = budget.exceeded(steps)
+                        if reason:
+                            raise LimitError(reason)
+                    if parents is not None:
+                        parents[nconfig] = config
+                    if profile is not None:
+                        nstate = states[nbase // width]
+                        profile.transitions[states[base // width], symbols[read], nstate] += 1
+                        profile.states[nstate] += 1
+                    if nbase in finals:
+                        self.steps = steps
+                        return nconfig, []
+                    level.append(nconfig)
+            if max_frontier is not None and len(level) > max_frontier:
+                self.steps = steps
+                raise LimitError('frontier of more than {} configurations'.format(max_frontier))
+            frontier = level
+        self.steps = steps
+        return None, []
+
+    def _split(self, stacks, frontier, budget, parents, cells, chain):
+        """Search the frontier on `workers` processes, the first to accept wins."""
+        parts = [[self._unstack(stacks, config) for config in frontier[i::self.workers]] for i in xrange(self.workers)]
+        share = budget.share(self.steps, self.workers)
+        pool = multiprocessing.Pool(self.workers)
+        timedout = None
+        try:
+            for steps, peak, found, path in pool.imap_unordered(_explore, [(self, part, share, chain, cells) for part in parts]):
+                self.steps += steps
+                self.peak = max(self.peak, peak)
+                if isinstance(found, LimitError):
+                    # another part may still accept, a part out of its share of steps is out of the steps of the check
+                    timedout = found
+                    if share.max_steps is not None and steps > share.max_steps:
+                        timedout = LimitError(budget.exceeded(budget.max_steps + 1))
+                    continue
+                if found is None:
+                    continue
+                if not chain:
+                    return True, []
+                # the worker's path starts at one of the frontier configurations given to it
+                head = self._path(stacks, parents, self._restack(stacks, found), cells)
+                return True, head[:-1] + path
+        finally:
+            pool.terminate()
+            if budget.max_steps is not None:
+                # the parts may go over their shares together, like a single search the check stops on the step past them
+                self.steps = min(self.steps, budget.max_steps + 1)
+        if timedout is not None:
+            raise timedout
+        return False, self._path(stacks, parents, frontier[0], cells)[:1] if chain else []
+
+    def _unstack(self, stacks, config):
+        base, pos, left, right = config
+        return base, pos, tuple(stacks.list(left)), tuple(stacks.list(right))
+
+    def _restack(self, stacks, config):
+        base, pos, left, right = config
+        return base, pos, self._extend(stacks, 0, list(left)), self._extend(stacks, 0, list(right))
+
+    def _path(self, stacks, parents, config, cells):
+        path = []
+        while config is not None:
+            path.append(self._config(stacks, config, cells))
+            config = parents[config]
+        return path[::-1]
+
+    def _config(self, stacks, config, cells):
+        """A configuration with the names from YAML, the tape from cell 0 on like a DTM's."""
+        base, pos, left, right = config
+        left, right = stacks.list(left), stacks.list(right)
+        tape = ([self._blank] * max(pos - len(left), 0) + left[::-1] + right)[max(len(left) - pos, 0):]
+        values = self.symbol_ids.values
+        return self.state_ids.values[base // self._width], pos, [values[z] if z != self._unknown else cells[i] for i, z in enumerate(tape)]
+
+
+def _explore(job):
+    """Search part of an NTM frontier in a worker process.
+
+    Returns its steps and peak, the frontier configuration the accepting branch
+    came from (or None, or the LimitError that stopped it) and the path from it.
+    """
+    ntm, part, budget, chain, cells = job
+    stacks = Stacks()
+    frontier = [ntm._restack(stacks, config) for config in part]
+    parents = dict.fromkeys(frontier)
+    ntm.steps = ntm.peak = 0
+    try:
+        found, _ = ntm._search(stacks, frontier, budget, parents)
+    except LimitError as e:
+        return ntm.steps, ntm.peak, e, []
+    if found is None:
+        return ntm.steps, ntm.peak, None, []
+    path = ntm._path(stacks, parents, found, cells) if chain else []
+    while parents[found] is not None:
+        found = parents[found]
+    return ntm.steps, ntm.peak, ntm._unstack(stacks, found), path
+
+
+def evaluate(lang, input, maxtime=None, max_steps=None, trace=False, max_space=None, profile=None):
+    """Result of a check as used by `batch`, a step is one transition (one configuration for a PDA search)."""
+    try:
+        res = lang.check(input, Budget(max_steps, maxtime, max_space), chain=trace, profile=profile)
+    except MalformedInput as e:
+        return malformed(e)
+    return summary(res, trace)
+
 
+def malformed(e):
+    return {'accepted': None, 'steps': 0, 'error': u'SYMBOL {} REJECTED'.format(e.message)}
 
-# from: http://stackoverflow.com/questions/2281850/timeout-function-if-it-takes-too-long-to-finish
-class timeout(object):
-    def __init__(self, seconds=1, error_message='Timeout'):
-        self.seconds = seconds
-        self.error_message = error_message
-    def handle_timeout(self, signum, frame):
-        raise TimeoutError(self.error_message)
-    def __enter__(self):
-        signal.signal(signal.SIGALRM, self.handle_timeout)
-        signal.alarm(self.seconds)
-    def __exit__(self, type, value, traceback):
-        signal.alarm(0)
 
+def summary(res, trace=False):
+    """The result dict of `batch` for a Result."""
+    result = {'accepted': res.accepted, 'steps': res.steps, 'configs': res.configs, 'peak': res.peak}
+    if res.verdict == LIMIT:
+        result.update(error=LIMIT, reason=res.reason)
+    elif res.verdict == NONHALTING:
+        result.update(error=NONHALTING, cycle=res.cycle)
+    elif trace:
+        result['trace'] = [(s, i, u''.join(z)) for s, i, z in res.chain]
+    return result
 
-def pretty_check(langs, maxtime):
+
+def pretty_check(langs, maxtime, chain=True, max_steps=None, max_space=None, stats=False, profiles=None):
     try:
         print
         input = raw_input('> ')
@@ -351,9 +1220,18 @@ def pretty_check(langs, maxtime):
         print '%s' % name,
         try:
             with timeout(seconds=maxtime):
-                ok, ch = lang.check(input)
-                chain = lang.pretty_chain(ch)
-                print u'ACCEPTED:\n%s ✓' % chain if ok else u'REJECTED!\n%s ✗' % chain
+                res = lang.check(input, Budget(max_steps, None, max_space), chain=chain, profile=(profiles or {}).get(name))
+            if res.verdict == LIMIT:
+                print 'LIMIT! (%s)' % res.reason
+            elif res.verdict == NONHALTING:
+                print 'NONHALTING! (cycle of %d steps)' % res.cycle
+            elif not chain:
+                print u'ACCEPTED ✓' if res.accepted else u'REJECTED! ✗'
+            else:
+                pretty = lang.pretty_chain(res.chain)
+                print u'ACCEPTED:\n%s ✓' % pretty if res.accepted else u'REJECTED!\n%s ✗' % pretty
+            if stats:
+                print '%d steps, %d configurations, %d tape cells at most, %.3fs' % (res.steps, res.configs, res.peak, res.elapsed)
         except MalformedInput as e:
             print 'SYMBOL {} REJECTED'.format(e.message)
         except TimeoutError:
@@ -365,32 +1243,79 @@ def pretty_check(langs, maxtime):
 
 def main():
     parser = argparse.ArgumentParser(prog='tm_check', add_help=True)
-    parser.add_argument('--timeout', '-t', default=3, help='max time in seconds of a single check', type=int)
+    parser.add_argument('--timeout', '-t', default=3, help='max time in seconds of a single check', type=float)
+    parser.add_argument('--batch', '-b', nargs='?', const='-', help='check every line of this file (stdin by default) printing JSON lines', type=argparse.FileType('rb'))
+    parser.add_argument('--engine', '-e', default='compiled', choices=DTM.engines, help='how a DTM is run')
+    parser.add_argument('--source', action='store_true', help='print the Python source the generated engine runs for a DTM and exit')
+    parser.add_argument('--no-cycles', dest='cycles', action='store_false', help='don\'t watch DTM runs for cycles')
+    parser.add_argument('--max-frontier', help='max configurations on a level of an NTM search', type=int)
+    parser.add_argument('--workers', '-w', default=1, help='processes to split an NTM search over', type=int)
+    parser.add_argument('--max-steps', help='max steps of a single check', type=int)
+    parser.add_argument('--max-tape', help='max tape cells of a single check', type=int)
+    parser.add_argument('--stats', action='store_true', help='show the steps, configurations, tape and time of every check')
+    parser.add_argument('--jobs', '-j', default=1, help='processes to spread the batch checks over', type=int)
+    parser.add_argument('--trace', action='store_true', help='include the configurations on batch results')
+    parser.add_argument('--shared', action='store_true', help='read the whole batch first and check it as a trie, so a DTM or a deterministic PDA runs common prefixes once')
+    parser.add_argument('--last', '-l', help='keep only the last N configurations of a DTM run, none with 0 so the macro and generated engines run too', type=int, metavar='N')
+    parser.add_argument('--profile', action='store_true', help='count the states and transitions of every check and report the hottest when done (batch checks then run on one job)')
+    parser.add_argument('--profile-json', help='write those counts as JSON to this file', type=argparse.FileType('w'), metavar='FILE')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='don\'t keep the built languages in the cache directory ($LFA_CACHE or ~/.cache/lfa)')
     parser.add_argument('lang_file', nargs=1, help='file describing the language formatted in YAML', type=file)
     parser.add_argument('lang', nargs=1, help='name of the lang inside lang_file to load')
     args = parser.parse_args()
-    langs = list(yaml.load_all(args.lang_file[0]))
     langk = args.lang[0]
     maxtime = args.timeout
+    if args.source:
+        args.engine = 'generated'
 
-    print 'tm_check v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
-    print 'Give the input you want to check, you can do it multiple times:'
+    if not (args.batch or args.source):
+        print 'tm_check v%s -- (c) 2014 Jan Segre <jan@segre.in>' % VERSION
+        print 'Give the input you want to check, you can do it multiple times:'
 
+    # only the lang asked for is built, unless the file isn't cached yet
+    build = lambda lang: machine(lang, args.engine, args.cycles, args.max_frontier, args.workers)
+    key = 'tm', args.engine, args.cycles, args.max_frontier, args.workers
     try:
-        langs = dict((lang['name'], machine(lang)) for lang in langs if lang)
+        library = Library(args.lang_file[0], build, lambda lang: lang['name'], key, default_cache() if args.cache else None)
+        if langk not in library:
+            print 'lang not found'
+            return
+        langs = {langk: library[langk]}
     except Malformed as e:
         print unicode(e)
         return
-
-    if langk not in langs:
-        print 'lang not found'
+    if args.source:
+        if not isinstance(langs[langk], DTM):
+            print 'only a DTM has generated source'
+            return
+        sys.stdout.write(langs[langk].source.encode('utf-8'))
         return
-    langs = {langk: langs[langk]}
+    chain = args.last if args.last is not None else True
+    profiles = {}
+    if args.profile or args.profile_json:
+        profiles = {langk: Profile()}
+        args.jobs = 1
+
+    shared = args.batch and args.shared and not (args.trace or profiles)
+    if isinstance(langs[langk], DTM):
+        engine = langs[langk].runs_on(chain and (args.trace or not args.batch), bool(profiles), shared and args.max_tape is None)
+        if engine != args.engine:
+            sys.stderr.write('tm_check: these checks run on the {} engine, the {} one gives no configurations, profiles or shared runs\n'.format(engine, args.engine))
+
+    if shared:
+        check_shared = lambda lang, inputs: [summary(res) if isinstance(res, Result) else malformed(res) for res in lang.check_all(inputs, Budget(args.max_steps, maxtime, args.max_tape))]
+        batch.run_shared(langs.items(), batch.read_inputs(args.batch), check_shared, sys.stdout)
+    elif args.batch:
+        run = lambda lang, input: evaluate(lang, input, maxtime, args.max_steps, args.trace and chain, args.max_tape, profiles.get(langk))
+        batch.run(langs.items(), batch.read_inputs(args.batch), run, sys.stdout, args.jobs, 2 * maxtime + 1)
+    else:
+        while True:
+            if not pretty_check(langs, maxtime, chain, args.max_steps, args.max_tape, args.stats, profiles):
+                break
+        print 'Bye!'
 
-    while True:
-        if not pretty_check(langs, maxtime):
-            break
-    print 'Bye!'
+    if profiles:
+        write_profiles(profiles.items(), sys.stderr if args.profile else None, args.profile_json)
 
 
 if __name__ == '__main__':
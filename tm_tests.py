@@ -1 +1,367 @@
-# TODO[silveira]: test tm_check.TM.check method
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (C) 2014 Jan Segre <jan@segre.in>
+#
+# This software may be modified and distributed under the terms
+# of the MIT license.  See the LICENSE file for details.
+#
+"""Tests of tm_check, run with: python -m unittest discover -p '*_tests.py'"""
+import os
+import sys
+import pickle
+import random
+import unittest
+import subprocess
+import yaml
+from automata import Budget, Profile, TimeoutError, timeout, ACCEPTED, REJECTED, LIMIT, NONHALTING
+from tm_check import DTM, NTM, machine, _runner
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def examples():
+    with open(os.path.join(_here, 'tm_examples.yaml')) as f:
+        return dict((d['name'], d) for d in yaml.safe_load_all(f) if d)
+
+
+def random_dtm(rand, double_sided=None):
+    states = ['s%d' % i for i in xrange(rand.randint(1, 4))] + ['acc']
+    gamma = ['a', 'b', '_', 'x'][:rand.randint(3, 4)]
+    transitions = {}
+    for state in states[:-1]:
+        for symbol in gamma:
+            if rand.random() < 0.85:
+                transitions.setdefault(state, {})[symbol] = [rand.choice(gamma), rand.choice('LR'), rand.choice(states)]
+    return {
+        'states': states,
+        'tape_alphabet': gamma,
+        'blank_symbol': '_',
+        'input_alphabet': ['a', 'b'],
+        'start_state': 's0',
+        'final_states': ['acc'],
+        'transition_function': transitions,
+        'double_sided': rand.random() < 0.5 if double_sided is None else double_sided,
+    }
+
+
+def outcome(res):
+    return res.verdict, res.steps, res.configs, res.peak, res.reason
+
+
+# writes a 1 on the left of where it starts, only possible on a double sided tape
+_left = {
+    'states': ['s0', 's1', 'acc'],
+    'tape_alphabet': ['1', '_'],
+    'blank_symbol': '_',
+    'input_alphabet': ['1'],
+    'start_state': 's0',
+    'final_states': ['acc'],
+    'transition_function': {'s0': {'_': ['1', 'L', 's1']}, 's1': {'_': ['1', 'R', 'acc']}},
+}
+
+
+def interactive(options, name, input=''):
+    """What tm_check says, on stdout and stderr, given the input on the example `name`."""
+    command = [sys.executable, '-W', 'ignore', os.path.join(_here, 'tm_check.py'), '--no-cache'] + options + [os.path.join(_here, 'tm_examples.yaml'), name]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+    return process.communicate(input + '\n')
+
+
+class LikeInterpreterMixin(object):
+    """The results of `engine` are the interpreter's."""
+
+    engine = None
+
+    def test_examples_like_the_interpreter(self):
+        langs = examples()
+        cases = [('busy', ''), ('busy4', ''), ('anbn', 'aaabbb'), ('anbn', 'aabbb'), ('counter', '1011'), ('counter', '111')]
+        for name, input in cases:
+            expected = outcome(DTM(langs[name]['dtm'], 'interpreter').check(input, chain=False))
+            self.assertEqual(outcome(DTM(langs[name]['dtm'], self.engine).check(input, chain=False)), expected, (name, input))
+
+    def test_like_the_interpreter(self):
+        rand = random.Random(0)
+        for _ in xrange(60):
+            d = random_dtm(rand)
+            interpreter, dtm = DTM(d, 'interpreter'), DTM(d, self.engine, cycles=False)
+            for _ in xrange(8):
+                input = ''.join(rand.choice('abz') for _ in xrange(rand.randint(0, 8)))
+                for budget in [(500, None), (20, None), (500, 5)]:
+                    expected = outcome(interpreter.check(input, Budget(*budget), chain=False))
+                    self.assertEqual(outcome(dtm.check(input, Budget(*budget), chain=False)), expected, (d, input, budget))
+
+    def test_chains_like_the_interpreter(self):
+        rand = random.Random(1)
+        for _ in xrange(30):
+            d = random_dtm(rand)
+            input = ''.join(rand.choice('ab') for _ in xrange(rand.randint(0, 6)))
+            expected = DTM(d, 'interpreter').check(input, Budget(200))
+            res = DTM(d, self.engine).check(input, Budget(200))
+            if res.verdict != NONHALTING:
+                self.assertEqual(list(res.chain), list(expected.chain), (d, input))
+
+    def test_double_sided(self):
+        res = DTM(_left, self.engine).check('')
+        self.assertEqual((res.verdict, res.steps, res.configs), (REJECTED, 1, 1))
+        res = DTM(dict(_left, double_sided=True), self.engine).check('')
+        self.assertEqual((res.verdict, res.steps, res.peak), (ACCEPTED, 2, 2))
+
+
+class InterpreterTest(unittest.TestCase):
+
+    def test_double_sided(self):
+        # the head may go left of the input
+        res = DTM(dict(_left, double_sided=True), 'interpreter').check('')
+        self.assertEqual((res.verdict, res.steps, res.peak), (ACCEPTED, 2, 2))
+        self.assertEqual(DTM(_left, 'interpreter').check('').verdict, REJECTED)
+
+
+class CompiledTest(LikeInterpreterMixin, unittest.TestCase):
+
+    engine = 'compiled'
+
+    def test_examples(self):
+        langs = examples()
+        # the busy beaver runs off the left end of a tape with a single side
+        self.assertEqual(outcome(machine(langs['busy']).check('')), (REJECTED, 3, 3, 2, None))
+        self.assertEqual(outcome(DTM(dict(langs['busy']['dtm'], double_sided=True)).check('')), (ACCEPTED, 13, 14, 6, None))
+        self.assertEqual(outcome(machine(langs['busy4']).check('')), (ACCEPTED, 107, 108, 14, None))
+        anbn = machine(langs['anbn'])
+        for input, verdict in [('', ACCEPTED), ('ab', ACCEPTED), ('aabb', ACCEPTED), ('aab', REJECTED), ('ba', REJECTED)]:
+            self.assertEqual(anbn.check(input).verdict, verdict, input)
+
+
+class MacroTest(LikeInterpreterMixin, unittest.TestCase):
+
+    engine = 'macro'
+
+    def test_busy5(self):
+        # sweeps over blocks take most of its steps at once
+        res = DTM(examples()['busy5']['dtm'], 'macro').check('', chain=False)
+        self.assertEqual((res.verdict, res.steps), (ACCEPTED, 47176870))
+
+    def test_interactive(self):
+        # without configurations to keep the check runs on the engine asked for
+        out, _ = interactive(['-e', 'macro', '-l', '0', '-t', '10', '--stats'], 'busy5')
+        self.assertIn('busy5 ACCEPTED', out)
+        self.assertIn('47176870 steps', out)
+        self.assertNotIn('TIMEDOUT', out)
+        out, _ = interactive(['-e', 'macro', '-l', '0'], 'anbn', 'aab')
+        self.assertIn('anbn REJECTED!', out)
+
+
+class GeneratedTest(LikeInterpreterMixin, unittest.TestCase):
+
+    engine = 'generated'
+
+    def test_source(self):
+        # kept when pickled, and compiled once for every DTM giving it
+        busy4 = examples()['busy4']['dtm']
+        dtm = pickle.loads(pickle.dumps(DTM(busy4, 'generated')))
+        self.assertEqual(dtm.source, DTM(busy4, 'generated').source)
+        self.assertIs(_runner(dtm.source), _runner(DTM(busy4, 'generated').source))
+        self.assertEqual(outcome(dtm.check('', chain=False)), (ACCEPTED, 107, 108, 14, None))
+
+    def test_interactive(self):
+        # configurations come from the compiled engine, and it's told when it runs instead
+        out, err = interactive(['-e', 'generated'], 'busy4')
+        self.assertIn('busy4 ACCEPTED:', out)
+        self.assertIn('these checks run on the compiled engine', err)
+        out, err = interactive(['-e', 'generated', '-l', '0'], 'busy4')
+        self.assertIn('busy4 ACCEPTED', out)
+        self.assertEqual(err, '')
+
+
+class NonHaltingTest(unittest.TestCase):
+
+    def test_nonhalting(self):
+        # bounces between two cells forever
+        bounce = dict(_left, double_sided=True, transition_function={
+            's0': {'_': ['_', 'R', 's1']}, 's1': {'_': ['_', 'L', 's0']}})
+        res = DTM(bounce).check('', Budget(10000))
+        self.assertEqual((res.verdict, res.cycle), (NONHALTING, 2))
+        self.assertEqual(DTM(bounce, cycles=False).check('', Budget(10000)).verdict, LIMIT)
+        # walks to the right forever, the same configuration shifted
+        walk = dict(_left, transition_function={'s0': {'1': ['1', 'R', 's0'], '_': ['1', 'R', 's0']}})
+        res = DTM(walk).check('11', Budget(10000))
+        self.assertEqual((res.verdict, res.cycle), (NONHALTING, 1))
+
+    def test_like_the_interpreter(self):
+        # anything that isn't caught gives the interpreter's result, what is caught still runs with a larger budget
+        rand = random.Random(2)
+        for _ in xrange(60):
+            d = random_dtm(rand)
+            for _ in xrange(5):
+                input = ''.join(rand.choice('ab') for _ in xrange(rand.randint(0, 6)))
+                res = DTM(d).check(input, Budget(2000), chain=False)
+                if res.verdict == NONHALTING:
+                    self.assertEqual(DTM(d, 'interpreter').check(input, Budget(20000), chain=False).verdict, LIMIT, (d, input))
+                else:
+                    self.assertEqual(outcome(res), outcome(DTM(d, 'interpreter').check(input, Budget(2000), chain=False)), (d, input))
+
+
+class DTMTest(unittest.TestCase):
+
+    def test_last_configurations(self):
+        rand = random.Random(4)
+        for _ in xrange(60):
+            d = random_dtm(rand)
+            input = ''.join(rand.choice('ab') for _ in xrange(rand.randint(0, 6)))
+            expected = list(DTM(d, 'interpreter').check(input, Budget(200)).chain)
+            for engine in DTM.engines:
+                for n in [1, 2, 5, 300]:
+                    res = DTM(d, engine, cycles=False).check(input, Budget(200), chain=n)
+                    self.assertEqual(list(res.chain), expected[-n:], (d, input, engine, n))
+        # nothing written on the empty input yet
+        self.assertEqual(list(DTM(_left).check('', chain=1).chain), [('s0', 0, [])])
+
+    def test_profile(self):
+        # the same counts on every engine, a state per configuration and a transition into all of them but the first
+        rand = random.Random(6)
+        for _ in xrange(30):
+            d = random_dtm(rand)
+            input = ''.join(rand.choice('ab') for _ in xrange(rand.randint(0, 6)))
+            profiles = []
+            for engine in DTM.engines:
+                profile = Profile()
+                res = DTM(d, engine, cycles=False).check(input, Budget(200), chain=False, profile=profile)
+                self.assertEqual(outcome(res), outcome(DTM(d, engine, cycles=False).check(input, Budget(200), chain=False)))
+                if res.verdict == LIMIT:
+                    break
+                self.assertEqual(sum(profile.transitions.values()), res.configs - 1, (d, input, engine))
+                self.assertEqual(sum(profile.states.values()), res.configs, (d, input, engine))
+                profiles.append((profile.transitions, profile.states))
+            self.assertTrue(all(p == profiles[0] for p in profiles), (d, input))
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_space(self):
+        # every engine stops on the step that takes the sixth cell
+        busy4 = examples()['busy4']['dtm']
+        for engine in DTM.engines:
+            res = DTM(busy4, engine).check('', Budget(None, None, 5))
+            self.assertEqual(outcome(res), (LIMIT, 20, 21, 6, 'more than 5 tape cells'), engine)
+
+    def test_timeout(self):
+        # the alarm goes through the check, it isn't a LIMIT verdict of it
+        busy5 = examples()['busy5']['dtm']
+        for engine in DTM.engines:
+            def run():
+                with timeout(seconds=0.05):
+                    DTM(busy5, engine).check('', chain=False)
+            self.assertRaises(TimeoutError, run)
+
+
+def prefixed(rand, symbols, n=20):
+    # inputs sharing prefixes, some of them out of the alphabet
+    inputs = set()
+    for _ in xrange(n):
+        base = ''.join(rand.choice(symbols) for _ in xrange(rand.randint(0, 8)))
+        inputs.update(base + ''.join(rand.choice(symbols) for _ in xrange(rand.randint(0, 4))) for _ in xrange(3))
+    return sorted(inputs)
+
+
+class SharedTest(unittest.TestCase):
+
+    def test_like_check(self):
+        rand = random.Random(5)
+        for _ in xrange(60):
+            d = random_dtm(rand)
+            inputs = prefixed(rand, 'abz')
+            for budget in [(300, None), (15, None), (300, 4)]:
+                dtm = DTM(d, cycles=False)
+                found = dtm.check_all(inputs, Budget(*budget))
+                for input, res in zip(inputs, found):
+                    self.assertEqual(outcome(res), outcome(dtm.check(input, Budget(*budget), chain=False)), (d, input, budget))
+                dtm = DTM(d)
+                for input, res in zip(inputs, dtm.check_all(inputs, Budget(*budget))):
+                    expected = dtm.check(input, Budget(*budget), chain=False)
+                    if expected.verdict in (ACCEPTED, REJECTED):
+                        self.assertEqual(res.verdict, expected.verdict, (d, input, budget))
+
+
+def as_ntm(d):
+    # a DTM written as an NTM with a single choice everywhere
+    d = dict(d)
+    d['transition_relation'] = dict((state, dict((symbol, [output]) for symbol, output in moves.iteritems()))
+                                    for state, moves in d.pop('transition_function').iteritems())
+    return d
+
+
+def trimmed(tape, pos):
+    # an NTM tape doesn't keep the blanks past the head on the right
+    end = len(tape)
+    while end > pos + 1 and tape[end - 1] == '_':
+        end -= 1
+    return tape[:end]
+
+
+class NTMTest(unittest.TestCase):
+
+    def test_example(self):
+        aab = machine(examples()['aab'])
+        for input, verdict in [('aab', ACCEPTED), ('babaab', ACCEPTED), ('abab', REJECTED), ('', REJECTED)]:
+            self.assertEqual(aab.check(input).verdict, verdict, input)
+        res = aab.check('bbaab')
+        self.assertEqual(res.chain[0], ('s', 0, list('bbaab')))
+        self.assertEqual([c[0] for c in res.chain], ['s', 's', 's', 'q1', 'q2', 'f'])
+
+    def test_like_a_dtm(self):
+        rand = random.Random(3)
+        for _ in xrange(60):
+            d = random_dtm(rand)
+            ntm = NTM(as_ntm(d))
+            for _ in xrange(5):
+                input = ''.join(rand.choice('ab') for _ in xrange(rand.randint(0, 6)))
+                expected = DTM(d, 'interpreter').check(input, Budget(300))
+                if expected.verdict == LIMIT:
+                    continue
+                res = ntm.check(input, Budget(300))
+                self.assertEqual(res.verdict, expected.verdict, (d, input))
+                if res.accepted:
+                    self.assertEqual(res.chain, [(state, pos, trimmed(tape, pos)) for state, pos, tape in expected.chain])
+
+    def test_configurations_once(self):
+        # both choices lead to the same configurations, each is only reached once
+        twice = {
+            'states': ['s', 't', 'f'],
+            'tape_alphabet': ['a', '_'],
+            'blank_symbol': '_',
+            'input_alphabet': ['a'],
+            'start_state': 's',
+            'final_states': ['f'],
+            'transition_relation': {'s': {'a': [['a', 'R', 't'], ['a', 'R', 't']]}, 't': {'a': [['a', 'R', 't'], ['a', 'R', 't']]}},
+        }
+        res = NTM(twice).check('aaaa')
+        self.assertEqual((res.verdict, res.steps), (REJECTED, 4))
+
+    def test_frontier_limit(self):
+        res = NTM(examples()['aab']['ntm'], max_frontier=1).check('aaaab')
+        self.assertEqual(res.verdict, LIMIT)
+
+    def test_workers(self):
+        aab = examples()['aab']['ntm']
+        for input in ['a' * 12 + 'b', 'ab' * 8]:
+            self.assertEqual(NTM(aab, workers=2).check(input).verdict, NTM(aab).check(input).verdict, input)
+
+    def test_workers_budget(self):
+        # writes a or b and goes right, never halting, the steps of the check are shared by the workers
+        grow = {
+            'states': ['s', 'f'],
+            'tape_alphabet': ['a', 'b', '_'],
+            'blank_symbol': '_',
+            'input_alphabet': ['a', 'b'],
+            'start_state': 's',
+            'final_states': ['f'],
+            'transition_relation': {'s': {'_': [['a', 'R', 's'], ['b', 'R', 's']]}},
+        }
+        for workers in [1, 3]:
+            res = NTM(grow, workers=workers).check('', Budget(50))
+            self.assertEqual((res.verdict, res.steps, res.reason), (LIMIT, 51, 'more than 50 steps'), workers)
+
+
+if __name__ == '__main__':
+    unittest.main()